@@ -0,0 +1,181 @@
+"""
+Benchmark the in-memory blackjack engine at high concurrency.
+
+Compares the cost of giving every hand its own shoe as per-card counts (what
+cogs/blackjack.py does) with shuffling a full shoe per hand, measures the
+memory each open hand holds, and plays many interleaved hands through the
+hand store the way concurrent players would, including the expiry sweep
+that stands abandoned hands. The database isn't involved: it is only
+touched when a hand starts and when it is settled.
+
+Usage:
+    python -m benchmarks.blackjack --output blackjack.json
+    python -m benchmarks.blackjack --hands 100000 --concurrency 1000,10000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Make the project root importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.report import environment, write_report
+
+def _shuffled_shoe(decks):
+    """The alternative to Shoe: a full shoe shuffled up front"""
+    cards = bytearray(range(52)) * decks
+    random.shuffle(cards)
+    return cards
+
+def measure_shoes(hands, decks):
+    """
+    Time creating a shoe and dealing the opening cards, per hand.
+
+    Returns:
+        dict: Microseconds per hand and bytes per shoe for each strategy
+    """
+    from cogs.blackjack import Shoe, deal
+
+    started = time.perf_counter()
+    for _ in range(hands):
+        deal(Shoe(decks))
+    counted = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(hands):
+        cards = _shuffled_shoe(decks)
+        bytearray((cards.pop(), cards.pop(), cards.pop(), cards.pop()))
+    shuffled = time.perf_counter() - started
+
+    return {
+        "decks": decks,
+        "counted_shoe_us": counted / hands * 1e6,
+        "shuffled_shoe_us": shuffled / hands * 1e6,
+        "counted_shoe_bytes": sys.getsizeof(Shoe(decks).counts),
+        "shuffled_shoe_bytes": sys.getsizeof(_shuffled_shoe(decks)),
+    }
+
+def _open_hand(decks):
+    from cogs.blackjack import Shoe, Hand, deal
+
+    hand = Hand(None, 1.0, 0, "benchmark", Shoe(decks))
+    hand.player, hand.dealer = deal(hand.shoe)
+    return hand
+
+def measure_open_hands(count, decks):
+    """
+    Measure the memory held by open hands and the cost of sweeping them once expired.
+
+    Returns:
+        dict: Bytes per open hand and microseconds per expired hand swept
+    """
+    from utils.game_state import GameStateStore
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = GameStateStore(ttl=0, max_entries=count)
+    for i in range(count):
+        store.add(str(10**17 + i), _open_hand(decks))
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    expired = store.expired()
+    swept = time.perf_counter() - started
+
+    return {
+        "open_hands": count,
+        "bytes_per_hand": held / count,
+        "sweep_us_per_hand": swept / len(expired) * 1e6,
+    }
+
+async def measure_concurrent_play(hands, concurrency, decks):
+    """
+    Play hands with many players at once, every action a separate turn of the loop.
+
+    Returns:
+        dict: Hands per second and the peak number of open hands
+    """
+    from cogs.blackjack import Shoe, Hand, deal, hand_value, play_dealer, score_hand
+    from utils.game_state import GameStateStore
+
+    store = GameStateStore(ttl=3600, max_entries=concurrency)
+    peak = 0
+
+    async def player(index, count):
+        nonlocal peak
+        key = str(10**17 + index)
+        for _ in range(count):
+            hand = Hand(None, 1.0, 0, "benchmark", Shoe(decks))
+            hand.player, hand.dealer = deal(hand.shoe)
+            store.add(key, hand)
+            peak = max(peak, len(store))
+            await asyncio.sleep(0)
+
+            # Hit below 17, one command per turn
+            while hand_value(store.get(key).player)[0] < 17:
+                hand.player.append(hand.shoe.draw())
+                await asyncio.sleep(0)
+
+            hand = store.pop(key)
+            if hand_value(hand.player)[0] <= 21:
+                play_dealer(hand.shoe, hand.dealer)
+            score_hand(hand.player, hand.dealer, hand.bet)
+
+    per_player, extra = divmod(hands, concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(player(i, per_player + (i < extra)) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "hands": hands,
+        "concurrency": concurrency,
+        "hands_per_second": hands / elapsed,
+        "peak_open_hands": peak,
+    }
+
+async def main(args):
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    results = {
+        "shoes": measure_shoes(args.hands, args.decks),
+        "open_hands": measure_open_hands(max(concurrency_levels), args.decks),
+        "concurrent_play": [
+            await measure_concurrent_play(args.hands, level, args.decks) for level in concurrency_levels
+        ],
+    }
+
+    shoes = results["shoes"]
+    print(
+        f"shoe + deal: counted {shoes['counted_shoe_us']:.2f}us ({shoes['counted_shoe_bytes']} bytes), "
+        f"shuffled {shoes['shuffled_shoe_us']:.2f}us ({shoes['shuffled_shoe_bytes']} bytes)", file=sys.stderr
+    )
+    open_hands = results["open_hands"]
+    print(
+        f"{open_hands['open_hands']} open hands: {open_hands['bytes_per_hand']:.0f} bytes each, "
+        f"sweep {open_hands['sweep_us_per_hand']:.2f}us each", file=sys.stderr
+    )
+    for result in results["concurrent_play"]:
+        print(f"{result['concurrency']} players: {result['hands_per_second']:.0f} hands/s", file=sys.stderr)
+
+    write_report({
+        "benchmark": "blackjack",
+        "environment": environment(),
+        "results": results,
+    }, args.output)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the in-memory blackjack engine")
+    parser.add_argument("--hands", type=int, default=50000, help="Hands dealt per measurement")
+    parser.add_argument("--concurrency", default="100,1000,10000", help="Numbers of players with a hand open at once")
+    parser.add_argument("--decks", type=int, default=6, help="Decks per shoe")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,175 @@
+"""
+Benchmark the overhead of the in-process event bus.
+
+Measures what publishing costs the command that publishes (per event, on the
+loop and from another thread, for a growing number of subscribers), how long
+events wait before a subscriber handles them at a steady publish rate, and
+that a stalled subscriber only loses its own events without slowing
+publishers down.
+
+Usage:
+    python -m benchmarks.event_bus --output event_bus.json
+    python -m benchmarks.event_bus --events 200000 --subscribers 1,4,16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Make the project root importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.report import environment, latency_summary, write_report
+
+def _event():
+    from utils.events import BetSettled
+    return BetSettled("100000000000000000", "benchmark", "coinflip", 1.0, True, 2.0, 101.0)
+
+async def measure_publish(subscribers, events):
+    """
+    Time publish() on the loop, with no-op subscribers draining their queues in between.
+
+    Returns:
+        dict: Microseconds per publish
+    """
+    from utils.events import EventBus, BetSettled
+
+    bus = EventBus()
+    bus.start()
+    for i in range(subscribers):
+        bus.subscribe(BetSettled, lambda event: None, name=f"noop{i}", maxsize=events)
+    event = _event()
+
+    started = time.perf_counter()
+    for _ in range(events):
+        bus.publish(event)
+    elapsed = time.perf_counter() - started
+    await bus.join()
+    bus.stop()
+
+    return {"subscribers": subscribers, "publish_us": elapsed / events * 1e6}
+
+async def measure_threaded_publish(subscribers, events):
+    """Time publish() from a worker thread, as journal replay and background jobs call it"""
+    from utils.events import EventBus, BetSettled
+
+    bus = EventBus()
+    bus.start()
+    handled = []
+    for i in range(subscribers):
+        bus.subscribe(BetSettled, handled.append, name=f"noop{i}", maxsize=events)
+    event = _event()
+
+    def publish_all():
+        started = time.perf_counter()
+        for _ in range(events):
+            bus.publish(event)
+        return time.perf_counter() - started
+
+    elapsed = await asyncio.to_thread(publish_all)
+    # Let the handed over events reach the queues, then the subscribers
+    while len(handled) < events * subscribers:
+        await asyncio.sleep(0.01)
+    bus.stop()
+
+    return {"subscribers": subscribers, "publish_us": elapsed / events * 1e6}
+
+async def measure_delivery(rate, duration):
+    """
+    Publish at a steady rate and record how long each event waits for its subscriber.
+
+    Returns:
+        dict: Delivery latency summary in milliseconds
+    """
+    from utils.events import EventBus, BetSettled
+
+    bus = EventBus()
+    bus.start()
+    latencies = []
+    bus.subscribe(BetSettled, lambda event: latencies.append(time.perf_counter() - event.published), name="latency")
+
+    interval = 1 / rate
+    deadline = time.perf_counter() + duration
+    published = 0
+    while time.perf_counter() < deadline:
+        event = _event()
+        event.published = time.perf_counter()
+        bus.publish(event)
+        published += 1
+        await asyncio.sleep(interval)
+    await bus.join()
+    bus.stop()
+
+    return {"rate": rate, "events": published, "latency_ms": latency_summary(latencies)}
+
+async def measure_stalled_subscriber(events, maxsize):
+    """Publish to a healthy and a stalled subscriber, checking only the stalled one loses events"""
+    from utils.events import EventBus, BetSettled
+
+    bus = EventBus()
+    bus.start()
+    stall = asyncio.Event()
+    healthy = []
+
+    async def stalled(event):
+        await stall.wait()
+
+    bus.subscribe(BetSettled, healthy.append, name="healthy", maxsize=events)
+    slow = bus.subscribe(BetSettled, stalled, name="stalled", maxsize=maxsize)
+    event = _event()
+
+    started = time.perf_counter()
+    for _ in range(events):
+        bus.publish(event)
+    elapsed = time.perf_counter() - started
+
+    # Let the healthy subscriber catch up before releasing the stalled one
+    while len(healthy) < events:
+        await asyncio.sleep(0.01)
+    stall.set()
+    await bus.join()
+    bus.stop()
+
+    return {
+        "events": events,
+        "queue_size": maxsize,
+        "publish_us": elapsed / events * 1e6,
+        "healthy_handled": len(healthy),
+        "stalled_dropped": int(slow.dropped.value),
+    }
+
+async def main(args):
+    subscriber_counts = [int(count) for count in args.subscribers.split(",")]
+
+    results = {
+        "publish_on_loop": [await measure_publish(count, args.events) for count in [0] + subscriber_counts],
+        "publish_from_thread": [await measure_threaded_publish(count, args.events) for count in subscriber_counts],
+        "delivery": await measure_delivery(args.rate, args.duration),
+        "stalled_subscriber": await measure_stalled_subscriber(args.events, args.queue_size),
+    }
+
+    for result in results["publish_on_loop"]:
+        print(f"publish on loop, {result['subscribers']} subscribers: {result['publish_us']:.2f}us", file=sys.stderr)
+    for result in results["publish_from_thread"]:
+        print(f"publish from thread, {result['subscribers']} subscribers: {result['publish_us']:.2f}us", file=sys.stderr)
+    delivery = results["delivery"]["latency_ms"]
+    print(f"delivery at {args.rate}/s: p50 {delivery['p50']:.3f}ms, p99 {delivery['p99']:.3f}ms", file=sys.stderr)
+
+    write_report({
+        "benchmark": "event_bus",
+        "environment": environment(),
+        "results": results,
+    }, args.output)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the event bus overhead")
+    parser.add_argument("--events", type=int, default=100000, help="Events published per publish measurement")
+    parser.add_argument("--subscribers", default="1,4,16", help="Subscriber counts to measure")
+    parser.add_argument("--rate", type=int, default=2000, help="Events per second for the delivery measurement")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of steady publishing")
+    parser.add_argument("--queue-size", type=int, default=1000, help="Queue size of the stalled subscriber")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
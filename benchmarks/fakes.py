@@ -0,0 +1,179 @@
+"""
+Fake Discord objects for driving cogs without a gateway connection.
+
+The fakes implement just enough of discord.py's Member, Channel, Message,
+Context and Bot interfaces for the cogs' command callbacks to run. Anything
+the cogs would send to Discord is recorded instead.
+"""
+import asyncio
+import itertools
+
+# Discord snowflakes are large integers, start fake ids well clear of small numbers
+_ids = itertools.count(100000000000000000)
+
+class FakeMessage:
+    """A sent message that records edits"""
+
+    def __init__(self, channel, content=None, embed=None, file=None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.file = file
+        self.edits = 0
+
+    async def edit(self, content=None, embed=None, **kwargs):
+        # A real edit is a network round trip, give other commands the loop meanwhile
+        await asyncio.sleep(0)
+        self.edits += 1
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embed = embed
+        return self
+
+class FakeChannel:
+    """A text channel (or DM) that records sent messages"""
+
+    def __init__(self, name="bench", guild=None):
+        self.id = next(_ids)
+        self.name = name
+        self.guild = guild
+        self.sent = 0
+        self.last_message = None
+
+    async def send(self, content=None, embed=None, file=None, **kwargs):
+        # A real send is a network round trip, give other commands the loop meanwhile
+        await asyncio.sleep(0)
+        self.sent += 1
+        self.last_message = FakeMessage(self, content, embed, file)
+        return self.last_message
+
+class FakeGuild:
+    """A guild with a list of members"""
+
+    def __init__(self, name="Bench Guild"):
+        self.id = next(_ids)
+        self.name = name
+        self.members = []
+
+class FakeMember:
+    """A guild member, also usable wherever the cogs expect a discord.User"""
+
+    def __init__(self, guild=None, name=None, member_id=None, bot=False):
+        self.id = member_id or next(_ids)
+        self.name = name or f"user{self.id % 1000000}"
+        self.display_name = self.name
+        self.discriminator = "0"
+        self.bot = bot
+        self.avatar = None
+        self.guild = guild
+        self.roles = []
+        self.dm_channel = FakeChannel(name=f"dm-{self.name}")
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+    async def send(self, content=None, embed=None, file=None, **kwargs):
+        return await self.dm_channel.send(content, embed=embed, file=file)
+
+    def __str__(self):
+        return self.name
+
+class FakeContext:
+    """A command context for one invocation"""
+
+    def __init__(self, bot, author, channel, command=None):
+        self.bot = bot
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.command = command
+        self.message = FakeMessage(channel)
+        self.command_failed = False
+
+    async def send(self, content=None, embed=None, file=None, **kwargs):
+        return await self.channel.send(content, embed=embed, file=file)
+
+class FakeBot:
+    """A bot that knows about fake users and loaded cogs but never connects"""
+
+    def __init__(self, owner_ids=()):
+        self.user = FakeMember(name="GamblingBot", bot=True)
+        self.owner_ids = set(owner_ids)
+        self.users = {}
+        self.cogs = {}
+        self._closed = False
+        self.loop = None
+
+    def add_user(self, user):
+        self.users[user.id] = user
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def get_cog(self, name):
+        return self.cogs.get(name)
+
+    async def add_cog(self, cog):
+        self.cogs[type(cog).__name__] = cog
+
+    async def is_owner(self, user):
+        return user.id in self.owner_ids
+
+    async def wait_until_ready(self):
+        return
+
+    def is_closed(self):
+        return self._closed
+
+    async def close(self):
+        self._closed = True
+
+async def _no_suspense_sleep(delay, result=None):
+    """Replacement for asyncio.sleep that only yields to the loop"""
+    return await _real_sleep(0, result)
+
+_real_sleep = asyncio.sleep
+
+class _AsyncioWithoutSuspense:
+    """Stand-in for the asyncio module with the cosmetic delays removed"""
+
+    sleep = staticmethod(_no_suspense_sleep)
+
+    def __getattr__(self, name):
+        return getattr(asyncio, name)
+
+def remove_suspense(*modules):
+    """
+    Strip the "Spinning..." style asyncio.sleep delays from cog modules.
+
+    Only the given modules are affected; asyncio itself is left untouched.
+
+    Args:
+        modules: Cog modules that did `import asyncio`
+    """
+    for module in modules:
+        module.asyncio = _AsyncioWithoutSuspense()
+
+async def invoke(cog, name, ctx, *args):
+    """
+    Run a cog command's callback directly with already-converted arguments.
+
+    Args:
+        cog: The cog instance that owns the command
+        name (str): The attribute name of the command on the cog
+        ctx (FakeContext): The invocation context
+        args: Positional command arguments
+
+    Returns:
+        The callback's return value
+    """
+    command = getattr(cog, name)
+    ctx.command = command
+    try:
+        return await command.callback(cog, ctx, *args)
+    except Exception:
+        ctx.command_failed = True
+        raise
@@ -0,0 +1,387 @@
+"""
+Offline load test for the bot's cogs.
+
+Instantiates the real Gambling, ExtendedSlots, Blackjack, Economy, Mining and
+Admin cogs against fake Discord objects, then replays a weighted traffic mix
+from many virtual users against a local database and reports throughput, latency
+percentiles and per-command SQL statistics as JSON.
+
+Usage:
+    python -m benchmarks.load_test --database-url sqlite:///loadtest.db \\
+        --users 2000 --concurrency 100 --duration 30 \\
+        --mix coinflip=40,bigslots=20,mine=10,transfer=10,balance=20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+# Make the project root importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fakes import FakeBot, FakeChannel, FakeContext, FakeGuild, FakeMember, invoke, remove_suspense
+from benchmarks.report import environment, latency_summary, write_report
+
+DEFAULT_MIX = "coinflip=30,dice=10,slots=10,bigslots=15,roulette=5,balance=10,transfer=5,mine=5,miner=3,leaderboard=2,daily=3,addbal=2"
+
+async def _coinflip(h, ctx, member):
+    await invoke(h.gambling, "coinflip", ctx, h.rng.choice(["h", "t"]), h.bet)
+
+async def _dice(h, ctx, member):
+    await invoke(h.gambling, "dice", ctx, h.bet, h.rng.choice([None, h.rng.randint(1, 6)]))
+
+async def _slots(h, ctx, member):
+    await invoke(h.gambling, "slots", ctx, h.bet)
+
+async def _roulette(h, ctx, member):
+    await invoke(h.gambling, "roulette", ctx, h.rng.choice(["red", "black", "even", "odd", "high", "low"]), h.bet)
+
+    # Spin the shared round straight away instead of waiting out the betting window,
+    # settling every bet other virtual users placed in it meanwhile
+    table = h.gambling.roulette_table
+    current = table.rounds.pop(ctx.channel.id, None)
+    if current is not None:
+        current.task.cancel()
+        await table.resolve(current)
+
+async def _bigslots(h, ctx, member):
+    await invoke(h.extended_slots, "slots_extended", ctx, h.bet)
+
+async def _blackjack(h, ctx, member):
+    from cogs.blackjack import hand_value
+    await invoke(h.blackjack, "blackjack", ctx, h.bet)
+    # Play basic "hit below 17" until the hand is settled
+    hand = h.blackjack.hands.get(str(member.id))
+    while hand is not None and hand_value(hand.player)[0] < 17:
+        await invoke(h.blackjack, "hit", ctx)
+        hand = h.blackjack.hands.get(str(member.id))
+    if hand is not None:
+        await invoke(h.blackjack, "stand", ctx)
+
+async def _balance(h, ctx, member):
+    await invoke(h.economy, "balance", ctx)
+
+async def _daily(h, ctx, member):
+    await invoke(h.economy, "daily", ctx)
+
+async def _transfer(h, ctx, member):
+    recipient = h.rng.choice(h.members)
+    if recipient is member:
+        recipient = h.members[(h.members.index(member) + 1) % len(h.members)]
+    await invoke(h.economy, "transfer", ctx, recipient, h.bet)
+
+async def _leaderboard(h, ctx, member):
+    await invoke(h.economy, "leaderboard", ctx)
+
+async def _transactions(h, ctx, member):
+    await invoke(h.economy, "transactions", ctx, 5)
+
+async def _mine(h, ctx, member):
+    await invoke(h.mining, "mine", ctx, 1)
+
+    # Complete the session straight away instead of waiting for the background task
+    mining_data = h.mining.currently_mining.pop(str(member.id), None)
+    if mining_data:
+        await h.mining.complete_mining_session(str(member.id), mining_data)
+
+async def _miner(h, ctx, member):
+    await invoke(h.mining, "miner_stats", ctx)
+
+async def _addbal(h, ctx, member):
+    ctx.author = h.owner
+    await invoke(h.admin, "admin_add_balance", ctx, member, 100.0)
+
+# Traffic mix operation name -> coroutine driving one command
+OPERATIONS = {
+    "coinflip": _coinflip,
+    "dice": _dice,
+    "slots": _slots,
+    "roulette": _roulette,
+    "bigslots": _bigslots,
+    "blackjack": _blackjack,
+    "balance": _balance,
+    "daily": _daily,
+    "transfer": _transfer,
+    "leaderboard": _leaderboard,
+    "transactions": _transactions,
+    "mine": _mine,
+    "miner": _miner,
+    "addbal": _addbal,
+}
+
+def parse_mix(mix):
+    """
+    Parse a traffic mix like "coinflip=40,balance=10" into (operations, weights).
+
+    Raises:
+        ValueError: If an operation is unknown or a weight is invalid
+    """
+    operations, weights = [], []
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}'. Choose from: {', '.join(OPERATIONS)}")
+        weight = float(weight or 1)
+        if weight <= 0:
+            raise ValueError(f"Weight for '{name}' must be positive")
+        operations.append(name)
+        weights.append(weight)
+    return operations, weights
+
+class Harness:
+    """Real cogs wired to a fake bot and a population of virtual users"""
+
+    def __init__(self, users=1000, seed=None, bet=1.0, keep_suspense=False):
+        self.user_count = users
+        self.seed = seed
+        self.bet = bet
+        self.keep_suspense = keep_suspense
+        self.rng = random.Random(seed)
+        self.bot = FakeBot()
+        self.guild = FakeGuild()
+        self.channel = FakeChannel(guild=self.guild)
+        self.owner = FakeMember(self.guild, name="owner")
+        self.members = []
+        self.members_by_id = {}
+
+    async def setup(self, reset_database=False):
+        """Create the schema, load the cogs and create the virtual users"""
+        # Import after DATABASE_URL is set so the engine points at the benchmark database
+        from database.database import get_engine
+        from database.models import Base
+        from database.schema import ensure_schema
+        from database.ledger_migration import prepare
+        from cogs import gambling, extended_slots, economy, mining, admin, blackjack
+
+        engine = get_engine()
+        if reset_database:
+            Base.metadata.drop_all(engine)
+        ensure_schema(engine)
+        prepare(engine)
+
+        if self.seed is not None:
+            # Game outcomes come from the global random module
+            random.seed(self.seed)
+
+        if not self.keep_suspense:
+            remove_suspense(gambling, extended_slots, mining)
+
+        self.gambling = gambling.Gambling(self.bot)
+        self.extended_slots = extended_slots.ExtendedSlots(self.bot)
+        self.economy = economy.Economy(self.bot)
+        self.mining = mining.Mining(self.bot)
+        self.admin = admin.Admin(self.bot)
+        self.blackjack = blackjack.Blackjack(self.bot)
+        for cog in (self.gambling, self.extended_slots, self.economy, self.mining, self.admin, self.blackjack):
+            await self.bot.add_cog(cog)
+
+        # Deliver events the way the bot does, so the subscribers are part of the load
+        from database.statistics import start_statistics_recorder
+        from database.jackpot import start_jackpot_flusher
+        from utils.events import BUS
+        BUS.start()
+        start_statistics_recorder()
+        start_jackpot_flusher()
+
+        self.bot.owner_ids.add(self.owner.id)
+        for i in range(self.user_count):
+            self.add_member(FakeMember(self.guild, name=f"vu{i}", member_id=10**17 + i))
+
+    def add_member(self, member):
+        """Register a virtual user with the fake bot and guild"""
+        self.members.append(member)
+        self.members_by_id[member.id] = member
+        self.guild.members.append(member)
+        self.bot.add_user(member)
+        return member
+
+    def context(self, member):
+        """Create a context for a command sent by a member"""
+        return FakeContext(self.bot, member, self.channel)
+
+    async def run_operation(self, name, member):
+        """
+        Run one operation and time it.
+
+        Returns:
+            tuple: (latency in seconds, exception or None)
+        """
+        from utils import query_profiler
+
+        ctx = self.context(member)
+        start = time.perf_counter()
+        try:
+            with query_profiler.profiled(name):
+                await OPERATIONS[name](self, ctx, member)
+            error = None
+        except Exception as e:
+            error = e
+        return time.perf_counter() - start, error
+
+class OperationStats:
+    """Latencies and errors collected for one operation"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.error_types = {}
+
+    def record(self, latency, error):
+        self.latencies.append(latency)
+        if error is not None:
+            self.errors += 1
+            name = type(error).__name__
+            self.error_types[name] = self.error_types.get(name, 0) + 1
+
+def db_statistics():
+    """Get per-operation SQL statistics collected by the query profiler"""
+    from utils import query_profiler
+
+    return {
+        stats.name: {
+            "avg_statements": stats.avg_statements,
+            "max_statements": stats.max_statements,
+            "avg_db_time_ms": stats.avg_db_time * 1000,
+            "repeated_statements": len(stats.repeated),
+        }
+        for stats in query_profiler.top_offenders(limit=None)
+    }
+
+def build_report(name, config, results, wall_time, extra=None):
+    """Build the JSON report for a run from per-operation stats"""
+    from database.database import get_engine
+
+    db_stats = db_statistics()
+    commands = {}
+    for op, stats in sorted(results.items()):
+        if not stats.latencies:
+            continue
+        commands[op] = {
+            "count": len(stats.latencies),
+            "errors": stats.errors,
+            "error_types": stats.error_types,
+            "throughput": len(stats.latencies) / wall_time if wall_time else 0.0,
+            "latency_ms": latency_summary(stats.latencies),
+            "db": db_stats.get(op, {}),
+        }
+
+    total = sum(len(stats.latencies) for stats in results.values())
+    report = {
+        "benchmark": name,
+        "environment": environment(),
+        "database": get_engine().dialect.name,
+        "config": config,
+        "wall_time": wall_time,
+        "operations": total,
+        "errors": sum(stats.errors for stats in results.values()),
+        "throughput": total / wall_time if wall_time else 0.0,
+        "latency_ms": latency_summary([l for stats in results.values() for l in stats.latencies]),
+        "commands": commands,
+    }
+    if extra:
+        report.update(extra)
+    return report
+
+async def run_load(harness, operations, weights, concurrency, duration=None, total=None):
+    """
+    Drive the harness with a weighted traffic mix until the duration or operation budget runs out.
+
+    Args:
+        harness (Harness): A set-up harness
+        operations (list): Operation names
+        weights (list): Relative weight of each operation
+        concurrency (int): Number of in-flight virtual users
+        duration (float): Seconds to run for
+        total (int): Total operations to run
+
+    Returns:
+        tuple: ({operation: OperationStats}, wall time in seconds)
+    """
+    results = {op: OperationStats() for op in operations}
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = [total] if total else None
+
+    async def virtual_user():
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            if remaining is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+
+            op = harness.rng.choices(operations, weights=weights, k=1)[0]
+            member = harness.rng.choice(harness.members)
+            latency, error = await harness.run_operation(op, member)
+            results[op].record(latency, error)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_user() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+def configure_database(database_url):
+    """Point the database module at the benchmark database before it is imported"""
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+    elif not os.getenv("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = "sqlite:///loadtest.db"
+
+def quiet_logging():
+    """Keep per-command log lines from drowning out the benchmark"""
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("utils.query_profiler").setLevel(logging.ERROR)
+
+async def main(args):
+    configure_database(args.database_url)
+    quiet_logging()
+
+    from utils import query_profiler
+
+    operations, weights = parse_mix(args.mix)
+    harness = Harness(users=args.users, seed=args.seed, bet=args.bet, keep_suspense=args.keep_suspense)
+    await harness.setup(reset_database=args.reset_database)
+
+    query_profiler.reset()
+    query_profiler.enable()
+
+    if args.warmup:
+        await run_load(harness, operations, weights, args.concurrency, total=args.warmup)
+        query_profiler.reset()
+
+    results, wall_time = await run_load(
+        harness, operations, weights, args.concurrency,
+        duration=None if args.operations else args.duration, total=args.operations
+    )
+
+    config = {
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "operations": args.operations,
+        "mix": dict(zip(operations, weights)),
+        "seed": args.seed,
+        "bet": args.bet,
+        "suspense": args.keep_suspense,
+    }
+    write_report(build_report("load_test", config, results, wall_time), args.output)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the bot's cogs with synthetic traffic")
+    parser.add_argument("--database-url", help="Database to run against (default: $DATABASE_URL or sqlite:///loadtest.db)")
+    parser.add_argument("--reset-database", action="store_true", help="Drop and recreate all tables first")
+    parser.add_argument("--users", type=int, default=1000, help="Number of virtual users")
+    parser.add_argument("--concurrency", type=int, default=50, help="Commands in flight at once")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run for")
+    parser.add_argument("--operations", type=int, help="Run exactly this many operations instead of a duration")
+    parser.add_argument("--warmup", type=int, default=0, help="Operations to run before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted traffic mix, e.g. coinflip=40,balance=10")
+    parser.add_argument("--bet", type=float, default=1.0, help="Bet and transfer amount")
+    parser.add_argument("--seed", type=int, help="Seed for traffic and game outcomes")
+    parser.add_argument("--keep-suspense", action="store_true", help="Keep the cogs' cosmetic sleep delays")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
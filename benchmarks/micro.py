@@ -0,0 +1,196 @@
+"""
+Micro-benchmarks for the CPU-bound parts of each command.
+
+Covers the random draws, payline scoring, result serialization, currency and
+time formatting, and embed construction that run on the event loop for every
+game. Results are reported as microseconds per operation and can be checked
+against absolute thresholds or a previous run.
+
+Usage:
+    python -m benchmarks.micro --output micro.json
+    python -m benchmarks.micro --check --baseline previous.json --tolerance 0.25
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import timeit
+
+# Make the project root importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.report import environment, write_report
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+def _cycle(values):
+    """Get a function returning the next precomputed input on every call"""
+    return itertools.cycle(values).__next__
+
+def _format_currency():
+    from utils.formatters import format_currency
+    amounts = _cycle([random.uniform(0, 1000000) for _ in range(1000)])
+    return lambda: format_currency(amounts())
+
+def _format_time():
+    from utils.formatters import format_time
+    durations = _cycle([random.uniform(0, 86400) for _ in range(1000)])
+    return lambda: format_time(durations())
+
+def _coinflip_draw():
+    return lambda: random.choice(["heads", "tails"])
+
+def _dice_draw():
+    return lambda: random.randint(1, 6)
+
+def _slots_spin():
+    from cogs.gambling import spin_slots
+    return spin_slots
+
+def _slots_score():
+    from cogs.gambling import spin_slots, score_slots
+    spins = _cycle([spin_slots() for _ in range(1000)])
+    return lambda: score_slots(spins())
+
+def _roulette_spin():
+    from cogs.gambling import roulette_properties
+    return lambda: roulette_properties(random.randint(0, 36))
+
+def _bigslots_spin():
+    from cogs.extended_slots import spin_grid
+    return spin_grid
+
+def _bigslots_score():
+    from cogs.extended_slots import spin_grid, score_grid
+    grids = _cycle([spin_grid() for _ in range(1000)])
+    return lambda: score_grid(grids(), 10.0)
+
+def _bigslots_result_json():
+    from cogs.extended_slots import spin_grid, score_grid
+    results = _cycle([score_grid(spin_grid(), 10.0) for _ in range(1000)])
+    return lambda: json.dumps(results())
+
+def _bigslots_embed():
+    from cogs.extended_slots import spin_grid, score_grid, build_result_embed
+    results = _cycle([score_grid(spin_grid(), 10.0) for _ in range(1000)])
+    return lambda: build_result_embed("benchmark", 10.0, results(), 1234.56)
+
+def _bigslots_embed_winning():
+    from cogs.extended_slots import spin_grid, score_grid, build_result_embed
+    # Embeds with many win line fields are the most expensive to build
+    winning = []
+    while len(winning) < 100:
+        result = score_grid(spin_grid(), 10.0)
+        if len(result["win_lines"]) >= 2:
+            winning.append(result)
+    results = _cycle(winning)
+    return lambda: build_result_embed("benchmark", 10.0, results(), 1234.56)
+
+# Benchmark name -> factory returning the zero-argument function to time
+CASES = {
+    "format_currency": _format_currency,
+    "format_time": _format_time,
+    "coinflip_draw": _coinflip_draw,
+    "dice_draw": _dice_draw,
+    "slots_spin": _slots_spin,
+    "slots_score": _slots_score,
+    "roulette_spin": _roulette_spin,
+    "bigslots_spin": _bigslots_spin,
+    "bigslots_score": _bigslots_score,
+    "bigslots_result_json": _bigslots_result_json,
+    "bigslots_embed": _bigslots_embed,
+    "bigslots_embed_winning": _bigslots_embed_winning,
+}
+
+def measure(function, repeat=5):
+    """
+    Time a function, calibrating the loop count so each repeat takes at least 0.2s.
+
+    Returns:
+        dict: best and median microseconds per call, and the loop count used
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    per_call = sorted(t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number))
+    return {
+        "best_us": per_call[0],
+        "median_us": per_call[len(per_call) // 2],
+        "loops": number,
+    }
+
+def check(results, thresholds, baseline=None, tolerance=0.25):
+    """
+    Compare results against absolute thresholds and, optionally, a previous run.
+
+    Args:
+        results (dict): Case name -> measurement
+        thresholds (dict): Case name -> maximum median microseconds per call
+        baseline (dict): Case name -> measurement from a previous run
+        tolerance (float): Allowed slowdown relative to the baseline (0.25 = 25%)
+
+    Returns:
+        list: Human readable descriptions of every regression
+    """
+    regressions = []
+    for name, result in results.items():
+        limit = thresholds.get(name)
+        if limit is not None and result["median_us"] > limit:
+            regressions.append(f"{name}: {result['median_us']:.2f}us exceeds threshold of {limit:.2f}us")
+
+        previous = (baseline or {}).get(name)
+        if previous and result["median_us"] > previous["median_us"] * (1 + tolerance):
+            slowdown = result["median_us"] / previous["median_us"] - 1
+            regressions.append(f"{name}: {slowdown:.0%} slower than baseline ({previous['median_us']:.2f}us -> {result['median_us']:.2f}us)")
+
+    return regressions
+
+def main(args):
+    random.seed(args.seed)
+
+    names = args.cases or list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        raise SystemExit(f"Unknown cases: {', '.join(unknown)}. Choose from: {', '.join(CASES)}")
+
+    results = {}
+    for name in names:
+        results[name] = measure(CASES[name](), repeat=args.repeat)
+        print(f"{name}: {results[name]['median_us']:.2f}us", file=sys.stderr)
+
+    report = {"benchmark": "micro", "environment": environment(), "seed": args.seed, "results": results}
+
+    if args.check or args.baseline:
+        thresholds = {}
+        if args.check:
+            with open(args.thresholds) as f:
+                thresholds = json.load(f)
+
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)["results"]
+
+        report["regressions"] = check(results, thresholds, baseline, args.tolerance)
+
+    write_report(report, args.output)
+
+    if report.get("regressions"):
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark game logic, formatters and embeds")
+    parser.add_argument("cases", nargs="*", help="Cases to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats per case")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for generated inputs")
+    parser.add_argument("--check", action="store_true", help="Fail if a case exceeds its threshold")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH, help="Thresholds file for --check")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    main(parse_args())
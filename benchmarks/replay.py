@@ -0,0 +1,220 @@
+"""
+Replay recorded production commands against the real cogs.
+
+Reads the JSON lines written by utils/command_recorder.py and feeds each
+command to the cogs through the load test harness, at the original pace or
+accelerated, against a local database with a fixed RNG seed. Run it against
+two builds to compare them on the same real-world load.
+
+Usage:
+    python -m benchmarks.replay recordings/commands.jsonl* \\
+        --database-url sqlite:///replay.db --reset-database --speed 10 --seed 42
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+# Make the project root importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fakes import FakeMember
+from benchmarks.load_test import Harness, OperationStats, build_report, configure_database, quiet_logging
+from benchmarks.report import latency_summary, write_report
+
+logger = logging.getLogger(__name__)
+
+def load_records(patterns):
+    """
+    Load recorded commands from files matching the given glob patterns, oldest first.
+
+    Args:
+        patterns (list): File paths or glob patterns (rotated files included)
+
+    Returns:
+        list: Records sorted by timestamp
+    """
+    records = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping malformed record in {path}")
+
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+class Replayer:
+    """Maps recorded commands and user hashes onto a harness and runs them"""
+
+    def __init__(self, harness):
+        self.harness = harness
+        self.members = {}
+        self.commands = {}
+        for cog in harness.bot.cogs.values():
+            for command in cog.get_commands():
+                self.commands[command.qualified_name] = (cog, command)
+
+    def member_for(self, user_hash):
+        """Get the virtual user standing in for a recorded user hash"""
+        member = self.members.get(user_hash)
+        if member is None:
+            # Derive a stable fake id from the hash so replays of the same file match
+            member_id = 10**17 + int(hashlib.sha256(user_hash.encode()).hexdigest()[:12], 16)
+            member = self.harness.add_member(FakeMember(self.harness.guild, name=f"u{user_hash[:8]}", member_id=member_id))
+            self.members[user_hash] = member
+        return member
+
+    def restore(self, value):
+        """Turn a scrubbed argument back into something the command accepts"""
+        if isinstance(value, dict):
+            if "member" in value:
+                return self.member_for(value["member"])
+            # The recorder only kept the type, there is nothing to replay
+            return None
+        return value
+
+    async def run(self, record):
+        """
+        Run one recorded command.
+
+        Returns:
+            tuple: (latency in seconds, exception or None)
+        """
+        from utils import query_profiler
+
+        name = record["cmd"]
+        start = time.perf_counter()
+        try:
+            if name not in self.commands:
+                raise LookupError(f"Unknown command {name}")
+            cog, command = self.commands[name]
+
+            member = self.member_for(record["user"])
+            ctx = self.harness.context(member)
+            ctx.command = command
+            if cog is self.harness.admin:
+                ctx.author = self.harness.owner
+
+            args = [self.restore(arg) for arg in record.get("args", [])]
+            kwargs = {key: self.restore(value) for key, value in record.get("kwargs", {}).items()}
+
+            with query_profiler.profiled(name):
+                await command.callback(cog, ctx, *args, **kwargs)
+
+                if name == "mine":
+                    # Complete the session straight away instead of waiting for the background task
+                    mining_data = self.harness.mining.currently_mining.pop(str(member.id), None)
+                    if mining_data:
+                        await self.harness.mining.complete_mining_session(str(member.id), mining_data)
+            error = None
+        except Exception as e:
+            error = e
+        return time.perf_counter() - start, error
+
+async def replay(replayer, records, speed=1.0, max_in_flight=100):
+    """
+    Replay records, preserving their relative timing scaled by speed.
+
+    Args:
+        replayer (Replayer): The replayer to run records with
+        records (list): Records sorted by timestamp
+        speed (float): Time acceleration factor, or 0 to replay as fast as possible
+        max_in_flight (int): Maximum commands running at once
+
+    Returns:
+        tuple: ({command: OperationStats}, schedule lateness in seconds, wall time)
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    results = {}
+    lateness = []
+    tasks = []
+
+    async def run(record):
+        try:
+            latency, error = await replayer.run(record)
+            results.setdefault(record["cmd"], OperationStats()).record(latency, error)
+        finally:
+            semaphore.release()
+
+    start = loop.time()
+    first_ts = records[0]["ts"] if records else 0
+    for record in records:
+        if speed > 0:
+            due = start + (record["ts"] - first_ts) / speed
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # The replay can't keep up with the recorded pace
+                lateness.append(-delay)
+
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(run(record)))
+
+    await asyncio.gather(*tasks)
+    return results, lateness, loop.time() - start
+
+async def main(args):
+    configure_database(args.database_url)
+    quiet_logging()
+
+    from utils import query_profiler
+
+    records = load_records(args.recordings)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        raise SystemExit("No records found")
+
+    harness = Harness(users=0, seed=args.seed, keep_suspense=args.keep_suspense)
+    await harness.setup(reset_database=args.reset_database)
+    replayer = Replayer(harness)
+
+    query_profiler.reset()
+    query_profiler.enable()
+
+    results, lateness, wall_time = await replay(replayer, records, speed=args.speed, max_in_flight=args.max_in_flight)
+
+    config = {
+        "recordings": args.recordings,
+        "records": len(records),
+        "recorded_span": records[-1]["ts"] - records[0]["ts"],
+        "users": len(replayer.members),
+        "speed": args.speed,
+        "max_in_flight": args.max_in_flight,
+        "seed": args.seed,
+        "suspense": args.keep_suspense,
+    }
+    extra = {
+        "late_records": len(lateness),
+        "schedule_lateness_ms": latency_summary(lateness),
+    }
+    write_report(build_report("replay", config, results, wall_time, extra), args.output)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded commands against the cogs")
+    parser.add_argument("recordings", nargs="+", help="Recording files or glob patterns")
+    parser.add_argument("--database-url", help="Database to run against (default: $DATABASE_URL or sqlite:///loadtest.db)")
+    parser.add_argument("--reset-database", action="store_true", help="Drop and recreate all tables first")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time acceleration, 0 replays as fast as possible")
+    parser.add_argument("--max-in-flight", type=int, default=100, help="Commands running at once")
+    parser.add_argument("--limit", type=int, help="Only replay the first N records")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for game outcomes")
+    parser.add_argument("--keep-suspense", action="store_true", help="Keep the cogs' cosmetic sleep delays")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,78 @@
+"""
+Shared helpers for turning benchmark measurements into machine-readable reports.
+"""
+import datetime
+import json
+import math
+import platform
+import subprocess
+import sys
+
+def percentile(sorted_values, pct):
+    """
+    Get a percentile from already sorted values using the nearest-rank method.
+
+    Args:
+        sorted_values (list): Values sorted ascending
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: The percentile value, or 0 for no values
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def latency_summary(latencies):
+    """
+    Summarize latencies in seconds as milliseconds.
+
+    Args:
+        latencies (list): Latencies in seconds
+
+    Returns:
+        dict: mean, p50, p90, p99 and max in milliseconds
+    """
+    values = sorted(latencies)
+    return {
+        "mean": (sum(values) / len(values) * 1000) if values else 0.0,
+        "p50": percentile(values, 50) * 1000,
+        "p90": percentile(values, 90) * 1000,
+        "p99": percentile(values, 99) * 1000,
+        "max": (values[-1] * 1000) if values else 0.0,
+    }
+
+def _git_revision():
+    """Get the current git commit, if available"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def environment():
+    """Describe the build and machine a benchmark ran on"""
+    return {
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+    }
+
+def write_report(report, path=None):
+    """
+    Write a report as JSON to a file, or stdout if no path is given.
+
+    Args:
+        report (dict): The report to write
+        path (str): Optional output file
+    """
+    text = json.dumps(report, indent=2, default=str)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -5,9 +5,21 @@ import discord
 from discord.ext import commands
 import traceback
 import sys
+import time
 
 # Import configuration
 import config
+from database.database import warm_pool
+from database.health import DATABASE_ERRORS
+from database.settlement import InsufficientFunds, start_journal_replayer
+from database.statistics import start_statistics_recorder
+from database.jackpot import start_jackpot_flusher
+from database.rollups import start_rollup_compactor
+from database.archive import start_retention_job
+from database.batch_jobs import start_batch_jobs
+from utils.formatters import format_currency
+from utils import metrics, query_profiler, sampling_profiler, watchdog, command_recorder, rate_limit
+from utils.events import BUS
 
 # Setup logging
 logging.basicConfig(
@@ -16,6 +28,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger('bot')
 
+# Command instrumentation
+COMMAND_SECONDS = metrics.histogram(
+    "bot_command_duration_seconds", "Time spent running a command", ("command", "status")
+)
+COMMAND_ERRORS = metrics.counter(
+    "bot_command_errors_total", "Commands that ended in an error", ("command", "error")
+)
+GATEWAY_LATENCY = metrics.gauge("discord_gateway_latency_seconds", "Latency between a heartbeat and its acknowledgement")
+
 async def setup_bot():
     """Set up and configure the Discord bot"""
     # Set up intents
@@ -25,6 +46,61 @@ async def setup_bot():
     
     # Create bot instance with prefix specified in config
     bot = commands.Bot(command_prefix=config.COMMAND_PREFIX, intents=intents, description="Discord Gambling Bot")
+    GATEWAY_LATENCY.set_function(lambda: bot.latency)
+    
+    # Let the profiler find the thread and loop the bot runs on
+    sampling_profiler.register_bot_loop(asyncio.get_running_loop())
+    
+    # Watch for handlers that block the event loop
+    if config.WATCHDOG_ENABLED:
+        watchdog.start_watchdog(asyncio.get_running_loop(), sampling_profiler.bot_thread_id())
+    
+    # Record real traffic for replay benchmarks
+    if config.COMMAND_RECORDING_ENABLED or os.getenv("COMMAND_RECORDING") == "1":
+        command_recorder.enable()
+    
+    # Reject spam and cap concurrent database work before any session is opened
+    rate_limit.install(bot)
+    
+    # Deliver settlement events to their subscribers on the bot's loop
+    BUS.start()
+    start_statistics_recorder()
+    start_jackpot_flusher()
+    
+    # Keep the dashboard rollups up to date, from the one bot process rather than every dashboard worker
+    start_rollup_compactor()
+    
+    # Create upcoming partitions and archive old history, also once rather than per worker
+    start_retention_job()
+    
+    # Run the enabled interest, wealth tax and decay jobs here, so the balance cache and leaderboard they reset are this process's
+    start_batch_jobs()
+    
+    # Replay settlements journaled during database outages
+    start_journal_replayer()
+    
+    # Instrument every command invocation
+    @bot.before_invoke
+    async def before_command(ctx):
+        ctx.invoked_at = time.perf_counter()
+        command_recorder.record(ctx)
+        ctx.query_profile = query_profiler.start(ctx.command.qualified_name)
+        watchdog.command_started(asyncio.current_task(), f"{ctx.command.cog_name}.{ctx.command.qualified_name}")
+        # Last, since after_invoke doesn't run when this hook raises and a slot taken earlier would leak
+        try:
+            await rate_limit.acquire_admission(ctx)
+        except rate_limit.Overloaded:
+            watchdog.command_finished(asyncio.current_task())
+            raise
+    
+    @bot.after_invoke
+    async def after_command(ctx):
+        rate_limit.release_admission(ctx)
+        elapsed = time.perf_counter() - ctx.invoked_at
+        status = "error" if ctx.command_failed else "ok"
+        COMMAND_SECONDS.labels(command=ctx.command.qualified_name, status=status).observe(elapsed)
+        query_profiler.finish(ctx.query_profile)
+        watchdog.command_finished(asyncio.current_task())
     
     # Set bot status
     @bot.event
@@ -40,6 +116,10 @@ async def setup_bot():
             if mining_cog:
                 bot.loop.create_task(mining_cog.mining_update_task())
                 logger.info("Mining background task started")
+            blackjack_cog = bot.get_cog("Blackjack")
+            if blackjack_cog:
+                bot.loop.create_task(blackjack_cog.hand_expiry_task())
+                logger.info("Blackjack expiry task started")
         
         logger.info("Bot is ready!")
     
@@ -48,6 +128,19 @@ async def setup_bot():
     async def on_command_error(ctx, error):
         if isinstance(error, commands.CommandNotFound):
             return
+        
+        COMMAND_ERRORS.labels(command=ctx.command.qualified_name if ctx.command else "unknown", error=type(error).__name__).inc()
+        
+        if isinstance(error, rate_limit.RateLimited):
+            if error.notify:
+                await ctx.send(f"⏳ Slow down! Try again in {error.retry_after:.1f} seconds.")
+        elif isinstance(error, commands.CommandInvokeError) and isinstance(error.original, DATABASE_ERRORS):
+            await ctx.send("⚠️ The database is temporarily unavailable. Please try again in a moment.")
+        elif isinstance(error, commands.CommandInvokeError) and isinstance(error.original, InsufficientFunds):
+            # Another command spent the balance while this game was being played
+            await ctx.send(f"❌ Your balance changed while the game was being played and can no longer cover the {format_currency(error.original.bet)} bet. The bet was cancelled.")
+        elif isinstance(error, rate_limit.Overloaded):
+            await ctx.send("⚠️ The casino is very busy right now. Please try again in a moment.")
         elif isinstance(error, commands.MissingRequiredArgument):
             await ctx.send(f"Missing required argument: {error.param.name}. Use `{config.COMMAND_PREFIX}help {ctx.command}` for proper usage.")
         elif isinstance(error, commands.BadArgument):
@@ -72,11 +165,15 @@ async def setup_bot():
         await bot.load_extension("cogs.mining")
         await bot.load_extension("cogs.admin")
         await bot.load_extension("cogs.extended_slots")  # Load our new extended slots cog
+        await bot.load_extension("cogs.blackjack")
         logger.info("All cogs loaded successfully")
     except Exception as e:
         logger.error(f"Failed to load cogs: {e}")
         traceback.print_exception(type(e), e, e.__traceback__, file=sys.stderr)
     
+    # Open pooled connections before on_ready, so the first commands don't pay for them
+    await asyncio.to_thread(warm_pool)
+    
     return bot
 
 if __name__ == "__main__":
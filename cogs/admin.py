@@ -5,17 +5,27 @@ from database.models import User, Transaction, TransactionType
 from sqlalchemy import select
 import os
 import sys
+import io
+import asyncio
 import logging
+import typing
 
 # Add the parent directory to the path to find the config module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
-from utils.formatters import format_currency
+from utils.formatters import format_currency, format_cents, is_whole_cents
 from utils.helpers import create_user_if_not_exists
+from utils import query_profiler, sampling_profiler
+from utils.events import BUS, BalanceChanged
+from utils.cache import balance_cache
+from database import reconciliation, bulk
 
 # Configure logging
 logger = logging.getLogger('admin')
 
+# Longest value Discord accepts for an embed field
+EMBED_FIELD_LIMIT = 1024
+
 class Admin(commands.Cog):
     """Admin commands for the gambling bot (owner only)"""
     
@@ -31,8 +41,8 @@ class Admin(commands.Cog):
     async def admin_add_balance(self, ctx, user: discord.Member, amount: float):
         """[ADMIN] Add balance to a user's account"""
         
-        if amount <= 0:
-            await ctx.send("❌ Amount must be positive!")
+        if not is_whole_cents(amount):
+            await ctx.send("❌ Amount must be at least $0.01, in whole cents!")
             return
         
         with get_session() as session:
@@ -58,15 +68,21 @@ class Admin(commands.Cog):
             )
             
             embed.add_field(name="New Balance", value=format_currency(target_user.balance), inline=False)
-            
-            await ctx.send(embed=embed)
+            change = BalanceChanged(target_user.discord_id, target_user.username, amount, target_user.balance, TransactionType.ADMIN.value)
+        
+        # Sent once the change is committed and the writer slot released
+        await ctx.send(embed=embed)
+        
+        # Published once the change is committed
+        balance_cache.set(change.discord_id, change.new_balance)
+        BUS.publish(change)
     
     @commands.command(name="admin_removebalance", aliases=["removebal"])
     async def admin_remove_balance(self, ctx, user: discord.Member, amount: float):
         """[ADMIN] Remove balance from a user's account"""
         
-        if amount <= 0:
-            await ctx.send("❌ Amount must be positive!")
+        if not is_whole_cents(amount):
+            await ctx.send("❌ Amount must be at least $0.01, in whole cents!")
             return
         
         with get_session() as session:
@@ -95,8 +111,14 @@ class Admin(commands.Cog):
             )
             
             embed.add_field(name="New Balance", value=format_currency(target_user.balance), inline=False)
-            
-            await ctx.send(embed=embed)
+            change = BalanceChanged(target_user.discord_id, target_user.username, -amount, target_user.balance, TransactionType.ADMIN.value)
+        
+        # Sent once the change is committed and the writer slot released
+        await ctx.send(embed=embed)
+        
+        # Published once the change is committed
+        balance_cache.set(change.discord_id, change.new_balance)
+        BUS.publish(change)
     
     @commands.command(name="admin_resetbalance", aliases=["resetbal"])
     async def admin_reset_balance(self, ctx, user: discord.Member):
@@ -129,8 +151,14 @@ class Admin(commands.Cog):
             )
             
             embed.add_field(name="Previous Balance", value=format_currency(old_balance), inline=False)
-            
-            await ctx.send(embed=embed)
+            change = BalanceChanged(target_user.discord_id, target_user.username, -old_balance, 0, TransactionType.ADMIN.value)
+        
+        # Sent once the change is committed and the writer slot released
+        await ctx.send(embed=embed)
+        
+        # Published once the change is committed
+        balance_cache.set(change.discord_id, change.new_balance)
+        BUS.publish(change)
     
     @commands.command(name="admin_resetmining", aliases=["resetmine"])
     async def admin_reset_mining(self, ctx, user: discord.Member):
@@ -151,19 +179,138 @@ class Admin(commands.Cog):
                 description=f"Reset {user.mention}'s mining stats to default",
                 color=discord.Color.red()
             )
-            
-            await ctx.send(embed=embed)
+        
+        await ctx.send(embed=embed)
+    
+    async def _resolve_targets(self, ctx, targets):
+        """
+        Resolve bulk command targets: roles, members, "everyone" (this server) or "all" (every account).
+        
+        Returns:
+            tuple: (members needing an account, Discord ids or None for every account, label)
+        """
+        if not targets:
+            raise ValueError('Name at least one role or member, "everyone" or "all"')
+        
+        members = {}
+        labels = []
+        for target in targets:
+            if isinstance(target, str):
+                if target.lower() == "all":
+                    return [], None, "every account"
+                if target.lower() != "everyone" or ctx.guild is None:
+                    raise ValueError(f"Unknown target {target!r}")
+                members.update((member.id, member) for member in ctx.guild.members if not member.bot)
+                labels.append("everyone")
+            elif isinstance(target, discord.Role):
+                members.update((member.id, member) for member in target.members if not member.bot)
+                labels.append(target.mention)
+            else:
+                members[target.id] = target
+                labels.append(target.mention)
+        
+        return list(members.values()), [str(member_id) for member_id in members], ", ".join(labels)
+    
+    async def _run_bulk(self, ctx, title, targets, operation):
+        """Create missing accounts and run a bulk operation off the event loop, reporting progress"""
+        try:
+            members, discord_ids, label = await self._resolve_targets(ctx, targets)
+        except ValueError as e:
+            await ctx.send(f"❌ {e}")
+            return None
+        
+        message = await ctx.send(f"⏳ {title} for {label}...")
+        loop = asyncio.get_running_loop()
+        last_edit = 0.0
+        
+        def progress(stage, done, total):
+            # Called from the worker thread, so hand the edit back to the event loop
+            nonlocal last_edit
+            now = loop.time()
+            if now - last_edit >= config.BULK_PROGRESS_INTERVAL or done == total:
+                last_edit = now
+                asyncio.run_coroutine_threadsafe(
+                    message.edit(content=f"⏳ {title} for {label}: {stage} {done}/{total}"), loop
+                )
+        
+        def run():
+            created = bulk.ensure_users(members, progress) if members else 0
+            result = operation(discord_ids, progress)
+            result.created = created
+            return result
+        
+        result = await asyncio.to_thread(run)
+        await message.edit(content=f"✅ {title} for {label} done.")
+        return result
+    
+    @commands.command(name="admin_bulkadd", aliases=["bulkaddbal"])
+    async def admin_bulk_add_balance(self, ctx, amount: float, *targets: typing.Union[discord.Role, discord.Member, str]):
+        """[ADMIN] Add balance to a role, members, everyone or all accounts"""
+        
+        if not is_whole_cents(amount):
+            await ctx.send("❌ Amount must be at least $0.01, in whole cents!")
+            return
+        
+        result = await self._run_bulk(
+            ctx, "Adding balance", targets,
+            lambda ids, progress: bulk.bulk_adjust_balance("add", ids, ctx.author.name, amount, progress)
+        )
+        if result is not None:
+            await ctx.send(embed=self._bulk_embed("✅ Bulk Balance Addition", result, discord.Color.green()))
+    
+    @commands.command(name="admin_bulkremove", aliases=["bulkremovebal"])
+    async def admin_bulk_remove_balance(self, ctx, amount: float, *targets: typing.Union[discord.Role, discord.Member, str]):
+        """[ADMIN] Remove balance from a role, members, everyone or all accounts"""
+        
+        if not is_whole_cents(amount):
+            await ctx.send("❌ Amount must be at least $0.01, in whole cents!")
+            return
+        
+        result = await self._run_bulk(
+            ctx, "Removing balance", targets,
+            lambda ids, progress: bulk.bulk_adjust_balance("remove", ids, ctx.author.name, amount, progress)
+        )
+        if result is not None:
+            await ctx.send(embed=self._bulk_embed("✅ Bulk Balance Removal", result, discord.Color.yellow()))
+    
+    @commands.command(name="admin_bulkreset", aliases=["bulkresetbal"])
+    async def admin_bulk_reset_balance(self, ctx, *targets: typing.Union[discord.Role, discord.Member, str]):
+        """[ADMIN] Reset the balance of a role, members, everyone or all accounts to 0"""
+        
+        result = await self._run_bulk(
+            ctx, "Resetting balances", targets,
+            lambda ids, progress: bulk.bulk_adjust_balance("reset", ids, ctx.author.name, progress=progress)
+        )
+        if result is not None:
+            await ctx.send(embed=self._bulk_embed("✅ Bulk Balance Reset", result, discord.Color.red()))
+    
+    @commands.command(name="admin_bulkresetmining", aliases=["bulkresetmine"])
+    async def admin_bulk_reset_mining(self, ctx, *targets: typing.Union[discord.Role, discord.Member, str]):
+        """[ADMIN] Reset the mining stats of a role, members, everyone or all accounts"""
+        
+        result = await self._run_bulk(ctx, "Resetting mining stats", targets, bulk.bulk_reset_mining)
+        if result is not None:
+            await ctx.send(embed=self._bulk_embed("✅ Bulk Mining Reset", result, discord.Color.red()))
+    
+    def _bulk_embed(self, title, result, color):
+        embed = discord.Embed(title=title, color=color)
+        embed.add_field(name="Accounts Updated", value=str(result.users), inline=True)
+        embed.add_field(name="Accounts Created", value=str(result.created), inline=True)
+        if result.ledger_rows:
+            embed.add_field(name="Transactions", value=str(result.ledger_rows), inline=True)
+            embed.add_field(name="Net Change", value=format_cents(result.net_cents), inline=True)
+        return embed
     
     @commands.command(name="admin_stats")
     async def admin_stats(self, ctx):
         """[ADMIN] Get statistics about the bot and economy"""
         
-        with get_session() as session:
+        with get_session(readonly=True) as session:
             # Count total users
             user_count = session.scalar(select(func.count()).select_from(User))
             
-            # Get total currency in circulation
-            total_currency = session.scalar(select(func.sum(User.balance)).select_from(User)) or 0
+            # Get total currency in circulation, summed exactly in cents
+            total_cents = session.scalar(select(func.sum(User.balance_in_cents)).select_from(User)) or 0
             
             # Get richest user
             richest_user = session.execute(
@@ -177,10 +324,8 @@ class Admin(commands.Cog):
             bot_stats = session.scalar(select(BotStatistics).limit(1))
             
             if not bot_stats:
-                # Create stats record if it doesn't exist
-                bot_stats = BotStatistics()
-                session.add(bot_stats)
-                session.flush()
+                # Nothing recorded yet (read-only session, so don't create the record here)
+                bot_stats = BotStatistics(total_bets=0, total_bet_amount=0.0, total_payout_amount=0.0, total_mined=0.0)
             
             # Create embed
             embed = discord.Embed(
@@ -189,7 +334,7 @@ class Admin(commands.Cog):
             )
             
             embed.add_field(name="Total Users", value=str(user_count), inline=True)
-            embed.add_field(name="Total Currency", value=format_currency(total_currency), inline=True)
+            embed.add_field(name="Total Currency", value=format_cents(total_cents), inline=True)
             
             if richest_user:
                 embed.add_field(
@@ -220,6 +365,142 @@ class Admin(commands.Cog):
             
             await ctx.send(embed=embed)
 
+    @commands.command(name="admin_queryprofile", aliases=["queryprofile"])
+    async def admin_query_profile(self, ctx, action: str = "top", limit: int = 10):
+        """[ADMIN] Control the SQL profiler: on, off, reset, or top [limit]"""
+        
+        action = action.lower()
+        
+        if action == "on":
+            query_profiler.enable()
+            await ctx.send("✅ Query profiling enabled.")
+            return
+        elif action == "off":
+            query_profiler.disable()
+            await ctx.send("✅ Query profiling disabled.")
+            return
+        elif action == "reset":
+            query_profiler.reset()
+            await ctx.send("✅ Query profiler statistics cleared.")
+            return
+        elif action != "top":
+            await ctx.send("❌ Invalid action! Choose from: on, off, reset, top")
+            return
+        
+        # Limit the number of commands to what fits in an embed
+        limit = max(1, min(limit, 20))
+        offenders = query_profiler.top_offenders(limit)
+        
+        embed = discord.Embed(
+            title="🔍 Query Profile",
+            description=f"Profiling is **{'on' if query_profiler.is_enabled() else 'off'}**",
+            color=discord.Color.blue()
+        )
+        
+        if not offenders:
+            embed.add_field(name="No Data", value="No commands have been profiled yet.", inline=False)
+        
+        for stats in offenders:
+            value = (
+                f"Invocations: {stats.invocations}\n"
+                f"Statements: {stats.avg_statements:.1f} avg, {stats.max_statements} max\n"
+                f"DB time: {stats.avg_db_time * 1000:.1f}ms avg"
+            )
+            
+            if stats.repeated:
+                statement, count = stats.repeated.most_common(1)[0]
+                value += f"\nRepeated ×{count}: `{' '.join(statement.split())[:80]}`"
+            
+            embed.add_field(name=stats.name, value=value, inline=False)
+        
+        await ctx.send(embed=embed)
+
+    @commands.command(name="admin_profile", aliases=["profile"])
+    async def admin_profile(self, ctx, seconds: float = 10.0):
+        """[ADMIN] Sample the bot for N seconds and upload a collapsed-stack profile"""
+        
+        if seconds <= 0:
+            await ctx.send("❌ Duration must be positive!")
+            return
+        
+        seconds = min(seconds, config.PROFILER_MAX_SECONDS)
+        await ctx.send(f"🔬 Profiling for {seconds:g} seconds...")
+        
+        # Sample from a worker thread so the event loop keeps running while we watch it
+        try:
+            result = await asyncio.to_thread(sampling_profiler.profile, seconds)
+        except RuntimeError as e:
+            await ctx.send(f"❌ {e}")
+            return
+        
+        embed = discord.Embed(
+            title="🔬 Profile Complete",
+            description=f"{result.samples} samples over {result.duration:g}s "
+                        f"({result.idle_samples} idle)",
+            color=discord.Color.blue()
+        )
+        
+        coroutines = result.slowest_coroutines(5)
+        embed.add_field(
+            name="Busiest Coroutines",
+            value="\n".join(f"`{name}`: ~{seconds_busy * 1000:.0f}ms" for name, count, seconds_busy in coroutines) or "None",
+            inline=False
+        )
+        
+        blocks = result.longest_blocks(5)
+        embed.add_field(
+            name="Longest Event Loop Blocks",
+            value="\n".join(f"{blocked * 1000:.0f}ms at {when.strftime('%H:%M:%S')}" for blocked, when in blocks) or "None",
+            inline=False
+        )
+        
+        profile_file = discord.File(io.BytesIO(result.collapsed().encode()), filename="profile.collapsed")
+        await ctx.send(embed=embed, file=profile_file)
+
+    @commands.command(name="admin_reconcile", aliases=["reconcile"])
+    async def admin_reconcile(self, ctx):
+        """[ADMIN] Check every balance against the ledger and report drift"""
+        
+        await ctx.send("🧮 Reconciling balances with the ledger...")
+        
+        # Streams the whole ledger, so keep it off the event loop
+        report = await asyncio.to_thread(reconciliation.reconcile)
+        run = report.run
+        
+        embed = discord.Embed(
+            title="🧮 Ledger Reconciliation",
+            description=f"{run.users_checked} users checked in {(run.finished_at - run.started_at).total_seconds():.1f}s",
+            color=discord.Color.green() if run.mismatched_users == 0 else discord.Color.red()
+        )
+        
+        embed.add_field(name="Mismatched Users", value=f"{run.mismatched_users} ({report.mismatch_rate:.2%})", inline=True)
+        embed.add_field(name="Net Drift", value=format_cents(run.net_drift_cents), inline=True)
+        embed.add_field(name="Absolute Drift", value=format_cents(run.absolute_drift_cents), inline=True)
+        
+        if report.drift_cents_per_day is not None:
+            embed.add_field(
+                name="Since Last Run",
+                value=f"{format_cents(round(report.drift_cents_per_day))} drift per day, "
+                      f"{report.new_mismatches_per_day:+.1f} mismatched users per day",
+                inline=False
+            )
+        
+        if report.largest:
+            # Embed field values are capped at 1024 characters, so shorten long names and drop lines that don't fit
+            lines = []
+            length = 0
+            for shown, m in enumerate(report.largest):
+                name = m.username if len(m.username) <= 32 else m.username[:31] + "…"
+                line = f"{name}: balance {format_cents(m.balance_cents)}, ledger {format_cents(m.ledger_cents)}"
+                if length + len(line) + 1 > EMBED_FIELD_LIMIT - 20:
+                    lines.append(f"...and {len(report.largest) - shown} more")
+                    break
+                lines.append(line)
+                length += len(line) + 1
+            embed.add_field(name="Largest Mismatches", value="\n".join(lines), inline=False)
+        
+        await ctx.send(embed=embed)
+
 from sqlalchemy import func
 
 async def setup(bot):
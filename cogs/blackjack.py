@@ -0,0 +1,372 @@
+import discord
+from discord.ext import commands
+from database.models import GameType
+from database.settlement import escrow_bet, settle_bet, refund_stale_escrows, InsufficientFunds
+from database.health import DATABASE_ERRORS
+import os
+import sys
+import random
+import asyncio
+import logging
+import secrets
+
+# Add the parent directory to the path to find the config module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from utils.formatters import format_currency, is_whole_cents
+from utils.game_state import GameStateStore
+from utils import metrics
+
+# Configure logging
+logger = logging.getLogger('blackjack')
+
+# Cards are numbered 0-51: rank is card % 13 (0 = ace), suit is card // 13
+CARD_RANKS = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K")
+CARD_SUITS = ("♠", "♥", "♦", "♣")
+
+BLACKJACK_OPEN_HANDS = metrics.gauge("blackjack_open_hands", "Blackjack hands waiting for the player")
+BLACKJACK_HANDS_EXPIRED = metrics.counter("blackjack_hands_expired_total", "Blackjack hands stood automatically after the hand TTL")
+
+class Shoe:
+    """
+    A shoe of several decks, stored as the count of each card left.
+
+    Cards are drawn without replacement like from a shuffled shoe, but the
+    shoe takes 52 bytes whatever the number of decks and costs nothing to
+    shuffle, so every hand can have its own.
+    """
+    __slots__ = ("counts", "remaining")
+
+    def __init__(self, decks):
+        self.counts = bytearray([decks]) * 52
+        self.remaining = decks * 52
+
+    def draw(self):
+        """Draw a random card from the shoe"""
+        position = random.randrange(self.remaining)
+        for card, count in enumerate(self.counts):
+            position -= count
+            if position < 0:
+                self.counts[card] -= 1
+                self.remaining -= 1
+                return card
+
+class Hand:
+    """An open blackjack hand, kept in memory between the player's commands"""
+    __slots__ = ("stake", "bet", "channel_id", "player_name", "shoe", "player", "dealer", "doubled")
+
+    def __init__(self, stake, bet, channel_id, player_name, shoe):
+        self.stake = stake  # Escrowed stake from escrow_bet()
+        self.bet = bet  # Total escrowed, doubled by !double
+        self.channel_id = channel_id
+        self.player_name = player_name
+        self.shoe = shoe
+        self.player = bytearray()
+        self.dealer = bytearray()
+        self.doubled = False
+
+def format_cards(cards):
+    """Format cards for display, e.g. "A♠ 10♥" """
+    return " ".join(f"{CARD_RANKS[card % 13]}{CARD_SUITS[card // 13]}" for card in cards)
+
+def hand_value(cards):
+    """
+    Get the best blackjack value of some cards.
+
+    Returns:
+        tuple: (value, soft), soft when an ace is counted as 11
+    """
+    total = 0
+    aces = False
+    for card in cards:
+        rank = card % 13
+        total += min(rank + 1, 10)
+        aces = aces or rank == 0
+    if aces and total + 10 <= 21:
+        return total + 10, True
+    return total, False
+
+def is_natural(cards):
+    """Whether cards are a blackjack: 21 with the first two cards"""
+    return len(cards) == 2 and hand_value(cards)[0] == 21
+
+def deal(shoe):
+    """
+    Deal the opening cards.
+
+    Returns:
+        tuple: (player cards, dealer cards)
+    """
+    player, dealer = bytearray(), bytearray()
+    for _ in range(2):
+        player.append(shoe.draw())
+        dealer.append(shoe.draw())
+    return player, dealer
+
+def play_dealer(shoe, dealer):
+    """Draw dealer cards until the dealer stands"""
+    while True:
+        value, soft = hand_value(dealer)
+        if value > 17 or (value == 17 and not (soft and config.BLACKJACK_DEALER_HITS_SOFT_17)):
+            return
+        dealer.append(shoe.draw())
+
+def score_hand(player, dealer, bet):
+    """
+    Score a finished hand.
+
+    A push is paid as a win of the bet, so the player gets the stake back.
+
+    Args:
+        player (bytearray): Player cards
+        dealer (bytearray): Dealer cards, after the dealer has played
+        bet (float): Total bet, including any double
+
+    Returns:
+        tuple: (win, payout, outcome)
+    """
+    player_value = hand_value(player)[0]
+    dealer_value = hand_value(dealer)[0]
+    if player_value > 21:
+        return False, 0, "BUST"
+    if is_natural(player) and not is_natural(dealer):
+        return True, bet * config.BLACKJACK_NATURAL_MULTIPLIER, "BLACKJACK"
+    if is_natural(dealer) and not is_natural(player):
+        return False, 0, "DEALER BLACKJACK"
+    if dealer_value > 21:
+        return True, bet * config.BLACKJACK_MULTIPLIER, "DEALER BUST"
+    if player_value > dealer_value:
+        return True, bet * config.BLACKJACK_MULTIPLIER, "WIN"
+    if player_value == dealer_value:
+        return True, bet, "PUSH"
+    return False, 0, "LOSE"
+
+class Blackjack(commands.Cog):
+    """Blackjack commands for the gambling bot"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        # Open hands by Discord id, only touched from the bot's loop
+        self.hands = GameStateStore(config.BLACKJACK_HAND_TTL, config.BLACKJACK_MAX_HANDS)
+        BLACKJACK_OPEN_HANDS.set_function(lambda: len(self.hands))
+
+    async def hand_expiry_task(self):
+        """Background task that stands hands the player abandoned and refunds escrows nobody settled"""
+        await self.bot.wait_until_ready()
+
+        loop = asyncio.get_running_loop()
+        next_escrow_sweep = loop.time()
+        while not self.bot.is_closed():
+            for discord_id, hand in self.hands.expired():
+                BLACKJACK_HANDS_EXPIRED.inc()
+                try:
+                    embed = self.finish_hand(hand, "⏰ Time's up, your hand was stood automatically.")
+                    channel = self.bot.get_channel(hand.channel_id)
+                    if channel is not None:
+                        await channel.send(embed=embed)
+                except Exception as e:
+                    # The escrow stays held and is refunded by the sweep below
+                    logger.error(f"Error standing expired blackjack hand of {discord_id}: {e}")
+
+            # Hands lost with a crashed process (or a failed settlement) still hold their bet
+            if loop.time() >= next_escrow_sweep:
+                next_escrow_sweep = loop.time() + config.BLACKJACK_ESCROW_SWEEP_INTERVAL
+                try:
+                    refunded = await asyncio.to_thread(refund_stale_escrows)
+                    if refunded:
+                        logger.info(f"Refunded {refunded} unsettled blackjack escrows")
+                except DATABASE_ERRORS as e:
+                    logger.warning(f"Escrow refund sweep failed, retrying later: {e}")
+                except Exception as e:
+                    logger.error(f"Error refunding unsettled escrows: {e}")
+
+            await asyncio.sleep(config.BLACKJACK_SWEEP_INTERVAL)
+
+    def build_embed(self, hand, title, color, reveal=False):
+        """Build an embed showing the hand, with the dealer's hole card hidden unless revealed"""
+        embed = discord.Embed(
+            title=title,
+            description=f"**{hand.player_name}** bet {format_currency(hand.bet)}",
+            color=color
+        )
+        embed.add_field(
+            name=f"Your Hand ({hand_value(hand.player)[0]})",
+            value=format_cards(hand.player),
+            inline=True
+        )
+        if reveal:
+            embed.add_field(
+                name=f"Dealer's Hand ({hand_value(hand.dealer)[0]})",
+                value=format_cards(hand.dealer),
+                inline=True
+            )
+        else:
+            embed.add_field(
+                name="Dealer's Hand",
+                value=f"{format_cards(hand.dealer[:1])} 🂠",
+                inline=True
+            )
+        return embed
+
+    def finish_hand(self, hand, note=None):
+        """
+        Play the dealer, settle the hand and build the result embed.
+
+        The hand must already be out of the store. If settlement fails the
+        escrowed bet stays held until refund_stale_escrows() returns it.
+        """
+        if hand_value(hand.player)[0] <= 21:
+            play_dealer(hand.shoe, hand.dealer)
+        win, payout, outcome = score_hand(hand.player, hand.dealer, hand.bet)
+
+        # Create game result data
+        game_result = {
+            "player": format_cards(hand.player),
+            "dealer": format_cards(hand.dealer),
+            "doubled": hand.doubled,
+            "outcome": outcome,
+            "win": win
+        }
+
+        # Release the escrow and apply the outcome in one transaction
+        new_balance = settle_bet(hand.stake, GameType.BLACKJACK, hand.bet, win, payout, game_result)
+
+        if outcome == "PUSH":
+            embed = self.build_embed(hand, "🃏 Blackjack: Push", discord.Color.light_grey(), reveal=True)
+            embed.add_field(name="🤝 Push", value=f"Your {format_currency(hand.bet)} bet was returned.", inline=False)
+        elif win:
+            embed = self.build_embed(hand, f"🃏 Blackjack: {outcome.title()}", discord.Color.green(), reveal=True)
+            embed.add_field(name=f"🎉 {outcome}!", value=f"You won {format_currency(payout)}!", inline=False)
+        else:
+            embed = self.build_embed(hand, f"🃏 Blackjack: {outcome.title()}", discord.Color.red(), reveal=True)
+            embed.add_field(name=f"😢 {outcome}", value=f"You lost {format_currency(hand.bet)}!", inline=False)
+
+        if note:
+            embed.add_field(name="Note", value=note, inline=False)
+        embed.add_field(name="New Balance", value=format_currency(new_balance), inline=False)
+        return embed
+
+    def build_open_embed(self, hand, discord_id):
+        """Build the embed for a hand waiting for the player"""
+        embed = self.build_embed(hand, "🃏 Blackjack", discord.Color.blue())
+        actions = f"`{config.COMMAND_PREFIX}hit` or `{config.COMMAND_PREFIX}stand`"
+        if len(hand.player) == 2:
+            actions = f"`{config.COMMAND_PREFIX}hit`, `{config.COMMAND_PREFIX}stand` or `{config.COMMAND_PREFIX}double`"
+        embed.add_field(name="Your Move", value=actions, inline=False)
+        embed.set_footer(text=f"The hand stands automatically in {self.hands.remaining(discord_id):.0f} seconds")
+        return embed
+
+    async def send_no_hand(self, ctx):
+        await ctx.send(f"❌ You don't have a hand in progress. Start one with `{config.COMMAND_PREFIX}blackjack <bet amount>`.")
+
+    @commands.command(name="blackjack", aliases=["bj", "21"])
+    async def blackjack(self, ctx, bet: float):
+        """
+        Play a hand of blackjack against the dealer. Blackjack pays 3:2.
+        Usage: !blackjack <bet amount>, then !hit, !stand or !double
+        """
+
+        # Validate bet amount
+        if not is_whole_cents(bet):
+            await ctx.send("❌ Bet amount must be at least $0.01, in whole cents!")
+            return
+
+        discord_id = str(ctx.author.id)
+        if discord_id in self.hands:
+            await ctx.send(f"❌ You already have a hand in progress! Use `{config.COMMAND_PREFIX}hit` or `{config.COMMAND_PREFIX}stand`.")
+            return
+        if len(self.hands) >= self.hands.max_entries:
+            await ctx.send("⚠️ The blackjack tables are full right now. Please try again in a moment.")
+            return
+
+        # The bet leaves the balance now, so it can't be spent while the hand is open
+        try:
+            stake = escrow_bet(ctx.author, GameType.BLACKJACK, secrets.token_hex(6), bet)
+        except InsufficientFunds as e:
+            embed = discord.Embed(
+                title="❌ Insufficient Funds",
+                description=f"You don't have enough funds to bet {format_currency(bet)}.\nYour balance: {format_currency(e.balance)}",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+
+        # Every hand gets its own fresh shoe
+        hand = Hand(stake, bet, ctx.channel.id, ctx.author.name, Shoe(config.BLACKJACK_DECKS))
+        hand.player, hand.dealer = deal(hand.shoe)
+
+        # A blackjack on either side ends the hand straight away
+        if is_natural(hand.player) or is_natural(hand.dealer):
+            await ctx.send(embed=self.finish_hand(hand))
+            return
+
+        self.hands.add(discord_id, hand)
+        await ctx.send(embed=self.build_open_embed(hand, discord_id))
+
+    @commands.command(name="hit")
+    async def hit(self, ctx):
+        """
+        Draw another card in your blackjack hand.
+        Usage: !hit
+        """
+        discord_id = str(ctx.author.id)
+        hand = self.hands.get(discord_id)
+        if hand is None:
+            await self.send_no_hand(ctx)
+            return
+
+        hand.player.append(hand.shoe.draw())
+
+        # Busting or reaching 21 ends the hand
+        if hand_value(hand.player)[0] >= 21:
+            self.hands.pop(discord_id)
+            await ctx.send(embed=self.finish_hand(hand))
+            return
+
+        await ctx.send(embed=self.build_open_embed(hand, discord_id))
+
+    @commands.command(name="stand")
+    async def stand(self, ctx):
+        """
+        Keep your blackjack hand and let the dealer play.
+        Usage: !stand
+        """
+        discord_id = str(ctx.author.id)
+        if self.hands.get(discord_id) is None:
+            await self.send_no_hand(ctx)
+            return
+
+        hand = self.hands.pop(discord_id)
+        await ctx.send(embed=self.finish_hand(hand))
+
+    @commands.command(name="double", aliases=["dd"])
+    async def double(self, ctx):
+        """
+        Double your bet on your first two cards, draw one card and stand.
+        Usage: !double
+        """
+        discord_id = str(ctx.author.id)
+        hand = self.hands.get(discord_id)
+        if hand is None:
+            await self.send_no_hand(ctx)
+            return
+        if len(hand.player) != 2:
+            await ctx.send("❌ You can only double on your first two cards!")
+            return
+
+        # Escrow the second bet as well
+        try:
+            escrow_bet(ctx.author, GameType.BLACKJACK, hand.stake.escrow_reference, hand.bet, stake=hand.stake)
+        except InsufficientFunds as e:
+            await ctx.send(f"❌ You don't have enough funds to double your bet.\nYour balance: {format_currency(e.balance)}")
+            return
+
+        # Nothing was awaited since get(), so the expiry task can't have stood the hand meanwhile
+        self.hands.pop(discord_id)
+        hand.bet *= 2
+        hand.doubled = True
+        hand.player.append(hand.shoe.draw())
+        await ctx.send(embed=self.finish_hand(hand))
+
+async def setup(bot):
+    await bot.add_cog(Blackjack(bot))
@@ -13,8 +13,14 @@ import logging
 # Add the parent directory to the path to find the config module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
-from utils.formatters import format_currency, format_time
-from utils.helpers import create_user_if_not_exists
+from utils.formatters import format_currency, format_time, is_whole_cents
+from utils.helpers import create_user_if_not_exists, get_user, new_user
+from utils.cache import balance_cache, leaderboard_cache, live_leaderboard
+from utils.events import BUS, BalanceChanged
+from database.health import DATABASE_ERRORS
+
+# Shown when a command needs the database and has nothing cached to fall back to
+DATABASE_UNAVAILABLE_MESSAGE = "⚠️ The database is temporarily unavailable. Please try again in a moment."
 
 # Configure logging
 logger = logging.getLogger('economy')
@@ -24,29 +30,56 @@ class Economy(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
+        
+        # Keep the leaderboard current from balance changes instead of reading it for every command
+        self.leaderboard_updates = BUS.subscribe(
+            BalanceChanged,
+            lambda event: live_leaderboard.update(event.discord_id, event.username, event.new_balance),
+            name="leaderboard"
+        )
+    
+    def cog_unload(self):
+        BUS.unsubscribe(self.leaderboard_updates)
     
     @commands.command(name="balance", aliases=["bal"])
     async def balance(self, ctx):
         """Check your current balance"""
         
-        # Ensure user exists in database
-        with get_session() as session:
-            user = create_user_if_not_exists(session, ctx.author)
-            
-            # Create embed to display balance
-            embed = discord.Embed(
-                title="💰 Your Balance",
-                description=f"You have {format_currency(user.balance)}",
-                color=discord.Color.green()
-            )
+        cache_age = None
+        try:
+            # Ensure user exists in database
+            with get_session() as session:
+                user = create_user_if_not_exists(session, ctx.author)
+                balance = user.balance
+            balance_cache.set(str(ctx.author.id), balance)
+        except DATABASE_ERRORS:
+            # Fall back to the last balance we saw while the database is down
+            balance, cache_age = balance_cache.get(str(ctx.author.id))
+            if balance is None:
+                await ctx.send(DATABASE_UNAVAILABLE_MESSAGE)
+                return
+        
+        # Create embed to display balance
+        embed = discord.Embed(
+            title="💰 Your Balance",
+            description=f"You have {format_currency(balance)}",
+            color=discord.Color.green()
+        )
+        
+        if cache_age is not None:
+            embed.set_footer(text=f"⚠️ Database unavailable, showing your balance from {format_time(cache_age)} ago")
+        else:
             embed.set_footer(text=f"Requested by {ctx.author.name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else None)
-            
-            await ctx.send(embed=embed)
+        
+        await ctx.send(embed=embed)
     
     @commands.command(name="daily")
     async def daily(self, ctx):
         """Claim your daily reward"""
         
+        # Messages are sent once the session has closed: a write transaction holds
+        # SQLite's writer slot until it commits, so it mustn't await in between
+        change = None
         with get_session() as session:
             user = create_user_if_not_exists(session, ctx.author)
             
@@ -67,43 +100,47 @@ class Economy(commands.Cog):
                     description=f"You've already claimed your daily reward.\nCome back in {hours}h {minutes}m {seconds}s",
                     color=discord.Color.red()
                 )
-                await ctx.send(embed=embed)
-                return
-            
-            # Calculate daily reward amount (base amount + random bonus)
-            daily_amount = config.DAILY_REWARD_BASE + random.randint(0, config.DAILY_REWARD_BONUS)
-            
-            # Update user
-            user.balance += daily_amount
-            user.last_daily = now
-            
-            # Record transaction
-            transaction = Transaction(
-                user_id=user.id,
-                amount=daily_amount,
-                transaction_type=TransactionType.DAILY.value,
-                description="Daily reward"
-            )
-            session.add(transaction)
-            
-            # Create embed for success message
-            embed = discord.Embed(
-                title="✅ Daily Reward Claimed!",
-                description=f"You received {format_currency(daily_amount)}!",
-                color=discord.Color.green()
-            )
-            embed.add_field(name="New Balance", value=format_currency(user.balance), inline=False)
-            embed.set_footer(text=f"Come back tomorrow for another reward!")
-            
-            await ctx.send(embed=embed)
+            else:
+                # Calculate daily reward amount (base amount + random bonus)
+                daily_amount = config.DAILY_REWARD_BASE + random.randint(0, config.DAILY_REWARD_BONUS)
+                
+                # Update user
+                user.balance += daily_amount
+                user.last_daily = now
+                
+                # Record transaction
+                transaction = Transaction(
+                    user_id=user.id,
+                    amount=daily_amount,
+                    transaction_type=TransactionType.DAILY.value,
+                    description="Daily reward"
+                )
+                session.add(transaction)
+                
+                # Create embed for success message
+                embed = discord.Embed(
+                    title="✅ Daily Reward Claimed!",
+                    description=f"You received {format_currency(daily_amount)}!",
+                    color=discord.Color.green()
+                )
+                embed.add_field(name="New Balance", value=format_currency(user.balance), inline=False)
+                embed.set_footer(text=f"Come back tomorrow for another reward!")
+                change = BalanceChanged(user.discord_id, user.username, daily_amount, user.balance, TransactionType.DAILY.value)
+        
+        await ctx.send(embed=embed)
+        
+        # Cached and published once the reward is committed
+        if change is not None:
+            balance_cache.set(change.discord_id, change.new_balance)
+            BUS.publish(change)
     
     @commands.command(name="transfer", aliases=["send", "pay"])
     async def transfer(self, ctx, recipient: discord.Member, amount: float):
         """Transfer currency to another user"""
         
         # Check for valid amount
-        if amount <= 0:
-            await ctx.send("❌ Amount must be positive!")
+        if not is_whole_cents(amount):
+            await ctx.send("❌ Amount must be at least $0.01, in whole cents!")
             return
         
         if recipient.bot:
@@ -114,6 +151,8 @@ class Economy(commands.Cog):
             await ctx.send("❌ You can't transfer currency to yourself!")
             return
         
+        # Sent once the session has closed, see daily()
+        changes = []
         with get_session() as session:
             sender = create_user_if_not_exists(session, ctx.author)
             
@@ -124,73 +163,95 @@ class Economy(commands.Cog):
                     description=f"You don't have enough funds to send {format_currency(amount)}.\nYour balance: {format_currency(sender.balance)}",
                     color=discord.Color.red()
                 )
-                await ctx.send(embed=embed)
-                return
-            
-            # Get or create recipient user
-            recipient_user = create_user_if_not_exists(session, recipient)
-            
-            # Update balances
-            sender.balance -= amount
-            recipient_user.balance += amount
-            
-            # Record transactions
-            sender_transaction = Transaction(
-                user_id=sender.id,
-                amount=-amount,
-                transaction_type=TransactionType.WITHDRAWAL.value,
-                description=f"Transfer to {recipient.name}#{recipient.discriminator}"
-            )
-            
-            recipient_transaction = Transaction(
-                user_id=recipient_user.id,
-                amount=amount,
-                transaction_type=TransactionType.DEPOSIT.value,
-                description=f"Transfer from {ctx.author.name}#{ctx.author.discriminator}"
-            )
-            
-            session.add_all([sender_transaction, recipient_transaction])
-            
-            # Send success message
-            embed = discord.Embed(
-                title="✅ Transfer Complete",
-                description=f"Successfully sent {format_currency(amount)} to {recipient.mention}",
-                color=discord.Color.green()
-            )
-            embed.add_field(name="Your New Balance", value=format_currency(sender.balance), inline=False)
-            
-            await ctx.send(embed=embed)
+            else:
+                # Get or create recipient user
+                recipient_user = create_user_if_not_exists(session, recipient)
+                
+                # Update balances
+                sender.balance -= amount
+                recipient_user.balance += amount
+                
+                # Record transactions
+                sender_transaction = Transaction(
+                    user_id=sender.id,
+                    amount=-amount,
+                    transaction_type=TransactionType.WITHDRAWAL.value,
+                    description=f"Transfer to {recipient.name}#{recipient.discriminator}"
+                )
+                
+                recipient_transaction = Transaction(
+                    user_id=recipient_user.id,
+                    amount=amount,
+                    transaction_type=TransactionType.DEPOSIT.value,
+                    description=f"Transfer from {ctx.author.name}#{ctx.author.discriminator}"
+                )
+                
+                session.add_all([sender_transaction, recipient_transaction])
+                
+                # Success message
+                embed = discord.Embed(
+                    title="✅ Transfer Complete",
+                    description=f"Successfully sent {format_currency(amount)} to {recipient.mention}",
+                    color=discord.Color.green()
+                )
+                embed.add_field(name="Your New Balance", value=format_currency(sender.balance), inline=False)
+                changes = [
+                    BalanceChanged(sender.discord_id, sender.username, -amount, sender.balance, TransactionType.WITHDRAWAL.value),
+                    BalanceChanged(recipient_user.discord_id, recipient_user.username, amount, recipient_user.balance, TransactionType.DEPOSIT.value),
+                ]
+        
+        await ctx.send(embed=embed)
+        
+        # Cached and published once the transfer is committed
+        for change in changes:
+            balance_cache.set(change.discord_id, change.new_balance)
+            BUS.publish(change)
     
     @commands.command(name="leaderboard", aliases=["lb", "top"])
     async def leaderboard(self, ctx):
         """Display the richest users"""
         
-        with get_session() as session:
-            # Get top 10 users by balance
-            top_users = session.execute(
-                select(User.discord_id, User.username, User.balance)
-                .order_by(User.balance.desc())
-                .limit(10)
-            ).all()
-            
-            if not top_users:
-                await ctx.send("No users found in the leaderboard.")
+        cache_age = None
+        top_users = live_leaderboard.get()
+        try:
+            if top_users is None:
+                with get_session(readonly=True) as session:
+                    # Get top 10 users by balance
+                    top_users = session.execute(
+                        select(User.discord_id, User.username, User.balance)
+                        .order_by(User.balance.desc())
+                        .limit(10)
+                    ).all()
+                live_leaderboard.load(top_users)
+                leaderboard_cache.set("top", top_users)
+        except DATABASE_ERRORS:
+            # Fall back to the last leaderboard we read while the database is down
+            top_users, cache_age = leaderboard_cache.get("top")
+            if top_users is None:
+                await ctx.send(DATABASE_UNAVAILABLE_MESSAGE)
                 return
-            
-            # Create embed for leaderboard
-            embed = discord.Embed(
-                title="💰 Richest Users Leaderboard",
-                color=discord.Color.gold()
-            )
-            
-            for i, (discord_id, username, balance) in enumerate(top_users, 1):
-                user_display = f"{'🥇' if i == 1 else '🥈' if i == 2 else '🥉' if i == 3 else f'{i}.'} "
-                user_display += f"**{username}**: {format_currency(balance)}"
-                embed.add_field(name=f"#{i}", value=user_display, inline=False)
-            
+        
+        if not top_users:
+            await ctx.send("No users found in the leaderboard.")
+            return
+        
+        # Create embed for leaderboard
+        embed = discord.Embed(
+            title="💰 Richest Users Leaderboard",
+            color=discord.Color.gold()
+        )
+        
+        for i, (discord_id, username, balance) in enumerate(top_users, 1):
+            user_display = f"{'🥇' if i == 1 else '🥈' if i == 2 else '🥉' if i == 3 else f'{i}.'} "
+            user_display += f"**{username}**: {format_currency(balance)}"
+            embed.add_field(name=f"#{i}", value=user_display, inline=False)
+        
+        if cache_age is not None:
+            embed.set_footer(text=f"⚠️ Database unavailable, showing the leaderboard from {format_time(cache_age)} ago")
+        else:
             embed.set_footer(text=f"Requested by {ctx.author.name}")
-            
-            await ctx.send(embed=embed)
+        
+        await ctx.send(embed=embed)
     
     @commands.command(name="transactions", aliases=["history", "tx"])
     async def transactions(self, ctx, limit: int = 5):
@@ -202,12 +263,13 @@ class Economy(commands.Cog):
         elif limit > 10:
             limit = 10
         
-        with get_session() as session:
-            user = create_user_if_not_exists(session, ctx.author)
+        with get_session(readonly=True) as session:
+            # Read-only, so a player without an account is shown as a new one instead of being created
+            user = get_user(session, ctx.author) or new_user(ctx.author)
             
             # Get user's recent transactions
-            transactions = session.execute(
-                select(Transaction.amount, Transaction.transaction_type, Transaction.description, Transaction.timestamp)
+            transactions = session.scalars(
+                select(Transaction)
                 .where(Transaction.user_id == user.id)
                 .order_by(Transaction.timestamp.desc())
                 .limit(limit)
@@ -223,9 +285,12 @@ class Economy(commands.Cog):
                 color=discord.Color.blue()
             )
             
-            for amount, tx_type, description, timestamp in transactions:
+            for transaction in transactions:
+                # Descriptions are stored as template codes, rebuilt here
+                amount, tx_type, description = transaction.amount, transaction.transaction_type, transaction.description
+                
                 # Format timestamp
-                formatted_time = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+                formatted_time = transaction.timestamp.strftime("%Y-%m-%d %H:%M:%S")
                 
                 # Determine emoji based on transaction type
                 emoji = "💸" if amount < 0 else "💰"
@@ -1,10 +1,10 @@
 import discord
 from discord.ext import commands
-from database.database import get_session
-from database.models import User, Transaction, GameSession, TransactionType, GameType, BotStatistics
-from sqlalchemy import select, func
+from database.models import GameType
+from database.settlement import open_bet, settle_bet, InsufficientFunds
+from database import jackpot
+from utils.rounds import RoundGame, RoundTable, RoundBet
 import random
-import json
 import asyncio
 import logging
 
@@ -15,69 +15,173 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
-from utils.formatters import format_currency
-from utils.helpers import create_user_if_not_exists
+from utils.formatters import format_currency, is_whole_cents
+from utils import rate_limit
+
+# Define slot symbols and their weights
+SLOT_SYMBOLS = ["🍒", "🍋", "🍊", "🍇", "🍉", "💎", "7️⃣"]
+SLOT_WEIGHTS = [30, 25, 20, 15, 10, 5, 2]  # Higher = more likely
+
+# Define roulette properties
+RED_NUMBERS = frozenset([1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36])
+BLACK_NUMBERS = frozenset([2, 4, 6, 8, 10, 11, 13, 15, 17, 20, 22, 24, 26, 28, 29, 31, 33, 35])
+
+# Roulette bet type -> the property of the number it bets on
+ROULETTE_BET_TYPES = {
+    "red": "color", "black": "color",
+    "even": "parity", "odd": "parity",
+    "high": "range", "low": "range"
+}
+
+# Winners listed by name in a shared round's result
+ROUND_WINNERS_SHOWN = 15
+
+def spin_slots():
+    """Spin the three slot reels"""
+    return random.choices(SLOT_SYMBOLS, weights=SLOT_WEIGHTS, k=3)
+
+def score_slots(slots):
+    """
+    Score a slots spin.
+    
+    Args:
+        slots (list): The three symbols returned by spin_slots()
+        
+    Returns:
+        tuple: (win, multiplier, win_type)
+    """
+    if slots[0] == slots[1] == slots[2]:
+        # All three match
+        if slots[0] == "7️⃣":
+            # Jackpot
+            return True, config.SLOTS_JACKPOT_MULTIPLIER, "JACKPOT"
+        elif slots[0] == "💎":
+            # Diamond line
+            return True, config.SLOTS_DIAMOND_MULTIPLIER, "DIAMOND LINE"
+        else:
+            # Regular match
+            return True, config.SLOTS_MATCH_MULTIPLIER, "THREE OF A KIND"
+    elif slots.count("🍒") >= 2:
+        # Two or more cherries
+        return True, config.SLOTS_CHERRY_MULTIPLIER, "TWO+ CHERRIES"
+    else:
+        # No win
+        return False, 0, "NO MATCH"
+
+def roulette_properties(number):
+    """
+    Get the color, parity and range of a roulette number.
+    
+    Args:
+        number (int): The number the wheel landed on (0-36)
+        
+    Returns:
+        tuple: (color, parity, range_type), with "green"/"zero" for 0
+    """
+    color = "red" if number in RED_NUMBERS else "black" if number in BLACK_NUMBERS else "green"
+    parity = "even" if number % 2 == 0 and number != 0 else "odd" if number != 0 else "zero"
+    range_type = "high" if 19 <= number <= 36 else "low" if 1 <= number <= 18 else "zero"
+    return color, parity, range_type
+
+def score_roulette(bet_type, number):
+    """
+    Score a roulette bet.
+    
+    Args:
+        bet_type (str): One of ROULETTE_BET_TYPES
+        number (int): The number the wheel landed on
+        
+    Returns:
+        tuple: (win, game_result)
+    """
+    color, parity, range_type = roulette_properties(number)
+    
+    # Zero is always a loss (house edge)
+    win = number != 0 and bet_type in (color, parity, range_type)
+    
+    game_result = {
+        "bet_type": bet_type,
+        "number": number,
+        "color": color,
+        "parity": parity,
+        "range": range_type,
+        "win": win
+    }
+    return win, game_result
+
+def roulette_color(color):
+    """Get the embed color for a roulette number's color"""
+    if color == "red":
+        return discord.Color.red()
+    elif color == "black":
+        return discord.Color.darker_grey()
+    return discord.Color.green()
+
+class SharedRoulette(RoundGame):
+    """Roulette played in shared rounds: one spin settles the whole table"""
+    
+    name = "roulette"
+    game_type = GameType.ROULETTE
+    
+    def draw(self):
+        return random.randint(0, 36)
+    
+    def score(self, bet, number):
+        win, game_result = score_roulette(bet.choice, number)
+        return win, bet.amount * config.ROULETTE_MULTIPLIER if win else 0, game_result
+    
+    async def announce(self, current):
+        number = current.outcome
+        color, parity, range_type = roulette_properties(number)
+        
+        settled = [bet for bet in current.bets if not bet.cancelled]
+        winners = [bet for bet in settled if bet.win]
+        cancelled = [bet for bet in current.bets if bet.cancelled]
+        
+        embed = discord.Embed(
+            title=f"🎡 Roulette: {number} {color.capitalize()}",
+            description=f"{len(settled)} bets totalling {format_currency(sum(bet.amount for bet in settled))} on one spin",
+            color=roulette_color(color)
+        )
+        embed.add_field(name="Number", value=str(number), inline=True)
+        embed.add_field(name="Color", value=color.capitalize(), inline=True)
+        embed.add_field(name="Parity", value=parity.capitalize(), inline=True)
+        embed.add_field(name="Range", value=range_type.capitalize() if range_type != "zero" else "Zero", inline=True)
+        
+        if winners:
+            lines = [
+                f"**{bet.player_name}** won {format_currency(bet.payout)} on {bet.choice}"
+                for bet in winners[:ROUND_WINNERS_SHOWN]
+            ]
+            if len(winners) > ROUND_WINNERS_SHOWN:
+                lines.append(f"...and {len(winners) - ROUND_WINNERS_SHOWN} more")
+            embed.add_field(name=f"🎉 Winners ({len(winners)})", value="\n".join(lines), inline=False)
+        else:
+            embed.add_field(name="😢 No Winners", value="The house takes it all this round!", inline=False)
+        
+        losers = len(settled) - len(winners)
+        if losers:
+            lost = sum(bet.amount for bet in settled if not bet.win)
+            embed.add_field(name="Lost Bets", value=f"{losers} bets lost {format_currency(lost)}", inline=False)
+        if cancelled:
+            embed.add_field(
+                name="Cancelled",
+                value=f"{len(cancelled)} bets were cancelled because the balance no longer covered them",
+                inline=False
+            )
+        
+        await current.channel.send(embed=embed)
 
 class Gambling(commands.Cog):
     """Gambling commands for the gambling bot"""
     
     def __init__(self, bot):
         self.bot = bot
+        # Open shared roulette rounds, one per channel
+        self.roulette_table = RoundTable(SharedRoulette(), config.ROULETTE_BETTING_WINDOW, config.ROULETTE_ROUND_MAX_BETS)
     
-    async def process_game(self, ctx, user, game_type, bet_amount, win, payout_amount, game_result):
-        """Process a game outcome, updating user balance and recording transactions"""
-        
-        with get_session() as session:
-            # Get fresh user data
-            db_user = session.scalar(select(User).where(User.id == user.id))
-            
-            if win:
-                # User won, add winnings
-                transaction_type = TransactionType.WIN.value
-                transaction_desc = f"Won {game_type.value} game"
-                db_user.balance += payout_amount
-            else:
-                # User lost, bet amount already deducted
-                transaction_type = TransactionType.BET.value
-                transaction_desc = f"Lost {game_type.value} game"
-            
-            # Record transaction
-            transaction = Transaction(
-                user_id=db_user.id,
-                amount=payout_amount if win else -bet_amount,
-                transaction_type=transaction_type,
-                description=transaction_desc
-            )
-            session.add(transaction)
-            
-            # Record game session
-            game_session = GameSession(
-                user_id=db_user.id,
-                game_type=game_type.value,
-                bet_amount=bet_amount,
-                payout=payout_amount if win else 0,
-                game_result=json.dumps(game_result)
-            )
-            session.add(game_session)
-            
-            # Update bot statistics
-            bot_stats = session.execute(
-                select(BotStatistics).limit(1)
-            ).scalar_one_or_none()
-            
-            if not bot_stats:
-                # Create stats record if it doesn't exist
-                bot_stats = BotStatistics()
-                session.add(bot_stats)
-            
-            bot_stats.total_bets += 1
-            bot_stats.total_bet_amount += bet_amount
-            bot_stats.total_payout_amount += payout_amount if win else 0
-            
-            session.commit()
-            
-            # Return the updated user balance
-            return db_user.balance
+    def cog_unload(self):
+        self.roulette_table.close()
     
     @commands.command(name="coinflip", aliases=["cf", "flip"])
     async def coinflip(self, ctx, choice: str, bet: float):
@@ -95,60 +199,55 @@ class Gambling(commands.Cog):
         if choice in ["h", "t"]:
             choice = "heads" if choice == "h" else "tails"
             
-        if bet <= 0:
-            await ctx.send("❌ Bet amount must be positive!")
+        if not is_whole_cents(bet):
+            await ctx.send("❌ Bet amount must be at least $0.01, in whole cents!")
             return
         
-        with get_session() as session:
-            user = create_user_if_not_exists(session, ctx.author)
-            
-            # Check if user has enough balance
-            if user.balance < bet:
-                embed = discord.Embed(
-                    title="❌ Insufficient Funds",
-                    description=f"You don't have enough funds to bet {format_currency(bet)}.\nYour balance: {format_currency(user.balance)}",
-                    color=discord.Color.red()
-                )
-                await ctx.send(embed=embed)
-                return
-            
-            # Deduct bet amount
-            user.balance -= bet
-            
-            # Flip the coin
-            result = random.choice(["heads", "tails"])
-            win = (result == choice)
-            
-            # Calculate payout
-            payout = bet * config.COINFLIP_MULTIPLIER if win else 0
-            
-            # Create game result data
-            game_result = {
-                "choice": choice,
-                "result": result,
-                "win": win
-            }
-            
-            # Update database and get new balance
-            new_balance = await self.process_game(
-                ctx, user, GameType.COINFLIP, bet, win, payout, game_result
-            )
-            
-            # Create the message embed
+        try:
+            stake = open_bet(ctx.author, bet)
+        except InsufficientFunds as e:
             embed = discord.Embed(
-                title=f"Coin Flip: {result.capitalize()}"
+                title="❌ Insufficient Funds",
+                description=f"You don't have enough funds to bet {format_currency(bet)}.\nYour balance: {format_currency(e.balance)}",
+                color=discord.Color.red()
             )
-            
-            # Set color and message based on win/loss
-            if win:
-                embed.color = discord.Color.green()
-                embed.description = f"🎉 You chose **{choice}** and the coin landed on **{result}**. You win {format_currency(payout)}!"
-            else:
-                embed.color = discord.Color.red()
-                embed.description = f"😢 You chose **{choice}** and the coin landed on **{result}**. You lose {format_currency(bet)}!"
-            
-            embed.add_field(name="New Balance", value=format_currency(new_balance), inline=False)
             await ctx.send(embed=embed)
+            return
+        
+        # Flip the coin
+        result = random.choice(["heads", "tails"])
+        win = (result == choice)
+        
+        # Calculate payout
+        payout = bet * config.COINFLIP_MULTIPLIER if win else 0
+        
+        # Create game result data
+        game_result = {
+            "choice": choice,
+            "result": result,
+            "win": win
+        }
+        
+        # Update database and get new balance
+        new_balance = settle_bet(
+            stake, GameType.COINFLIP, bet, win, payout, game_result
+        )
+        
+        # Create the message embed
+        embed = discord.Embed(
+            title=f"Coin Flip: {result.capitalize()}"
+        )
+        
+        # Set color and message based on win/loss
+        if win:
+            embed.color = discord.Color.green()
+            embed.description = f"🎉 You chose **{choice}** and the coin landed on **{result}**. You win {format_currency(payout)}!"
+        else:
+            embed.color = discord.Color.red()
+            embed.description = f"😢 You chose **{choice}** and the coin landed on **{result}**. You lose {format_currency(bet)}!"
+        
+        embed.add_field(name="New Balance", value=format_currency(new_balance), inline=False)
+        await ctx.send(embed=embed)
     
     @commands.command(name="dice", aliases=["roll"])
     async def dice(self, ctx, bet: float, choice: int = None):
@@ -159,83 +258,81 @@ class Gambling(commands.Cog):
         """
         
         # Validate inputs
-        if bet <= 0:
-            await ctx.send("❌ Bet amount must be positive!")
+        if not is_whole_cents(bet):
+            await ctx.send("❌ Bet amount must be at least $0.01, in whole cents!")
             return
         
         if choice is not None and (choice < 1 or choice > 6):
             await ctx.send("❌ Dice choice must be between 1 and 6!")
             return
         
-        with get_session() as session:
-            user = create_user_if_not_exists(session, ctx.author)
-            
-            # Check if user has enough balance
-            if user.balance < bet:
-                embed = discord.Embed(
-                    title="❌ Insufficient Funds",
-                    description=f"You don't have enough funds to bet {format_currency(bet)}.\nYour balance: {format_currency(user.balance)}",
-                    color=discord.Color.red()
-                )
-                await ctx.send(embed=embed)
-                return
-            
-            # Deduct bet amount
-            user.balance -= bet
-            
-            # Roll the dice
-            result = random.randint(1, 6)
-            
-            # Determine if user won
-            if choice is None:
-                # Win on 4, 5, or 6 (50% chance to win)
-                win = result >= 4
-                multiplier = config.DICE_DEFAULT_MULTIPLIER
-            else:
-                # Win if number matches (1/6 chance to win)
-                win = (result == choice)
-                multiplier = config.DICE_SPECIFIC_MULTIPLIER
-            
-            # Calculate payout
-            payout = bet * multiplier if win else 0
-            
-            # Create game result data
-            game_result = {
-                "choice": choice,
-                "result": result,
-                "win": win
-            }
-            
-            # Update database and get new balance
-            new_balance = await self.process_game(
-                ctx, user, GameType.DICE, bet, win, payout, game_result
-            )
-            
-            # Create initial message for suspense
-            message = await ctx.send("🎲 Rolling the dice...")
-            await asyncio.sleep(1)
-            
-            # Create the result embed
+        try:
+            stake = open_bet(ctx.author, bet)
+        except InsufficientFunds as e:
             embed = discord.Embed(
-                title=f"Dice Roll: {result}"
+                title="❌ Insufficient Funds",
+                description=f"You don't have enough funds to bet {format_currency(bet)}.\nYour balance: {format_currency(e.balance)}",
+                color=discord.Color.red()
             )
-            
-            # Set color and message based on win/loss
-            if win:
-                embed.color = discord.Color.green()
-                if choice is None:
-                    embed.description = f"🎉 The dice landed on **{result}** (>= 4). You win {format_currency(payout)}!"
-                else:
-                    embed.description = f"🎉 The dice landed on **{result}** (your guess). You win {format_currency(payout)}!"
+            await ctx.send(embed=embed)
+            return
+        
+        # Roll the dice
+        result = random.randint(1, 6)
+        
+        # Determine if user won
+        if choice is None:
+            # Win on 4, 5, or 6 (50% chance to win)
+            win = result >= 4
+            multiplier = config.DICE_DEFAULT_MULTIPLIER
+        else:
+            # Win if number matches (1/6 chance to win)
+            win = (result == choice)
+            multiplier = config.DICE_SPECIFIC_MULTIPLIER
+        
+        # Calculate payout
+        payout = bet * multiplier if win else 0
+        
+        # Create game result data
+        game_result = {
+            "choice": choice,
+            "result": result,
+            "win": win
+        }
+        
+        # Update database and get new balance
+        new_balance = settle_bet(
+            stake, GameType.DICE, bet, win, payout, game_result
+        )
+        
+        # The database work is done, don't hold its slot through the animation
+        rate_limit.release_admission(ctx)
+        
+        # Create initial message for suspense
+        message = await ctx.send("🎲 Rolling the dice...")
+        await asyncio.sleep(1)
+        
+        # Create the result embed
+        embed = discord.Embed(
+            title=f"Dice Roll: {result}"
+        )
+        
+        # Set color and message based on win/loss
+        if win:
+            embed.color = discord.Color.green()
+            if choice is None:
+                embed.description = f"🎉 The dice landed on **{result}** (>= 4). You win {format_currency(payout)}!"
             else:
-                embed.color = discord.Color.red()
-                if choice is None:
-                    embed.description = f"😢 The dice landed on **{result}** (< 4). You lose {format_currency(bet)}!"
-                else:
-                    embed.description = f"😢 The dice landed on **{result}** (you guessed {choice}). You lose {format_currency(bet)}!"
-            
-            embed.add_field(name="New Balance", value=format_currency(new_balance), inline=False)
-            await message.edit(embed=embed)
+                embed.description = f"🎉 The dice landed on **{result}** (your guess). You win {format_currency(payout)}!"
+        else:
+            embed.color = discord.Color.red()
+            if choice is None:
+                embed.description = f"😢 The dice landed on **{result}** (< 4). You lose {format_currency(bet)}!"
+            else:
+                embed.description = f"😢 The dice landed on **{result}** (you guessed {choice}). You lose {format_currency(bet)}!"
+        
+        embed.add_field(name="New Balance", value=format_currency(new_balance), inline=False)
+        await message.edit(embed=embed)
     
     @commands.command(name="slots", aliases=["slot", "slotmachine"])
     async def slots(self, ctx, bet: float):
@@ -245,236 +342,244 @@ class Gambling(commands.Cog):
         """
         
         # Validate bet amount
-        if bet <= 0:
-            await ctx.send("❌ Bet amount must be positive!")
+        if not is_whole_cents(bet):
+            await ctx.send("❌ Bet amount must be at least $0.01, in whole cents!")
             return
         
-        with get_session() as session:
-            user = create_user_if_not_exists(session, ctx.author)
-            
-            # Check if user has enough balance
-            if user.balance < bet:
-                embed = discord.Embed(
-                    title="❌ Insufficient Funds",
-                    description=f"You don't have enough funds to bet {format_currency(bet)}.\nYour balance: {format_currency(user.balance)}",
-                    color=discord.Color.red()
-                )
-                await ctx.send(embed=embed)
-                return
-            
-            # Deduct bet amount
-            user.balance -= bet
-            
-            # Define slot symbols and their weights
-            symbols = ["🍒", "🍋", "🍊", "🍇", "🍉", "💎", "7️⃣"]
-            weights = [30, 25, 20, 15, 10, 5, 2]  # Higher = more likely
-            
-            # Spin the slots
-            slots = []
-            for _ in range(3):
-                slots.append(random.choices(symbols, weights=weights, k=1)[0])
-            
-            # Determine win
-            if slots[0] == slots[1] == slots[2]:
-                # All three match
-                if slots[0] == "7️⃣":
-                    # Jackpot
-                    win = True
-                    multiplier = config.SLOTS_JACKPOT_MULTIPLIER
-                    win_type = "JACKPOT"
-                elif slots[0] == "💎":
-                    # Diamond line
-                    win = True
-                    multiplier = config.SLOTS_DIAMOND_MULTIPLIER
-                    win_type = "DIAMOND LINE"
-                else:
-                    # Regular match
-                    win = True
-                    multiplier = config.SLOTS_MATCH_MULTIPLIER
-                    win_type = "THREE OF A KIND"
-            elif slots.count("🍒") >= 2:
-                # Two or more cherries
-                win = True
-                multiplier = config.SLOTS_CHERRY_MULTIPLIER
-                win_type = "TWO+ CHERRIES"
-            else:
-                # No win
-                win = False
-                multiplier = 0
-                win_type = "NO MATCH"
-            
-            # Calculate payout
-            payout = bet * multiplier if win else 0
-            
-            # Create game result data
-            game_result = {
-                "slots": slots,
-                "win_type": win_type,
-                "win": win
-            }
-            
-            # Update database and get new balance
-            new_balance = await self.process_game(
-                ctx, user, GameType.SLOTS, bet, win, payout, game_result
-            )
-            
-            # Create the initial message for suspense
-            message = await ctx.send("🎰 Spinning the slots...")
-            await asyncio.sleep(1.5)
-            
-            # Create the result embed
+        try:
+            stake = open_bet(ctx.author, bet)
+        except InsufficientFunds as e:
             embed = discord.Embed(
-                title="🎰 Slots Result",
-                description=f"**{ctx.author.name}** bet {format_currency(bet)}"
+                title="❌ Insufficient Funds",
+                description=f"You don't have enough funds to bet {format_currency(bet)}.\nYour balance: {format_currency(e.balance)}",
+                color=discord.Color.red()
             )
-            
-            # Display the slots
-            slots_display = "".join(slots)
-            embed.add_field(name="Result", value=slots_display, inline=False)
-            
-            # Set color and message based on win/loss
-            if win:
-                embed.color = discord.Color.green()
-                embed.add_field(
-                    name=f"🎉 {win_type}!",
-                    value=f"You won {format_currency(payout)}!",
-                    inline=False
-                )
-            else:
-                embed.color = discord.Color.red()
-                embed.add_field(
-                    name="😢 No Match",
-                    value=f"You lost {format_currency(bet)}!",
-                    inline=False
-                )
-            
-            embed.add_field(name="New Balance", value=format_currency(new_balance), inline=False)
-            
-            await message.edit(embed=embed)
+            await ctx.send(embed=embed)
+            return
+        
+        # Spin the slots
+        slots = spin_slots()
+        
+        # Determine win
+        win, multiplier, win_type = score_slots(slots)
+        
+        # Calculate payout
+        payout = bet * multiplier if win else 0
+        
+        # Create game result data
+        game_result = {
+            "slots": slots,
+            "win_type": win_type,
+            "win": win
+        }
+        
+        # A jackpot line on a qualifying bet also wins the progressive pool
+        jackpot_pool = config.JACKPOT_POOL if win_type == "JACKPOT" and jackpot.qualifies(bet) else None
+        
+        # Update database and get new balance
+        new_balance = settle_bet(
+            stake, GameType.SLOTS, bet, win, payout, game_result, jackpot_pool=jackpot_pool
+        )
+        payout += stake.jackpot
+        
+        # Feed the progressive pool
+        if config.JACKPOT_ENABLED:
+            jackpot.contribute(config.JACKPOT_POOL, bet)
+        
+        # The database work is done, don't hold its slot through the animation
+        rate_limit.release_admission(ctx)
+        
+        # Create the initial message for suspense
+        message = await ctx.send("🎰 Spinning the slots...")
+        await asyncio.sleep(1.5)
+        
+        # Create the result embed
+        embed = discord.Embed(
+            title="🎰 Slots Result",
+            description=f"**{ctx.author.name}** bet {format_currency(bet)}"
+        )
+        
+        # Display the slots
+        slots_display = "".join(slots)
+        embed.add_field(name="Result", value=slots_display, inline=False)
+        
+        # Set color and message based on win/loss
+        if win:
+            embed.color = discord.Color.green()
+            embed.add_field(
+                name=f"🎉 {win_type}!",
+                value=f"You won {format_currency(payout)}!",
+                inline=False
+            )
+            if stake.jackpot:
+                embed.add_field(name="💰 Progressive Jackpot", value=f"Including {format_currency(stake.jackpot)} from the pool!", inline=False)
+        else:
+            embed.color = discord.Color.red()
+            embed.add_field(
+                name="😢 No Match",
+                value=f"You lost {format_currency(bet)}!",
+                inline=False
+            )
+        
+        embed.add_field(name="New Balance", value=format_currency(new_balance), inline=False)
+        if config.JACKPOT_ENABLED:
+            footer = f"Progressive jackpot: {format_currency(jackpot.jackpot_value(config.JACKPOT_POOL))}"
+            if not jackpot.qualifies(bet):
+                footer += f" (bet {format_currency(config.JACKPOT_MIN_BET)} or more to win it)"
+            embed.set_footer(text=footer)
+        
+        await message.edit(embed=embed)
+    
+    @commands.command(name="jackpot", aliases=["pool"])
+    async def jackpot(self, ctx):
+        """
+        Show the progressive jackpot won by a 7️⃣7️⃣7️⃣ in slots or a MEGA JACKPOT in bigslots
+        Usage: !jackpot
+        """
+        if not config.JACKPOT_ENABLED:
+            await ctx.send("❌ The progressive jackpot is disabled.")
+            return
+        
+        embed = discord.Embed(
+            title="💰 Progressive Jackpot",
+            description=f"The pool is at **{format_currency(jackpot.jackpot_value(config.JACKPOT_POOL))}**",
+            color=discord.Color.gold()
+        )
+        embed.add_field(
+            name="How to win",
+            value=f"Every slots bet adds to the pool. Hit 7️⃣7️⃣7️⃣ in !slots or a MEGA JACKPOT in !bigslots "
+                  f"with a bet of {format_currency(config.JACKPOT_MIN_BET)} or more to win it all!",
+            inline=False
+        )
+        await ctx.send(embed=embed)
     
     @commands.command(name="roulette", aliases=["roul"])
     async def roulette(self, ctx, bet_type: str, bet: float):
         """
         Play roulette. Bet types: red, black, even, odd, high, low
+        In a server channel, every bet placed within the betting window shares one spin.
         Usage: !roulette <bet_type> <bet amount>
         """
         
         # Validate bet amount
-        if bet <= 0:
-            await ctx.send("❌ Bet amount must be positive!")
+        if not is_whole_cents(bet):
+            await ctx.send("❌ Bet amount must be at least $0.01, in whole cents!")
             return
         
         # Validate bet type
         bet_type = bet_type.lower()
-        valid_bet_types = {
-            "red": "color", "black": "color",
-            "even": "parity", "odd": "parity",
-            "high": "range", "low": "range"
-        }
-        
-        if bet_type not in valid_bet_types:
+        if bet_type not in ROULETTE_BET_TYPES:
             await ctx.send("❌ Invalid bet type! Choose from: red, black, even, odd, high, low")
             return
         
-        with get_session() as session:
-            user = create_user_if_not_exists(session, ctx.author)
-            
-            # Check if user has enough balance
-            if user.balance < bet:
-                embed = discord.Embed(
-                    title="❌ Insufficient Funds",
-                    description=f"You don't have enough funds to bet {format_currency(bet)}.\nYour balance: {format_currency(user.balance)}",
-                    color=discord.Color.red()
-                )
-                await ctx.send(embed=embed)
-                return
-            
-            # Deduct bet amount
-            user.balance -= bet
-            
-            # Spin the roulette
-            number = random.randint(0, 36)
-            
-            # Define roulette properties
-            red_numbers = [1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36]
-            black_numbers = [2, 4, 6, 8, 10, 11, 13, 15, 17, 20, 22, 24, 26, 28, 29, 31, 33, 35]
-            
-            # Determine result properties
-            color = "red" if number in red_numbers else "black" if number in black_numbers else "green"
-            parity = "even" if number % 2 == 0 and number != 0 else "odd" if number != 0 else "zero"
-            range_type = "high" if 19 <= number <= 36 else "low" if 1 <= number <= 18 else "zero"
-            
-            # Determine win
-            if number == 0:
-                # Zero is always a loss (house edge)
-                win = False
-            elif valid_bet_types[bet_type] == "color":
-                win = (bet_type == color)
-            elif valid_bet_types[bet_type] == "parity":
-                win = (bet_type == parity)
-            else:  # range
-                win = (bet_type == range_type)
-            
-            # Calculate payout
-            multiplier = config.ROULETTE_MULTIPLIER if win else 0
-            payout = bet * multiplier if win else 0
-            
-            # Create game result data
-            game_result = {
-                "bet_type": bet_type,
-                "number": number,
-                "color": color,
-                "parity": parity,
-                "range": range_type,
-                "win": win
-            }
-            
-            # Update database and get new balance
-            new_balance = await self.process_game(
-                ctx, user, GameType.ROULETTE, bet, win, payout, game_result
+        # In a server channel the bet joins the table's shared spin
+        if config.ROULETTE_ROUNDS_ENABLED and ctx.guild is not None:
+            await self.place_roulette_bet(ctx, bet_type, bet)
+            return
+        
+        try:
+            stake = open_bet(ctx.author, bet)
+        except InsufficientFunds as e:
+            embed = discord.Embed(
+                title="❌ Insufficient Funds",
+                description=f"You don't have enough funds to bet {format_currency(bet)}.\nYour balance: {format_currency(e.balance)}",
+                color=discord.Color.red()
             )
-            
-            # Create the initial message for suspense
-            message = await ctx.send("🎡 Spinning the roulette wheel...")
-            await asyncio.sleep(1.5)
-            
-            # Create the result embed
+            await ctx.send(embed=embed)
+            return
+        
+        # Spin the roulette
+        number = random.randint(0, 36)
+        color, parity, range_type = roulette_properties(number)
+        
+        # Determine win
+        win, game_result = score_roulette(bet_type, number)
+        
+        # Calculate payout
+        payout = bet * config.ROULETTE_MULTIPLIER if win else 0
+        
+        # Update database and get new balance
+        new_balance = settle_bet(
+            stake, GameType.ROULETTE, bet, win, payout, game_result
+        )
+        
+        # The database work is done, don't hold its slot through the animation
+        rate_limit.release_admission(ctx)
+        
+        # Create the initial message for suspense
+        message = await ctx.send("🎡 Spinning the roulette wheel...")
+        await asyncio.sleep(1.5)
+        
+        # Create the result embed
+        embed = discord.Embed(
+            title=f"🎡 Roulette: {number} {color.capitalize()}",
+            description=f"**{ctx.author.name}** bet {format_currency(bet)} on {bet_type}",
+            color=roulette_color(color)
+        )
+        
+        # Add result info
+        embed.add_field(name="Number", value=str(number), inline=True)
+        embed.add_field(name="Color", value=color.capitalize(), inline=True)
+        embed.add_field(name="Parity", value=parity.capitalize(), inline=True)
+        embed.add_field(name="Range", value=range_type.capitalize() if range_type != "zero" else "Zero", inline=True)
+        
+        # Set win/loss message
+        if win:
+            embed.add_field(
+                name="🎉 You Won!",
+                value=f"You bet on {bet_type} and won {format_currency(payout)}!",
+                inline=False
+            )
+        else:
+            embed.add_field(
+                name="😢 You Lost",
+                value=f"You bet on {bet_type} and lost {format_currency(bet)}!",
+                inline=False
+            )
+        
+        embed.add_field(name="New Balance", value=format_currency(new_balance), inline=False)
+        
+        await message.edit(embed=embed)
+    
+    async def place_roulette_bet(self, ctx, bet_type, bet):
+        """Add a bet to the channel's shared roulette round, opening one if needed"""
+        current = self.roulette_table.rounds.get(ctx.channel.id)
+        if current is not None and len(current.bets) >= self.roulette_table.max_bets:
+            await ctx.send(f"❌ This round is full! The wheel spins in {current.seconds_left():.0f} seconds.")
+            return
+        
+        # The player's bets in the round must all be covered. Checked before joining,
+        # so a rejected bet doesn't open a round
+        discord_id = str(ctx.author.id)
+        staked = current.staked.get(discord_id, 0) if current is not None else 0
+        try:
+            stake = open_bet(ctx.author, staked + bet)
+        except InsufficientFunds as e:
             embed = discord.Embed(
-                title=f"🎡 Roulette: {number} {color.capitalize()}",
-                description=f"**{ctx.author.name}** bet {format_currency(bet)} on {bet_type}"
+                title="❌ Insufficient Funds",
+                description=f"You don't have enough funds to bet {format_currency(bet)} more this round.\nYour balance: {format_currency(e.balance)}",
+                color=discord.Color.red()
             )
-            
-            # Set properties based on the number
-            if color == "red":
-                embed.color = discord.Color.red()
-            elif color == "black":
-                embed.color = discord.Color.darker_grey()
-            else:  # green
-                embed.color = discord.Color.green()
-            
-            # Add result info
-            embed.add_field(name="Number", value=str(number), inline=True)
-            embed.add_field(name="Color", value=color.capitalize(), inline=True)
-            embed.add_field(name="Parity", value=parity.capitalize(), inline=True)
-            embed.add_field(name="Range", value=range_type.capitalize() if range_type != "zero" else "Zero", inline=True)
-            
-            # Set win/loss message
-            if win:
-                embed.add_field(
-                    name="🎉 You Won!",
-                    value=f"You bet on {bet_type} and won {format_currency(payout)}!",
-                    inline=False
-                )
-            else:
-                embed.add_field(
-                    name="😢 You Lost",
-                    value=f"You bet on {bet_type} and lost {format_currency(bet)}!",
-                    inline=False
-                )
-            
-            embed.add_field(name="New Balance", value=format_currency(new_balance), inline=False)
-            
-            await message.edit(embed=embed)
+            await ctx.send(embed=embed)
+            return
+        
+        # Nothing was awaited since the lookup, so a round found then is still open
+        current = self.roulette_table.join(ctx.channel)
+        current.add(RoundBet(stake, ctx.author.name, bet_type, bet))
+        
+        if len(current.bets) == 1:
+            embed = discord.Embed(
+                title="🎡 Roulette Round Open",
+                description=(
+                    f"**{ctx.author.name}** bet {format_currency(bet)} on {bet_type}.\n"
+                    f"Place your bets with `{config.COMMAND_PREFIX}roulette <bet_type> <bet amount>`, "
+                    f"the wheel spins in {current.seconds_left():.0f} seconds!"
+                ),
+                color=discord.Color.gold()
+            )
+            await ctx.send(embed=embed)
+        else:
+            await ctx.send(f"🎡 **{ctx.author.name}** bet {format_currency(bet)} on {bet_type}. The wheel spins in {current.seconds_left():.0f} seconds.")
 
 async def setup(bot):
     await bot.add_cog(Gambling(bot))
\ No newline at end of file
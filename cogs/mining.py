@@ -15,26 +15,57 @@ import math
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
 from utils.formatters import format_currency, format_time
-from utils.helpers import create_user_if_not_exists
+from utils.helpers import create_user_if_not_exists, get_user, new_user
+from utils import metrics, query_profiler
+from utils.events import BUS, MiningCompleted, BalanceChanged
+from utils.cache import balance_cache
 
 # Configure logging
 logger = logging.getLogger('mining')
 
+# How often the background task checks for finished mining sessions
+MINING_UPDATE_INTERVAL = 5
+
+# Mining scheduler instrumentation
+MINING_SCHEDULER_LAG = metrics.histogram(
+    "mining_scheduler_lag_seconds", "How late the mining update task woke up",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+MINING_COMPLETION_DELAY = metrics.histogram(
+    "mining_completion_delay_seconds", "Time between a mining session ending and it being paid out",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+MINING_ACTIVE_SESSIONS = metrics.gauge("mining_active_sessions", "Mining sessions waiting to complete")
+
 class Mining(commands.Cog):
     """Mining commands for the gambling bot"""
     
     def __init__(self, bot):
         self.bot = bot
         self.currently_mining = {}  # Track users that are currently mining
+        MINING_ACTIVE_SESSIONS.set_function(lambda: len(self.currently_mining))
+        
+        # Completion DMs are sent from the bus, so a slow DM never delays a payout
+        self.notifications = BUS.subscribe(MiningCompleted, self.notify_mining_completed, name="mining_notifications")
         
         # We'll start the background task when the cog is added to the bot
         # This avoids the "loop attribute cannot be accessed in non-async contexts" error
     
+    def cog_unload(self):
+        BUS.unsubscribe(self.notifications)
+    
     async def mining_update_task(self):
         """Background task to periodically update mining stats"""
         await self.bot.wait_until_ready()
         
+        last_tick = None
         while not self.bot.is_closed():
+            # Measure how far behind schedule this tick is
+            tick = asyncio.get_running_loop().time()
+            if last_tick is not None:
+                MINING_SCHEDULER_LAG.observe(max(0, tick - last_tick - MINING_UPDATE_INTERVAL))
+            last_tick = tick
+            
             try:
                 # Update currently mining users
                 miners_to_remove = []
@@ -47,9 +78,11 @@ class Mining(commands.Cog):
                     if elapsed >= mining_data["duration"]:
                         # Mining session completed
                         miners_to_remove.append(user_id)
+                        MINING_COMPLETION_DELAY.observe(elapsed - mining_data["duration"])
                         
                         # Process the completed mining session
-                        await self.complete_mining_session(user_id, mining_data)
+                        with query_profiler.profiled("mining_update_task"):
+                            await self.complete_mining_session(user_id, mining_data)
                 
                 # Remove completed miners
                 for user_id in miners_to_remove:
@@ -60,17 +93,11 @@ class Mining(commands.Cog):
                 logger.error(f"Error in mining update task: {e}")
             
             # Run every few seconds
-            await asyncio.sleep(5)
+            await asyncio.sleep(MINING_UPDATE_INTERVAL)
     
     async def complete_mining_session(self, user_id, mining_data):
         """Complete a mining session and reward the user"""
         try:
-            # Get Discord user from ID
-            user = self.bot.get_user(int(user_id))
-            if not user:
-                logger.error(f"Could not find user with ID {user_id}")
-                return
-            
             # Calculate earned amount based on mining power and duration
             duration = mining_data["duration"]
             mining_power = mining_data["mining_power"]
@@ -122,68 +149,76 @@ class Mining(commands.Cog):
                 )
                 session.add(mining_stats)
                 
-                # Update bot statistics
-                from database.models import BotStatistics
-                bot_stats = session.scalar(select(BotStatistics).limit(1))
-                
-                if not bot_stats:
-                    # Create stats record if it doesn't exist
-                    bot_stats = BotStatistics()
-                    session.add(bot_stats)
-                
-                bot_stats.total_mined += earned_amount
+                # Read them before the session closes and expires the user
+                new_balance = db_user.balance
+                username = db_user.username
+            
+            # Statistics and the DM are handled by subscribers once the payout is committed
+            balance_cache.set(str(user_id), new_balance)
+            BUS.publish(MiningCompleted(
+                str(user_id), username, duration, earned_amount, bonus, mining_power, mining_multiplier, new_balance
+            ))
+            BUS.publish(BalanceChanged(str(user_id), username, earned_amount, new_balance, TransactionType.MINING.value))
+        
+        except Exception as e:
+            logger.error(f"Error completing mining session for user {user_id}: {e}")
+    
+    async def notify_mining_completed(self, event):
+        """DM a user that their mining session has been paid out"""
+        # Get Discord user from ID
+        user = self.bot.get_user(int(event.discord_id))
+        if not user:
+            logger.error(f"Could not find user with ID {event.discord_id}")
+            return
+        
+        # Attempt to DM the user that mining completed
+        try:
+            embed = discord.Embed(
+                title="⛏️ Mining Complete!",
+                description=f"Your mining session has finished!",
+                color=discord.Color.green()
+            )
             
-            # Attempt to DM the user that mining completed
-            try:
-                embed = discord.Embed(
-                    title="⛏️ Mining Complete!",
-                    description=f"Your mining session has finished!",
-                    color=discord.Color.green()
-                )
-                
-                embed.add_field(
-                    name="Session Duration",
-                    value=f"{duration} seconds",
-                    inline=True
-                )
-                
-                embed.add_field(
-                    name="Mining Power",
-                    value=f"{mining_power:.2f}",
-                    inline=True
-                )
-                
-                embed.add_field(
-                    name="Multiplier",
-                    value=f"{mining_multiplier:.2f}x",
-                    inline=True
-                )
-                
-                embed.add_field(
-                    name="Earned Amount",
-                    value=format_currency(earned_amount),
-                    inline=False
-                )
-                
-                if bonus:
-                    embed.add_field(
-                        name="BONUS!",
-                        value="🎉 You got lucky and received a 2x bonus! 🎉",
-                        inline=False
-                    )
-                
+            embed.add_field(
+                name="Session Duration",
+                value=f"{event.duration} seconds",
+                inline=True
+            )
+            
+            embed.add_field(
+                name="Mining Power",
+                value=f"{event.mining_power:.2f}",
+                inline=True
+            )
+            
+            embed.add_field(
+                name="Multiplier",
+                value=f"{event.mining_multiplier:.2f}x",
+                inline=True
+            )
+            
+            embed.add_field(
+                name="Earned Amount",
+                value=format_currency(event.earned),
+                inline=False
+            )
+            
+            if event.bonus:
                 embed.add_field(
-                    name="New Balance",
-                    value=format_currency(db_user.balance),
+                    name="BONUS!",
+                    value="🎉 You got lucky and received a 2x bonus! 🎉",
                     inline=False
                 )
-                
-                await user.send(embed=embed)
-            except Exception as e:
-                logger.error(f"Failed to send DM to user {user_id}: {e}")
-        
+            
+            embed.add_field(
+                name="New Balance",
+                value=format_currency(event.new_balance),
+                inline=False
+            )
+            
+            await user.send(embed=embed)
         except Exception as e:
-            logger.error(f"Error completing mining session for user {user_id}: {e}")
+            logger.error(f"Failed to send DM to user {event.discord_id}: {e}")
     
     @commands.command(name="mine", aliases=["mining"])
     async def mine(self, ctx, duration: int = None):
@@ -251,64 +286,64 @@ class Mining(commands.Cog):
                     inline=False
                 )
                 
-                await ctx.send(embed=embed)
-                return
-            
-            # Start mining session
-            self.currently_mining[str(ctx.author.id)] = {
-                "start_time": now,
-                "duration": duration_seconds,
-                "mining_power": user.mining_power,
-                "mining_multiplier": user.mining_multiplier,
-                "ctx": ctx  # Store context for callback
-            }
-            
-            # Estimate earnings
-            base_estimate = (duration_seconds / 60) * user.mining_power * user.mining_multiplier
-            min_estimate = base_estimate * 0.9
-            max_estimate = base_estimate * 1.1
-            
-            # Create embed for mining start
-            embed = discord.Embed(
-                title="⛏️ Mining Started",
-                description=f"{ctx.author.mention} has started mining!",
-                color=discord.Color.blue()
-            )
-            
-            embed.add_field(
-                name="Duration",
-                value=f"{duration} minutes",
-                inline=True
-            )
-            
-            embed.add_field(
-                name="Mining Power",
-                value=f"{user.mining_power:.2f}",
-                inline=True
-            )
-            
-            embed.add_field(
-                name="Multiplier",
-                value=f"{user.mining_multiplier:.2f}x",
-                inline=True
-            )
-            
-            embed.add_field(
-                name="Estimated Earnings",
-                value=f"{format_currency(min_estimate)} - {format_currency(max_estimate)}",
-                inline=False
-            )
-            
-            embed.set_footer(text="Mining runs in the background. You'll be notified when it's complete.")
-            
-            await ctx.send(embed=embed)
+            else:
+                # Start mining session
+                self.currently_mining[str(ctx.author.id)] = {
+                    "start_time": now,
+                    "duration": duration_seconds,
+                    "mining_power": user.mining_power,
+                    "mining_multiplier": user.mining_multiplier,
+                    "ctx": ctx  # Store context for callback
+                }
+                
+                # Estimate earnings
+                base_estimate = (duration_seconds / 60) * user.mining_power * user.mining_multiplier
+                min_estimate = base_estimate * 0.9
+                max_estimate = base_estimate * 1.1
+                
+                # Create embed for mining start
+                embed = discord.Embed(
+                    title="⛏️ Mining Started",
+                    description=f"{ctx.author.mention} has started mining!",
+                    color=discord.Color.blue()
+                )
+                
+                embed.add_field(
+                    name="Duration",
+                    value=f"{duration} minutes",
+                    inline=True
+                )
+                
+                embed.add_field(
+                    name="Mining Power",
+                    value=f"{user.mining_power:.2f}",
+                    inline=True
+                )
+                
+                embed.add_field(
+                    name="Multiplier",
+                    value=f"{user.mining_multiplier:.2f}x",
+                    inline=True
+                )
+                
+                embed.add_field(
+                    name="Estimated Earnings",
+                    value=f"{format_currency(min_estimate)} - {format_currency(max_estimate)}",
+                    inline=False
+                )
+                
+                embed.set_footer(text="Mining runs in the background. You'll be notified when it's complete.")
+        
+        # Sent once the session has closed, so the writer slot is never held across an await
+        await ctx.send(embed=embed)
     
     @commands.command(name="miner", aliases=["minerstats"])
     async def miner_stats(self, ctx):
         """Check your mining stats"""
         
-        with get_session() as session:
-            user = create_user_if_not_exists(session, ctx.author)
+        with get_session(readonly=True) as session:
+            # Read-only, so a player without an account is shown as a new one instead of being created
+            user = get_user(session, ctx.author) or new_user(ctx.author)
             
             # Check if currently mining
             currently_mining = str(ctx.author.id) in self.currently_mining
@@ -401,13 +436,14 @@ class Mining(commands.Cog):
             )
             
             embed.set_footer(text=f"Use {config.COMMAND_PREFIX}upgrademiner to upgrade your mining equipment")
-            
-            await ctx.send(embed=embed)
+        
+        await ctx.send(embed=embed)
     
     @commands.command(name="upgrademiner", aliases=["levelup", "upgrade"])
     async def upgrade_miner(self, ctx):
         """Upgrade your mining equipment to increase mining power"""
         
+        change = None
         with get_session() as session:
             user = create_user_if_not_exists(session, ctx.author)
             
@@ -430,70 +466,74 @@ class Mining(commands.Cog):
                     inline=False
                 )
                 
-                await ctx.send(embed=embed)
-                return
-            
-            # Deduct cost and upgrade mining level
-            user.balance -= upgrade_cost
-            user.mining_level += 1
-            user.mining_power += config.MINING_POWER_INCREASE
-            
-            # Add random multiplier bonus (5% chance)
-            if random.random() < 0.05:
-                multiplier_bonus = random.uniform(0.1, 0.3)
-                user.mining_multiplier += multiplier_bonus
-                bonus_received = True
             else:
-                bonus_received = False
-            
-            # Record transaction
-            transaction = Transaction(
-                user_id=user.id,
-                amount=-upgrade_cost,
-                transaction_type=TransactionType.WITHDRAWAL.value,
-                description=f"Mining equipment upgrade to level {user.mining_level}"
-            )
-            session.add(transaction)
-            
-            # Create success embed
-            embed = discord.Embed(
-                title="⛏️ Mining Equipment Upgraded!",
-                description=f"You've upgraded your mining equipment to level {user.mining_level}!",
-                color=discord.Color.green()
-            )
-            
-            embed.add_field(
-                name="Cost",
-                value=format_currency(upgrade_cost),
-                inline=True
-            )
-            
-            embed.add_field(
-                name="New Mining Power",
-                value=f"{user.mining_power:.2f}",
-                inline=True
-            )
-            
-            embed.add_field(
-                name="Multiplier",
-                value=f"{user.mining_multiplier:.2f}x",
-                inline=True
-            )
-            
-            if bonus_received:
+                # Deduct cost and upgrade mining level
+                user.balance -= upgrade_cost
+                user.mining_level += 1
+                user.mining_power += config.MINING_POWER_INCREASE
+                
+                # Add random multiplier bonus (5% chance)
+                if random.random() < 0.05:
+                    multiplier_bonus = random.uniform(0.1, 0.3)
+                    user.mining_multiplier += multiplier_bonus
+                    bonus_received = True
+                else:
+                    bonus_received = False
+                
+                # Record transaction
+                transaction = Transaction(
+                    user_id=user.id,
+                    amount=-upgrade_cost,
+                    transaction_type=TransactionType.WITHDRAWAL.value,
+                    description=f"Mining equipment upgrade to level {user.mining_level}"
+                )
+                session.add(transaction)
+                
+                # Create success embed
+                embed = discord.Embed(
+                    title="⛏️ Mining Equipment Upgraded!",
+                    description=f"You've upgraded your mining equipment to level {user.mining_level}!",
+                    color=discord.Color.green()
+                )
+                
                 embed.add_field(
-                    name="BONUS!",
-                    value=f"🎉 Lucky! You received a +{multiplier_bonus:.2f}x multiplier bonus! 🎉",
+                    name="Cost",
+                    value=format_currency(upgrade_cost),
+                    inline=True
+                )
+                
+                embed.add_field(
+                    name="New Mining Power",
+                    value=f"{user.mining_power:.2f}",
+                    inline=True
+                )
+                
+                embed.add_field(
+                    name="Multiplier",
+                    value=f"{user.mining_multiplier:.2f}x",
+                    inline=True
+                )
+                
+                if bonus_received:
+                    embed.add_field(
+                        name="BONUS!",
+                        value=f"🎉 Lucky! You received a +{multiplier_bonus:.2f}x multiplier bonus! 🎉",
+                        inline=False
+                    )
+                
+                embed.add_field(
+                    name="New Balance",
+                    value=format_currency(user.balance),
                     inline=False
                 )
-            
-            embed.add_field(
-                name="New Balance",
-                value=format_currency(user.balance),
-                inline=False
-            )
-            
-            await ctx.send(embed=embed)
+                change = BalanceChanged(user.discord_id, user.username, -upgrade_cost, user.balance, TransactionType.WITHDRAWAL.value)
+        
+        # Sent once the upgrade is committed, see mine()
+        await ctx.send(embed=embed)
+        
+        if change is not None:
+            balance_cache.set(change.discord_id, change.new_balance)
+            BUS.publish(change)
 
 from sqlalchemy import func
 
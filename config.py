@@ -6,6 +6,7 @@ Configuration settings for the gambling bot.
 COMMAND_PREFIX = "!"
 
 # Economy settings
+STARTING_BALANCE = 100.0  # Balance of a new account (not recorded as a transaction)
 DAILY_REWARD_BASE = 100
 DAILY_REWARD_BONUS = 50  # Random bonus up to this amount
 
@@ -31,11 +32,167 @@ SLOTS_EXT_MULTIPLIER_FREE_SPINS = 5.0      # Free spins feature
 SLOTS_EXT_MULTIPLIER_WILD = 3.0            # Wild symbol multiplier
 SLOTS_EXT_MULTIPLIER_SCATTER = 2.0         # Each scatter symbol
 
+# Blackjack payouts, including the returned bet
+BLACKJACK_MULTIPLIER = 2.0  # Beat the dealer
+BLACKJACK_NATURAL_MULTIPLIER = 2.5  # Blackjack on the deal pays 3:2
+
 # Roulette multipliers - for simplicity, all bet types have the same multiplier
 ROULETTE_MULTIPLIER = 1.9  # Win 1.9x your bet on any bet type
 
+# Shared roulette rounds (see utils/rounds.py)
+ROULETTE_ROUNDS_ENABLED = True  # Bets in a server channel join one shared spin, DMs keep a private wheel
+ROULETTE_BETTING_WINDOW = 15  # Seconds a round takes bets after the first one
+ROULETTE_ROUND_MAX_BETS = 500  # Bets accepted per round
+
 # Mining settings
 MINING_COOLDOWN = 300  # 5 minutes cooldown between mining sessions
 MINING_BASE_UPGRADE_COST = 500  # Base cost to upgrade mining equipment
 MINING_UPGRADE_COST_MULTIPLIER = 1.5  # Cost multiplier for each level
 MINING_POWER_INCREASE = 0.5  # Amount mining power increases per level
+
+# Time-series rollup settings
+ROLLUP_COMPACT_INTERVAL = 60  # Seconds between rollup compaction passes
+ROLLUP_BATCH_SIZE = 5000  # Maximum source rows folded per table per pass
+ROLLUP_SETTLE_SECONDS = 10  # Only fold rows older than this so in-flight commits aren't skipped
+ROLLUP_GAP_WINDOW = 3600  # Seconds ids skipped by the watermark are re-checked for late commits
+ROLLUP_GAP_LIMIT = 10000  # Most skipped ids recorded per pass, longer runs are id jumps
+ROLLUP_MAX_RANGE_DAYS = 366  # Largest range a timeseries request may cover
+
+# Query profiler settings
+QUERY_PROFILING_ENABLED = False  # Toggle at runtime with the admin_queryprofile command
+QUERY_PROFILER_REPEAT_THRESHOLD = 2  # Flag statements run this many times in one command
+
+# Sampling profiler settings
+PROFILER_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILER_MAX_SECONDS = 60  # Longest profile that can be requested
+PROFILER_PROBE_INTERVAL = 0.01  # Seconds between event loop lateness probes
+PROFILER_BLOCK_THRESHOLD = 0.05  # Report event loop blocks at least this long
+
+# Event loop watchdog settings
+WATCHDOG_ENABLED = True
+WATCHDOG_INTERVAL = 0.1  # Seconds between event loop heartbeats
+WATCHDOG_STALL_THRESHOLD = 0.5  # Report the loop as stalled after this many seconds without a heartbeat
+
+# Command recording settings (for replaying real traffic in benchmarks)
+COMMAND_RECORDING_ENABLED = False
+COMMAND_RECORDING_DIR = "recordings"
+COMMAND_RECORDING_MAX_BYTES = 10 * 1024 * 1024  # Rotate files at 10 MB
+COMMAND_RECORDING_BACKUP_COUNT = 20  # Rotated files to keep
+
+# Rate limiting and admission control
+RATE_LIMIT_USER_RATE = 1.0  # Commands per second each user earns
+RATE_LIMIT_USER_BURST = 5  # Commands a user can send back to back
+RATE_LIMIT_GUILD_RATE = 20.0  # Commands per second each guild earns
+RATE_LIMIT_GUILD_BURST = 60  # Commands a guild can send back to back
+DB_MAX_CONCURRENT_COMMANDS = 20  # Database commands allowed to run at once
+DB_MAX_QUEUED_COMMANDS = 50  # Database commands allowed to wait for a slot
+DB_QUEUE_TIMEOUT = 5.0  # Seconds a command may wait for a slot
+
+# Database circuit breaker settings
+DB_CIRCUIT_WINDOW = 30  # Seconds of query outcomes to consider
+DB_CIRCUIT_MIN_SAMPLES = 20  # Outcomes needed in the window before the circuit can open
+DB_CIRCUIT_ERROR_RATE = 0.5  # Open when this fraction of outcomes failed
+DB_CIRCUIT_SLOW_QUERY = 1.0  # Seconds after which a query or checkout counts as slow
+DB_CIRCUIT_SLOW_RATE = 0.5  # Open when this fraction of outcomes were slow
+DB_PROBE_INTERVAL = 5  # Seconds between recovery probes while the circuit is open
+DB_PROBE_SUCCESSES = 2  # Consecutive healthy probes needed to close the circuit
+
+# Settlement journal (keeps games running through short database outages)
+JOURNAL_ENABLED = False  # Journal settlements locally when the database is unavailable
+JOURNAL_DIR = "journal"  # Directory holding the per-process journal files
+JOURNAL_FSYNC_INTERVAL = 0.05  # Seconds between batched fsyncs of the journal
+JOURNAL_MAX_OFFLINE_BET = 1000  # Largest bet accepted against a cached balance
+JOURNAL_MAX_ENTRIES = 10000  # Offline settlements accepted before refusing bets
+JOURNAL_MAX_OUTSTANDING_PAYOUT = 100000  # Total offline winnings accepted before refusing bets
+JOURNAL_REPLAY_INTERVAL = 30  # Seconds between attempts to replay a leftover journal
+
+# Read replica routing (replicas are listed in the DATABASE_REPLICA_URLS environment variable)
+DB_REPLICA_MAX_LAG = 5.0  # Seconds of replication lag after which reads go to the primary
+DB_REPLICA_LAG_CHECK_INTERVAL = 5  # Seconds between replication lag measurements
+
+# Database connection pool settings (PostgreSQL)
+DB_POOL_SIZE = 10  # Connections kept open in the pool
+DB_MAX_OVERFLOW = 10  # Extra connections allowed under load, closed when returned
+DB_POOL_TIMEOUT = 5  # Seconds to wait for a free connection before giving up
+DB_POOL_RECYCLE = 300  # Seconds after which a connection is replaced
+DB_POOL_WARM_CONNECTIONS = 5  # Connections opened at startup, before the first command
+DB_POOL_PING_AFTER_IDLE = 60  # Seconds a connection may sit idle before it is checked on checkout
+DB_STATEMENT_TIMEOUT_MS = 5000  # Server-side statement timeout, 0 to disable
+
+# SQLite settings (used when DATABASE_URL starts with sqlite://)
+SQLITE_BUSY_TIMEOUT = 10  # Seconds to wait for the write lock before failing
+SQLITE_SYNCHRONOUS = "NORMAL"  # Safe with WAL: only a power loss can drop the last commits
+SQLITE_CACHE_SIZE_KB = 65536  # Page cache per connection
+SQLITE_MMAP_SIZE = 268435456  # Bytes of the database file to memory-map for reads
+
+# Compact ledger migration (see database/ledger_migration.py)
+LEDGER_BACKFILL_BATCH_SIZE = 1000  # Rows converted per transaction
+LEDGER_BACKFILL_PAUSE = 0.05  # Seconds between batches, to leave room for live traffic
+LEDGER_BACKFILL_RETRY_INTERVAL = 30  # Seconds to wait after the database became unavailable
+
+# History partitioning and archival (see database/partitioning.py and database/archive.py)
+# Tables are partitioned once, by running `python -m database.partitioning convert` (PostgreSQL)
+PARTITION_PREMAKE_MONTHS = 3  # Monthly partitions created ahead of time
+PARTITION_LOCK_TIMEOUT_MS = 5000  # Give up on partition DDL rather than queue behind long transactions
+ARCHIVE_ENABLED = False  # Move history older than ARCHIVE_AFTER_DAYS out of the database
+ARCHIVE_DIR = "archive"  # Directory holding the archived months
+ARCHIVE_AFTER_DAYS = 180  # Whole months older than this are archived
+ARCHIVE_BATCH_SIZE = 10000  # Rows per row group when exporting and reading archives
+ARCHIVE_INTERVAL = 86400  # Seconds between partition maintenance and archive runs
+
+# Bulk exports (see database/export.py)
+EXPORT_CHUNK_ROWS = 5000  # Rows fetched from the cursor and sent per chunk
+
+# Ledger reconciliation (see database/reconciliation.py)
+RECONCILE_SETTLE_SECONDS = 60  # Rows younger than this are checked but not checkpointed yet
+RECONCILE_BATCH_SIZE = 1000  # Rows fetched per cursor batch and checkpoints written per transaction
+RECONCILE_REPORT_LIMIT = 10  # Largest mismatches kept for the report
+RECONCILE_GAP_WINDOW = 86400  # Seconds ids skipped by the watermark are re-checked for late commits
+RECONCILE_GAP_LIMIT = 10000  # Most skipped ids recorded per run, longer runs are id jumps
+
+# Bulk admin operations (see database/bulk.py)
+BULK_CHUNK_SIZE = 1000  # Accounts created per multi-row insert, and ids bound per bulk statement
+BULK_PROGRESS_INTERVAL = 2  # Seconds between progress message edits
+
+# Economy batch jobs (see database/batch_jobs.py), rates in parts per million per run
+BATCH_JOB_CHUNK_SIZE = 1000  # Users per chunk, each chunk is one transaction
+BATCH_JOB_CHUNK_PAUSE = 0.1  # Seconds between chunks, to leave room for live traffic
+BATCH_JOB_CHECK_INTERVAL = 300  # Seconds between checks for due jobs
+INTEREST_ENABLED = False  # Pay interest on positive balances
+INTEREST_INTERVAL = 86400  # Seconds between interest runs
+INTEREST_RATE_PPM = 1000  # 0.1% per run
+INTEREST_MAX_BALANCE = 100000  # Interest is only paid on the balance up to this amount
+WEALTH_TAX_ENABLED = False  # Tax balances above a threshold
+WEALTH_TAX_INTERVAL = 604800  # Seconds between wealth tax runs
+WEALTH_TAX_THRESHOLD = 1000000  # Only the balance above this amount is taxed
+WEALTH_TAX_RATE_PPM = 10000  # 1% per run
+DECAY_ENABLED = False  # Decay the balances of inactive accounts
+DECAY_INTERVAL = 86400  # Seconds between decay runs
+DECAY_INACTIVE_DAYS = 30  # Days without activity before an account decays
+DECAY_RATE_PPM = 5000  # 0.5% per run
+
+# Event bus (see utils/events.py)
+EVENT_QUEUE_SIZE = 1000  # Events buffered per subscriber before new ones are dropped
+STATS_FLUSH_INTERVAL = 5  # Seconds between writes of the accumulated bot statistics
+LEADERBOARD_MAX_AGE = 60  # Seconds the live leaderboard is served before it is read from the database again
+DASHBOARD_FEED_SIZE = 50  # Recent bets and mining sessions kept for the dashboard feed
+
+# Progressive jackpot (see database/jackpot.py)
+JACKPOT_ENABLED = True  # Pay the pool on top of the jackpot line win of !slots and !bigslots
+JACKPOT_POOL = "slots"  # Pool fed by and paid out to both slot machines
+JACKPOT_SEED = 1000.0  # Pool value after a claim, funded by the house
+JACKPOT_MIN_BET = 1.0  # Smallest bet that can win the pool, so small spins can't drain the seed
+JACKPOT_CONTRIBUTION_PPM = 10000  # 1% of every slots bet, in parts per million
+JACKPOT_FLUSH_INTERVAL = 2  # Seconds between writes of this process's accumulated contributions
+JACKPOT_CACHE_SECONDS = 5  # Seconds the displayed pool value is cached
+JACKPOT_CLAIM_ATTEMPTS = 3  # Claims retried when another process claimed the pool first
+
+# Blackjack hands (see cogs/blackjack.py)
+BLACKJACK_DECKS = 6  # Decks per shoe, every hand is dealt from a fresh shoe
+BLACKJACK_DEALER_HITS_SOFT_17 = False  # Dealer stands on all 17s
+BLACKJACK_HAND_TTL = 120  # Seconds a hand may stay open before it stands automatically
+BLACKJACK_MAX_HANDS = 10000  # Open hands kept in memory per process
+BLACKJACK_SWEEP_INTERVAL = 1  # Seconds between checks for expired hands
+BLACKJACK_ESCROW_GRACE = 300  # Seconds past the hand TTL before an unsettled escrow is refunded
+BLACKJACK_ESCROW_LOOKBACK = 86400  # Seconds of escrow history checked for unsettled hands
+BLACKJACK_ESCROW_SWEEP_INTERVAL = 300  # Seconds between checks for unsettled escrows
@@ -0,0 +1,337 @@
+"""
+Archival of old history rows to compressed columnar files.
+
+The retention job exports every month of `transactions`, `game_sessions` and
+`mining_stats` older than ARCHIVE_AFTER_DAYS to a file under ARCHIVE_DIR and
+only then removes it from the database: by dropping the month's partition on
+PostgreSQL, or with a single DELETE otherwise, so a crash never loses rows
+that aren't in an archive file yet. Months of `transactions` and
+`game_sessions` are held back until the ledger reconciliation has covered
+them, since it no longer reads rows once they are archived.
+
+Files are Parquet (zstd) when pyarrow is installed. Without it they are
+gzipped JSON holding one column-oriented row group per line. read_archive()
+and read_history() read both, for audits that reach back past the retention
+window.
+"""
+import base64
+import datetime
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import select, func, delete, text, Integer, BigInteger, SmallInteger, Float, DateTime, LargeBinary, Boolean
+
+import config
+from database.database import get_engine, get_session
+from database.health import DATABASE_ERRORS
+from database.models import Transaction, GameSession, MiningStats, ReconciliationRun
+from database import partitioning
+from utils import metrics
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_ROWS = metrics.counter("archived_rows_total", "History rows exported and removed from the database", ("table",))
+
+ARCHIVED_TABLES = {model.__tablename__: model.__table__ for model in (Transaction, GameSession, MiningStats)}
+PARQUET_SUFFIX = ".parquet"
+JSON_SUFFIX = ".columns.json.gz"
+
+def _arrow_type(column_type):
+    """Map a column type to its Parquet type"""
+    if isinstance(column_type, (BigInteger, Integer)):
+        return pyarrow.int64()
+    if isinstance(column_type, SmallInteger):
+        return pyarrow.int16()
+    if isinstance(column_type, Float):
+        return pyarrow.float64()
+    if isinstance(column_type, DateTime):
+        return pyarrow.timestamp("us")
+    if isinstance(column_type, LargeBinary):
+        return pyarrow.binary()
+    if isinstance(column_type, Boolean):
+        return pyarrow.bool_()
+    return pyarrow.string()
+
+def _to_json(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode()
+    return value
+
+def _from_json(value, column_type):
+    if value is None:
+        return None
+    if isinstance(column_type, DateTime):
+        return datetime.datetime.fromisoformat(value)
+    if isinstance(column_type, LargeBinary):
+        return base64.b64decode(value)
+    return value
+
+class _ArchiveWriter:
+    """Write row batches of one table to an archive file, via a temporary file"""
+
+    def __init__(self, table, path):
+        self.table = table
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.columns = [column.name for column in table.columns]
+        self.rows = 0
+        if pyarrow is not None:
+            self.schema = pyarrow.schema([(column.name, _arrow_type(column.type)) for column in table.columns])
+            self.writer = parquet.ParquetWriter(self.temp_path, self.schema, compression="zstd")
+        else:
+            self.writer = gzip.open(self.temp_path, "wt", encoding="utf-8")
+            self.writer.write(json.dumps({"table": table.name, "columns": self.columns}) + "\n")
+
+    def write(self, rows):
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(self.columns)}
+        if pyarrow is not None:
+            columns = {name: [bytes(v) if isinstance(v, memoryview) else v for v in values] for name, values in columns.items()}
+            self.writer.write_table(pyarrow.Table.from_pydict(columns, schema=self.schema))
+        else:
+            self.writer.write(json.dumps({name: [_to_json(v) for v in values] for name, values in columns.items()}) + "\n")
+        self.rows += len(rows)
+
+    def close(self):
+        """Finish the file and move it into place"""
+        self.writer.close()
+        with open(self.temp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        self.writer.close()
+        os.remove(self.temp_path)
+
+def _archive_path(table_name, month):
+    """Get a free file name for a month of a table, adding a part number if the month was archived before"""
+    directory = os.path.join(config.ARCHIVE_DIR, table_name)
+    os.makedirs(directory, exist_ok=True)
+    suffix = PARQUET_SUFFIX if pyarrow is not None else JSON_SUFFIX
+
+    part = 0
+    while True:
+        name = os.path.join(directory, f"{month:%Y-%m}" + (f".{part}" if part else ""))
+        if not any(os.path.exists(name + existing) for existing in (PARQUET_SUFFIX, JSON_SUFFIX)):
+            return name + suffix
+        part += 1
+
+def _export_month(engine, table, month, end):
+    """Stream one month of a table to an archive file, returning the file path and row count"""
+    timestamp = table.c.timestamp
+    writer = _ArchiveWriter(table, _archive_path(table.name, month))
+    try:
+        with engine.connect() as conn:
+            # Server-side cursor, so a month of rows is never held in memory at once
+            result = conn.execution_options(stream_results=True, yield_per=config.ARCHIVE_BATCH_SIZE).execute(
+                select(table).where(timestamp >= month, timestamp < end).order_by(table.c.id)
+            )
+            for rows in result.partitions():
+                writer.write(rows)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.path, writer.rows
+
+def _remove_month(engine, table, month, end, expected_rows):
+    """Remove an exported month from the database, checking nothing arrived since the export"""
+    timestamp = table.c.timestamp
+    partition = partitioning.partition_name(table.name, month)
+    partitions = (
+        {name for name, _ in partitioning.list_partitions(engine, table.name)}
+        if partitioning.is_partitioned(engine, table.name) else set()
+    )
+
+    with engine.begin() as conn:
+        if partition in partitions:
+            quote = engine.dialect.identifier_preparer.quote
+            conn.execute(text(f"LOCK TABLE {quote(partition)} IN ACCESS EXCLUSIVE MODE"))
+            count = conn.scalar(select(func.count()).select_from(text(quote(partition))))
+            if count != expected_rows:
+                raise RuntimeError(f"{partition} changed during export ({count} rows, {expected_rows} exported)")
+            conn.execute(text(f"ALTER TABLE {quote(table.name)} DETACH PARTITION {quote(partition)}"))
+            conn.execute(text(f"DROP TABLE {quote(partition)}"))
+            return
+
+        removed = conn.execute(delete(table).where(timestamp >= month, timestamp < end)).rowcount
+        if removed != expected_rows:
+            # Rolls back the delete, the month is exported again on the next run
+            raise RuntimeError(f"{table.name} {month:%Y-%m} changed during export ({removed} rows, {expected_rows} exported)")
+
+def _reconciled_watermarks(engine):
+    """Highest ids of the reconciled tables covered by the last finished reconciliation run"""
+    with engine.connect() as conn:
+        run = conn.execute(
+            select(ReconciliationRun.transactions_watermark, ReconciliationRun.game_sessions_watermark)
+            .where(ReconciliationRun.finished_at.is_not(None))
+            .order_by(ReconciliationRun.id.desc())
+            .limit(1)
+        ).first()
+    transactions, game_sessions = run or (0, 0)
+    return {Transaction.__tablename__: transactions, GameSession.__tablename__: game_sessions}
+
+def archive_old_rows(older_than_days=None, dry_run=False):
+    """
+    Export and remove every whole month of history older than the retention window.
+
+    Args:
+        older_than_days (int): Retention window, defaults to ARCHIVE_AFTER_DAYS
+        dry_run (bool): Only report the months that would be archived
+
+    Returns:
+        list: (table, month, rows, path) for each archived month
+    """
+    older_than_days = config.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=older_than_days)
+    engine = get_engine()
+    reconciled = _reconciled_watermarks(engine)
+
+    archived = []
+    for table in ARCHIVED_TABLES.values():
+        with engine.connect() as conn:
+            oldest = conn.scalar(select(func.min(table.c.timestamp)))
+        if oldest is None:
+            continue
+
+        month = partitioning.month_start(oldest)
+        while partitioning.next_month(month) <= cutoff:
+            end = partitioning.next_month(month)
+            if table.name in reconciled:
+                with engine.connect() as conn:
+                    last_id = conn.scalar(select(func.max(table.c.id)).where(table.c.timestamp >= month, table.c.timestamp < end))
+                if last_id is not None and last_id > reconciled[table.name]:
+                    # Later months are newer still, the next run picks them up once reconciliation has
+                    logger.warning(f"Not archiving {table.name} from {month:%Y-%m} on, run the ledger reconciliation first")
+                    break
+            if dry_run:
+                with engine.connect() as conn:
+                    rows = conn.scalar(select(func.count()).where(table.c.timestamp >= month, table.c.timestamp < end))
+                if rows:
+                    archived.append((table.name, month, rows, None))
+            else:
+                path, rows = _export_month(engine, table, month, end)
+                if rows:
+                    try:
+                        _remove_month(engine, table, month, end, rows)
+                    except BaseException:
+                        # Still in the database, so it will be exported again in full
+                        os.remove(path)
+                        raise
+                    ARCHIVED_ROWS.labels(table=table.name).inc(rows)
+                    logger.info(f"Archived {rows} {table.name} rows from {month:%Y-%m} to {path}")
+                    archived.append((table.name, month, rows, path))
+                else:
+                    os.remove(path)
+            month = end
+
+    return archived
+
+def _read_file(table, path):
+    """Yield the rows of one archive file as dicts"""
+    if path.endswith(PARQUET_SUFFIX):
+        if pyarrow is None:
+            raise RuntimeError(f"pyarrow is needed to read {path}")
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=config.ARCHIVE_BATCH_SIZE):
+            yield from batch.to_pylist()
+        return
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        columns = json.loads(f.readline())["columns"]
+        types = {column.name: column.type for column in table.columns}
+        for line in f:
+            group = json.loads(line)
+            values = [[_from_json(v, types.get(name)) for v in group[name]] for name in columns]
+            for row in zip(*values):
+                yield dict(zip(columns, row))
+
+def read_archive(table_name, start=None, end=None, user_id=None):
+    """
+    Read archived rows of a table.
+
+    Args:
+        table_name (str): transactions, game_sessions or mining_stats
+        start (datetime): Earliest timestamp to include
+        end (datetime): Timestamp to stop before
+        user_id (int): Only include rows for this user
+
+    Returns:
+        generator: Row dicts keyed by column name, oldest month first
+    """
+    table = ARCHIVED_TABLES[table_name]
+    paths = sorted(glob.glob(os.path.join(config.ARCHIVE_DIR, table_name, "*")))
+    for path in paths:
+        if path.endswith(".tmp"):
+            continue
+        month = datetime.datetime.strptime(os.path.basename(path)[:7], "%Y-%m")
+        if (start is not None and partitioning.next_month(month) <= start) or (end is not None and month >= end):
+            continue
+        for row in _read_file(table, path):
+            if start is not None and row["timestamp"] < start:
+                continue
+            if end is not None and row["timestamp"] >= end:
+                continue
+            if user_id is not None and row["user_id"] != user_id:
+                continue
+            yield row
+
+def read_history(table_name, start=None, end=None, user_id=None):
+    """
+    Read a table's rows from both the archive and the database.
+
+    Returns:
+        generator: Row dicts keyed by column name, archived rows first
+    """
+    yield from read_archive(table_name, start, end, user_id)
+
+    table = ARCHIVED_TABLES[table_name]
+    statement = select(table).order_by(table.c.timestamp)
+    if start is not None:
+        statement = statement.where(table.c.timestamp >= start)
+    if end is not None:
+        statement = statement.where(table.c.timestamp < end)
+    if user_id is not None:
+        statement = statement.where(table.c.user_id == user_id)
+
+    with get_session(readonly=True) as session:
+        for row in session.execute(statement.execution_options(yield_per=config.ARCHIVE_BATCH_SIZE)):
+            yield dict(row._mapping)
+
+def _retention_loop():
+    """Create upcoming partitions and archive old months, once per ARCHIVE_INTERVAL"""
+    while True:
+        try:
+            partitioning.ensure_partitioning(get_engine())
+            if config.ARCHIVE_ENABLED:
+                archive_old_rows()
+        except DATABASE_ERRORS as e:
+            logger.warning(f"Archive run interrupted: {e}")
+        except Exception as e:
+            logger.error(f"Error archiving history: {e}")
+        time.sleep(config.ARCHIVE_INTERVAL)
+
+def start_retention_job():
+    """Start the background thread that maintains partitions and archives old history"""
+    thread = threading.Thread(target=_retention_loop, name="history-archiver", daemon=True)
+    thread.start()
+    logger.info("History archiver started")
+    return thread
+
+if __name__ == "__main__":
+    # python -m database.archive [--dry-run]: archive old history in the foreground
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    for table_name, month, rows, path in archive_old_rows(dry_run="--dry-run" in sys.argv):
+        print(f"{table_name} {month:%Y-%m}: {rows} rows{' -> ' + path if path else ''}")
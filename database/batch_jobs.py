@@ -0,0 +1,248 @@
+"""
+Scheduled economy-wide batch jobs: interest, wealth tax and inactivity decay.
+
+A job is a set-based balance change over `users` (see database/bulk.py),
+applied in primary key chunks of BATCH_JOB_CHUNK_SIZE. Each chunk is one
+transaction that writes the chunk's ledger rows, updates its balances and
+moves the run's checkpoint, with a pause between chunks so live commands
+keep getting the database. A run belongs to a scheduling period and is
+recorded in batch_job_runs, so an interrupted run resumes at its checkpoint
+and a finished one is never applied twice.
+
+    python -m database.batch_jobs interest
+"""
+import datetime
+import logging
+import threading
+import time
+
+from sqlalchemy import select, func, and_, or_, case
+from sqlalchemy.exc import IntegrityError
+
+import config
+from database.database import get_session
+from database.health import DATABASE_ERRORS
+from database.bulk import apply_balance_change
+from database.models import User, Transaction, TransactionType, BatchJobRun, TRANSACTION_TYPE_CODES
+from utils import metrics
+from utils.cache import balance_cache, live_leaderboard
+from utils.formatters import to_cents
+
+logger = logging.getLogger(__name__)
+
+BATCH_JOB_ROWS = metrics.counter("batch_job_rows_total", "Users updated by economy batch jobs", ("job",))
+BATCH_JOB_RATE = metrics.gauge("batch_job_rows_per_second", "Throughput of the last economy batch job run", ("job",))
+
+PPM = 1000000
+
+# Transactions written by the jobs themselves, which don't count as account activity
+SYSTEM_TYPE_CODES = [TRANSACTION_TYPE_CODES[t.value] for t in (TransactionType.INTEREST, TransactionType.TAX, TransactionType.DECAY)]
+
+class EconomyJob:
+    """A periodic balance change, described as SQL expressions over the users table"""
+
+    def __init__(self, name, transaction_type, description, interval, enabled, change):
+        self.name = name
+        self.transaction_type = transaction_type
+        self.description = description  # Template filled with the run's period
+        self.interval = interval  # Seconds per scheduling period
+        self.enabled = enabled
+        self.change = change  # now -> (WHERE clause, new balance expression)
+
+    def period(self, now):
+        """Get the key of the scheduling period containing now"""
+        seconds = int(now.replace(tzinfo=datetime.timezone.utc).timestamp()) // self.interval * self.interval
+        start = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+        return f"{start:%Y-%m-%d}" if self.interval % 86400 == 0 else f"{start:%Y-%m-%d %H:%M}"
+
+def _interest(now):
+    balance = User.balance_in_cents
+    cap = to_cents(config.INTEREST_MAX_BALANCE)
+    # Interest is only paid on the balance up to the cap
+    interest_base = case((balance < cap, balance), else_=cap)
+    return balance > 0, balance + interest_base * config.INTEREST_RATE_PPM // PPM
+
+def _wealth_tax(now):
+    balance = User.balance_in_cents
+    threshold = to_cents(config.WEALTH_TAX_THRESHOLD)
+    return balance > threshold, balance - (balance - threshold) * config.WEALTH_TAX_RATE_PPM // PPM
+
+def _decay(now):
+    balance = User.balance_in_cents
+    cutoff = now - datetime.timedelta(days=config.DECAY_INACTIVE_DAYS)
+    # Uncorrelated, so it is evaluated once per chunk through the timestamp index
+    active_users = select(Transaction.user_id).where(
+        Transaction.timestamp >= cutoff,
+        Transaction.user_id.is_not(None),
+        or_(Transaction.type_code.is_(None), Transaction.type_code.notin_(SYSTEM_TYPE_CODES))
+    )
+    inactive = and_(balance > 0, User.created_at < cutoff, User.id.notin_(active_users))
+    return inactive, balance - balance * config.DECAY_RATE_PPM // PPM
+
+JOBS = {
+    job.name: job for job in (
+        EconomyJob("interest", TransactionType.INTEREST, "Interest ({run})",
+                   config.INTEREST_INTERVAL, config.INTEREST_ENABLED, _interest),
+        EconomyJob("wealth_tax", TransactionType.TAX, "Wealth tax ({run})",
+                   config.WEALTH_TAX_INTERVAL, config.WEALTH_TAX_ENABLED, _wealth_tax),
+        EconomyJob("decay", TransactionType.DECAY, "Inactivity decay ({run})",
+                   config.DECAY_INTERVAL, config.DECAY_ENABLED, _decay),
+    )
+}
+
+class JobResult:
+    """Progress and outcome of a batch job run"""
+
+    def __init__(self, run, rows_per_second=None, skipped=False):
+        self.job = run.job
+        self.period = run.period
+        self.users_updated = run.users_updated
+        self.ledger_rows = run.ledger_rows
+        self.net_cents = run.net_cents
+        self.finished = run.finished_at is not None
+        self.rows_per_second = rows_per_second
+        self.skipped = skipped  # Already finished for this period before this call
+
+def _start_run(job, period):
+    """Get the run for a period, creating it if this is the first attempt"""
+    with get_session() as session:
+        run = session.scalar(select(BatchJobRun).where(BatchJobRun.job == job.name, BatchJobRun.period == period))
+        if run is None:
+            end_user_id = session.scalar(select(func.max(User.id))) or 0
+            run = BatchJobRun(
+                job=job.name, period=period, end_user_id=end_user_id,
+                last_user_id=0, users_updated=0, ledger_rows=0, net_cents=0
+            )
+            session.add(run)
+            try:
+                session.flush()
+            except IntegrityError:
+                # Another process started the same run first
+                session.rollback()
+                run = session.scalar(select(BatchJobRun).where(BatchJobRun.job == job.name, BatchJobRun.period == period))
+        return run.id, run.finished_at is not None
+
+def _run_chunk(job, run_id, now):
+    """Apply the job to the next chunk of users, returning the users updated or None when the run is done"""
+    with get_session() as session:
+        # Locked, so two processes never apply the same chunk
+        run = session.get(BatchJobRun, run_id, with_for_update=True)
+        if run.finished_at is not None:
+            return None
+        if run.last_user_id >= run.end_user_id:
+            run.finished_at = datetime.datetime.utcnow()
+            return None
+
+        low = run.last_user_id
+        high = min(low + config.BATCH_JOB_CHUNK_SIZE, run.end_user_id)
+        where, new_balance = job.change(now)
+        updated, ledger_rows, net_cents = apply_balance_change(
+            session, and_(User.id > low, User.id <= high, where), new_balance,
+            job.transaction_type, job.description.format(run=run.period)
+        )
+
+        run.last_user_id = high
+        run.users_updated += updated
+        run.ledger_rows += ledger_rows
+        run.net_cents += net_cents
+        return updated
+
+def run_job(name, period=None, progress=None):
+    """
+    Run a batch job for a scheduling period, resuming from its checkpoint.
+
+    Args:
+        name (str): Job name, one of JOBS
+        period (str): Period key, defaults to the current period
+        progress (callable): Called with (users done, users total, rows per second) after each chunk
+
+    Returns:
+        JobResult: Totals of the run
+    """
+    job = JOBS[name]
+    now = datetime.datetime.utcnow()
+    period = period or job.period(now)
+
+    run_id, finished = _start_run(job, period)
+    if not finished:
+        logger.info(f"Running {name} for {period}")
+
+    started = time.monotonic()
+    processed = 0
+    while not finished:
+        updated = _run_chunk(job, run_id, now)
+        if updated is None:
+            break
+        processed += updated
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        BATCH_JOB_ROWS.labels(job=name).inc(updated)
+        BATCH_JOB_RATE.labels(job=name).set(rate)
+        if progress is not None:
+            with get_session() as session:
+                run = session.get(BatchJobRun, run_id)
+                progress(run.last_user_id, run.end_user_id, rate)
+        time.sleep(config.BATCH_JOB_CHUNK_PAUSE)
+
+    elapsed = time.monotonic() - started
+    rate = processed / elapsed if processed and elapsed > 0 else None
+    with get_session() as session:
+        run = session.get(BatchJobRun, run_id)
+        result = JobResult(run, rate, skipped=finished)
+
+    if not finished:
+        # Cached balances are only a fallback for outages, drop them rather than patch them
+        balance_cache.clear()
+        live_leaderboard.invalidate()
+        logger.info(
+            f"Finished {name} for {period}: {result.users_updated} users, {result.net_cents} cents"
+            + (f", {rate:.0f} rows/s" if rate else "")
+        )
+    return result
+
+def _scheduler_loop():
+    """Run every enabled job once per period"""
+    seen = set()
+    while True:
+        for job in JOBS.values():
+            if not job.enabled:
+                continue
+            try:
+                result = run_job(job.name)
+                if result.skipped and (job.name, result.period) not in seen:
+                    # Finished elsewhere, e.g. from the command line, so this process still caches the old balances
+                    balance_cache.clear()
+                    live_leaderboard.invalidate()
+                seen.add((job.name, result.period))
+            except DATABASE_ERRORS as e:
+                logger.warning(f"Batch job {job.name} interrupted, it will resume: {e}")
+            except Exception as e:
+                logger.error(f"Error running batch job {job.name}: {e}")
+        time.sleep(config.BATCH_JOB_CHECK_INTERVAL)
+
+def start_batch_jobs():
+    """Start the background thread that runs the enabled economy jobs, in the bot process"""
+    if not any(job.enabled for job in JOBS.values()):
+        return None
+    thread = threading.Thread(target=_scheduler_loop, name="economy-batch-jobs", daemon=True)
+    thread.start()
+    logger.info("Economy batch jobs started")
+    return thread
+
+if __name__ == "__main__":
+    # python -m database.batch_jobs <job> [period]: run a job now, resuming an interrupted run
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] not in JOBS:
+        sys.exit(f"Usage: python -m database.batch_jobs {{{','.join(JOBS)}}} [period]")
+
+    def print_progress(done, total, rate):
+        print(f"{done}/{total} users, {rate:.0f} rows/s")
+
+    result = run_job(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None, print_progress)
+    print(
+        f"{result.job} {result.period}: {'already finished' if result.skipped else 'finished'}, "
+        f"{result.users_updated} users, {result.ledger_rows} transactions, net {result.net_cents} cents"
+    )
@@ -0,0 +1,244 @@
+"""
+Set-based balance and mining operations over many users at once.
+
+Each operation runs in one transaction: the targeted rows are locked, the
+ledger rows are written with a single INSERT ... SELECT computed from the
+current balances, and the balances are changed with a single UPDATE. The
+cost no longer grows with a round trip per member, so an event payout to a
+role of thousands of members takes about as long as one to a single member.
+
+Targeted ids are bound BULK_CHUNK_SIZE at a time, still in the one
+transaction, since SQLite and PostgreSQL both cap the parameters of a
+statement well below the size of a large guild.
+"""
+import logging
+
+from sqlalchemy import select, insert, update, func, case, true, literal, Float, cast
+from sqlalchemy.dialects import postgresql, sqlite
+
+import config
+from database.database import get_session
+from database.models import User, Transaction, TransactionType, TRANSACTION_TYPE_CODES
+from utils.cache import balance_cache, live_leaderboard
+from utils.formatters import to_cents, parse_description
+from utils.helpers import new_user
+
+logger = logging.getLogger(__name__)
+
+_INSERT_BY_DIALECT = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+OPERATIONS = ("add", "remove", "reset")
+DESCRIPTIONS = {
+    "add": "Admin balance addition by {admin}",
+    "remove": "Admin balance removal by {admin}",
+    "reset": "Admin balance reset by {admin}",
+}
+
+class BulkResult:
+    """Outcome of a bulk operation"""
+
+    def __init__(self, users, ledger_rows=0, net_cents=0, created=0):
+        self.users = users  # Accounts updated
+        self.ledger_rows = ledger_rows  # Transactions written
+        self.net_cents = net_cents  # Total balance change
+        self.created = created  # Accounts created for members who had none
+
+def _report(progress, stage, done, total):
+    if progress is not None:
+        progress(stage, done, total)
+
+def ensure_users(members, progress=None):
+    """
+    Create accounts for the members that don't have one, in multi-row inserts.
+
+    Args:
+        members (list): Discord members
+        progress (callable): Called with (stage, done, total) after each chunk
+
+    Returns:
+        int: Accounts created
+    """
+    created = 0
+    chunk_size = config.BULK_CHUNK_SIZE
+    for start in range(0, len(members), chunk_size):
+        rows = []
+        for member in members[start:start + chunk_size]:
+            user = new_user(member)
+            rows.append({
+                "discord_id": user.discord_id,
+                "username": user.username,
+                "balance_cents": user.balance_cents,
+                "balance_float": user.balance_float,
+                "mining_level": user.mining_level,
+                "mining_power": user.mining_power,
+                "mining_multiplier": user.mining_multiplier,
+            })
+
+        with get_session() as session:
+            dialect_insert = _INSERT_BY_DIALECT.get(session.get_bind().dialect.name)
+            if dialect_insert is not None:
+                result = session.execute(
+                    dialect_insert(User).values(rows).on_conflict_do_nothing(index_elements=["discord_id"])
+                )
+                created += max(result.rowcount, 0)
+            else:
+                existing = set(session.scalars(
+                    select(User.discord_id).where(User.discord_id.in_([row["discord_id"] for row in rows]))
+                ))
+                new_rows = [row for row in rows if row["discord_id"] not in existing]
+                if new_rows:
+                    session.execute(insert(User), new_rows)
+                created += len(new_rows)
+
+        _report(progress, "accounts", min(start + chunk_size, len(members)), len(members))
+
+    return created
+
+def _targets(discord_ids):
+    """WHERE clauses selecting the targeted users BULK_CHUNK_SIZE ids at a time, a single one for every user when discord_ids is None"""
+    if discord_ids is None:
+        return [true()]
+    chunk_size = config.BULK_CHUNK_SIZE
+    return [User.discord_id.in_(discord_ids[start:start + chunk_size]) for start in range(0, len(discord_ids), chunk_size)]
+
+def _lock_targets(session, target):
+    """Lock the targeted user rows and count them"""
+    locked = select(User.id).where(target).with_for_update().subquery()
+    return session.scalar(select(func.count()).select_from(locked))
+
+def apply_balance_change(session, target, new_balance, transaction_type, description, recorded=None, progress=None):
+    """
+    Set the balances of the targeted users and record the changes in the ledger, set-based.
+
+    The rows are locked first, the ledger rows are inserted with one
+    INSERT ... SELECT while the balances still hold their old values, then one
+    UPDATE applies the new balances.
+
+    Args:
+        session: SQLAlchemy session, committed by the caller
+        target: WHERE clause selecting the users
+        new_balance: SQL expression of each user's new balance in cents
+        transaction_type (TransactionType): Type of the ledger rows
+        description (str): Description of the ledger rows
+        recorded: WHERE clause for the users that get a ledger row (default: balance changed)
+        progress (callable): Called with (stage, done, total) after each statement
+
+    Returns:
+        tuple: (users updated, ledger rows written, net change in cents)
+    """
+    balance = User.balance_in_cents
+    delta = new_balance - balance
+    recorded = delta != 0 if recorded is None else recorded
+    description_code, description_params = parse_description(description)
+
+    columns = {
+        "user_id": User.id,
+        "amount_cents": delta,
+        "type_code": literal(TRANSACTION_TYPE_CODES[transaction_type.value]),
+        "description_code": literal(description_code),
+        "description_params": literal(description_params),
+        "timestamp": func.now(),
+    }
+    if Transaction.write_legacy_columns:
+        columns.update({
+            "amount": cast(delta, Float) / 100,
+            "transaction_type": literal(transaction_type.value),
+            "description": literal(description),
+        })
+
+    users = _lock_targets(session, target)
+    _report(progress, "locked", users, users)
+    net_cents = session.scalar(select(func.coalesce(func.sum(delta), 0)).where(target))
+
+    ledger_rows = session.execute(
+        insert(Transaction.__table__).from_select(
+            list(columns),
+            select(*[value.label(name) for name, value in columns.items()]).where(target, recorded)
+        )
+    ).rowcount
+    _report(progress, "ledger", ledger_rows, users)
+
+    updated = session.execute(
+        update(User.__table__)
+        .where(target)
+        .values(balance_cents=new_balance, balance=cast(new_balance, Float) / 100)
+    ).rowcount
+    _report(progress, "balances", updated, users)
+
+    return updated, ledger_rows, net_cents
+
+def bulk_adjust_balance(operation, discord_ids, admin_name, amount=None, progress=None):
+    """
+    Add to, remove from or reset the balances of many users in one transaction.
+
+    Args:
+        operation (str): "add", "remove" (never below zero) or "reset" (to zero)
+        discord_ids (list): Discord ids of the targeted users, or None for every user
+        admin_name (str): Admin recorded in the transaction descriptions
+        amount (float): Amount to add or remove
+        progress (callable): Called with (stage, done, total) as the operation advances
+
+    Returns:
+        BulkResult: Users updated, ledger rows written and the net balance change
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"operation must be one of: {', '.join(OPERATIONS)}")
+
+    targets = _targets(discord_ids)
+    balance = User.balance_in_cents
+    cents = to_cents(amount) if amount is not None else 0
+
+    if operation == "add":
+        new_balance = balance + cents
+    elif operation == "remove":
+        new_balance = case((balance < cents, 0), else_=balance - cents)
+    else:
+        new_balance = literal(0)
+    # Like the single-user command, a reset only records balances that were positive
+    recorded = balance > 0 if operation == "reset" else None
+
+    updated = ledger_rows = net_cents = 0
+    with get_session() as session:
+        for i, target in enumerate(targets):
+            # A single statement reports its own stages, chunks report the ids done
+            chunk = apply_balance_change(
+                session, target, new_balance, TransactionType.ADMIN,
+                DESCRIPTIONS[operation].format(admin=admin_name), recorded, progress if len(targets) == 1 else None
+            )
+            updated += chunk[0]
+            ledger_rows += chunk[1]
+            net_cents += chunk[2]
+            if len(targets) > 1:
+                _report(progress, "balances", min((i + 1) * config.BULK_CHUNK_SIZE, len(discord_ids)), len(discord_ids))
+
+    # Cached balances are only a fallback for outages, drop them rather than patch them
+    balance_cache.clear()
+    live_leaderboard.invalidate()
+    logger.info(f"Bulk {operation} by {admin_name}: {updated} users, {ledger_rows} transactions, {net_cents} cents")
+    return BulkResult(updated, ledger_rows, net_cents)
+
+def bulk_reset_mining(discord_ids, progress=None):
+    """
+    Reset the mining stats of many users with a single UPDATE.
+
+    Args:
+        discord_ids (list): Discord ids of the targeted users, or None for every user
+        progress (callable): Called with (stage, done, total) as the operation advances
+
+    Returns:
+        BulkResult: Users updated
+    """
+    updated = 0
+    with get_session() as session:
+        for target in _targets(discord_ids):
+            updated += session.execute(
+                update(User.__table__)
+                .where(target)
+                .values(mining_level=1, mining_power=1.0, mining_multiplier=1.0, mining_last_time=None)
+            ).rowcount
+            _report(progress, "mining", updated, updated if discord_ids is None else len(discord_ids))
+
+    return BulkResult(updated)
@@ -1,8 +1,18 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DisconnectionError, OperationalError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker, scoped_session
 from contextlib import contextmanager
 import logging
+import time
+import asyncio
+import threading
+import itertools
+
+import config
+from utils import metrics, query_profiler
+from database.health import HEALTH
 
 # Configure logging
 logging.basicConfig(
@@ -25,7 +35,271 @@ if not DATABASE_URL:
     
     DATABASE_URL = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
-# Create engine with connection pooling and pre-ping
+# Optional comma-separated read replicas for read-only sessions
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+# Database instrumentation
+DB_QUERY_SECONDS = metrics.histogram(
+    "db_query_duration_seconds", "Time spent executing SQL statements", ("operation",)
+)
+DB_ERRORS = metrics.counter("db_errors_total", "SQL statements that raised an error", ("operation",))
+DB_POOL_CHECKOUT_SECONDS = metrics.histogram(
+    "db_pool_checkout_seconds", "Time spent waiting to check a connection out of the pool"
+)
+DB_POOL_CHECKED_OUT = metrics.gauge("db_pool_checked_out", "Connections currently checked out of the pool")
+DB_POOL_SIZE = metrics.gauge("db_pool_size", "Connections currently held by the pool")
+DB_POOL_CHECKED_IN = metrics.gauge("db_pool_checked_in", "Idle connections waiting in the pool")
+DB_POOL_OVERFLOW = metrics.gauge("db_pool_overflow", "Connections open beyond the configured pool size")
+DB_POOL_CONNECTS = metrics.counter("db_pool_connects_total", "New database connections opened by the pool")
+DB_POOL_INVALIDATIONS = metrics.counter("db_pool_invalidations_total", "Pooled connections discarded as broken")
+DB_POOL_LIVENESS_PINGS = metrics.counter(
+    "db_pool_liveness_pings_total", "Idle connections checked before reuse", ("result",)
+)
+SQLITE_WRITE_WAIT_SECONDS = metrics.histogram(
+    "sqlite_write_wait_seconds", "Time write transactions waited for the SQLite writer slot"
+)
+
+# Statements that need SQLite's single write lock
+_WRITE_OPERATIONS = frozenset(("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER"))
+DB_REPLICA_LAG = metrics.gauge("db_replica_lag_seconds", "Replication lag of each read replica", ("replica",))
+DB_READONLY_SESSIONS = metrics.counter(
+    "db_readonly_sessions_total", "Read-only sessions by where they were routed", ("target",)
+)
+
+def _statement_operation(statement):
+    """Get the SQL verb of a statement (SELECT, INSERT, ...) for use as a metric label"""
+    parts = statement.split(None, 1)
+    return parts[0].upper() if parts else "UNKNOWN"
+
+def _instrument_engine(engine, primary=True):
+    """
+    Attach query timing to an engine.
+    
+    Only the primary feeds the circuit breaker and the pool gauges; a failing
+    replica is simply skipped by read-only sessions.
+    """
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        DB_QUERY_SECONDS.labels(operation=_statement_operation(statement)).observe(elapsed)
+        query_profiler.record(statement, elapsed)
+        if primary:
+            HEALTH.record(latency=elapsed)
+    
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        start_times = exception_context.connection.info.get("query_start_time") if exception_context.connection else None
+        if start_times:
+            start_times.pop()
+        DB_ERRORS.labels(operation=_statement_operation(exception_context.statement or "")).inc()
+        
+        # Only connection-level failures count against the database's health, not bad queries
+        if primary and (exception_context.is_disconnect or isinstance(exception_context.sqlalchemy_exception, OperationalError)):
+            HEALTH.record(failed=True)
+    
+    _install_liveness_checks(engine)
+    
+    if not primary:
+        return
+    
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTS.inc()
+    
+    @event.listens_for(engine, "invalidate")
+    def invalidate(dbapi_connection, connection_record, exception):
+        DB_POOL_INVALIDATIONS.inc()
+    
+    # Not every pool implementation exposes these counters
+    pool = engine.pool
+    if callable(getattr(pool, "checkedout", None)):
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    if callable(getattr(pool, "size", None)):
+        DB_POOL_SIZE.set_function(pool.size)
+    if callable(getattr(pool, "checkedin", None)):
+        DB_POOL_CHECKED_IN.set_function(pool.checkedin)
+    if callable(getattr(pool, "overflow", None)):
+        DB_POOL_OVERFLOW.set_function(lambda: max(0, pool.overflow()))
+
+def _install_liveness_checks(engine):
+    """
+    Check a pooled connection on checkout only if it has been idle for a while.
+    
+    Replaces pool_pre_ping, which costs a round trip on every checkout. Busy
+    connections are covered by SQLAlchemy invalidating the pool when a
+    statement fails with a disconnect error, and by pool_recycle.
+    """
+    
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+    
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < config.DB_POOL_PING_AFTER_IDLE:
+            return
+        
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception as e:
+            DB_POOL_LIVENESS_PINGS.labels(result="dead").inc()
+            # Makes the pool discard this connection and hand out a fresh one
+            raise DisconnectionError(f"Idle connection failed its liveness check: {e}")
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        DB_POOL_LIVENESS_PINGS.labels(result="alive").inc()
+
+def _configure_sqlite(engine):
+    """
+    Tune SQLite connections and serialize writers.
+    
+    WAL mode lets readers run alongside the single writer. Writers take an
+    in-process lock at their first write statement and give it back when the
+    transaction ends, so concurrent writers queue up here (with a timeout)
+    instead of failing with "database is locked" or spinning in SQLite's busy
+    handler. The lock is held until commit, so a write session must not await
+    between its first flush and its commit: commands build their reply inside
+    the session and send it once the session has closed.
+    
+    A writer that asks for the slot while another transaction on its own
+    thread holds it can never get it (on the bot's loop, the holder only
+    resumes once the waiting command gives the loop back), so it fails at
+    once instead of stalling the loop for SQLITE_BUSY_TIMEOUT.
+    """
+    writer = threading.Lock()
+    owner = [None]  # Thread holding the writer slot
+    
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in (
+            "journal_mode=WAL",
+            f"synchronous={config.SQLITE_SYNCHRONOUS}",
+            f"cache_size=-{config.SQLITE_CACHE_SIZE_KB}",
+            f"mmap_size={config.SQLITE_MMAP_SIZE}",
+            f"busy_timeout={int(config.SQLITE_BUSY_TIMEOUT * 1000)}",
+            "temp_store=MEMORY",
+            "foreign_keys=ON",
+        ):
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def acquire_writer(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("holds_writer") or _statement_operation(statement) not in _WRITE_OPERATIONS:
+            return
+        
+        start = time.perf_counter()
+        if not writer.acquire(blocking=False):
+            # Nothing has been written in this transaction yet
+            if owner[0] == threading.get_ident():
+                raise PoolTimeoutError("The SQLite writer slot is held by another transaction on this thread")
+            if not writer.acquire(timeout=config.SQLITE_BUSY_TIMEOUT):
+                raise PoolTimeoutError("Timed out waiting for the SQLite writer slot")
+        SQLITE_WRITE_WAIT_SECONDS.observe(time.perf_counter() - start)
+        owner[0] = threading.get_ident()
+        conn.info["holds_writer"] = True
+    
+    def release_writer(info):
+        if info.pop("holds_writer", False):
+            owner[0] = None
+            writer.release()
+    
+    # The next writer may overlap the final COMMIT by a moment; busy_timeout covers that
+    event.listen(engine, "commit", lambda conn: release_writer(conn.info))
+    event.listen(engine, "rollback", lambda conn: release_writer(conn.info))
+    # Connections returned to the pool are rolled back without a rollback event
+    event.listen(engine, "reset", lambda dbapi_connection, record, reset_state: release_writer(record.info))
+    event.listen(engine, "invalidate", lambda dbapi_connection, record, exception: release_writer(record.info))
+
+def _engine_options(url):
+    """Pool and connection settings for an engine, from config.py"""
+    options = {
+        "pool_recycle": config.DB_POOL_RECYCLE,  # Replace connections before servers or proxies drop them
+        "echo": False,                           # Set to True for SQL query logging
+    }
+    
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        options["connect_args"] = {
+            "timeout": config.SQLITE_BUSY_TIMEOUT,
+            # Connections move between the bot loop and worker threads; the pool never shares one at a time
+            "check_same_thread": False,
+        }
+    elif backend == "postgresql":
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_use_lifo=True,  # Reuse warm connections so idle ones can age out
+            connect_args={
+                # Let the server cancel runaway queries instead of holding a connection forever
+                "options": f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT_MS}",
+                # Detect dead connections at the TCP level without a query per checkout
+                "keepalives": 1,
+                "keepalives_idle": 30,
+                "keepalives_interval": 10,
+                "keepalives_count": 3,
+            },
+        )
+    return options
+
+def pool_stats():
+    """
+    Get a snapshot of the primary engine's connection pool.
+    
+    Returns:
+        dict: Configured size, connections in use and idle, and overflow in use
+    """
+    pool = get_engine().pool
+    stats = {"pool": type(pool).__name__}
+    for name in ("size", "checkedout", "checkedin", "overflow"):
+        value = getattr(pool, name, None)
+        if callable(value):
+            stats[name] = value() if name != "overflow" else max(0, value())
+    return stats
+
+def warm_pool(connections=None):
+    """
+    Open pooled connections ahead of the first commands, so they don't pay the connection setup cost.
+    
+    Args:
+        connections (int): Connections to open, defaults to DB_POOL_WARM_CONNECTIONS
+        
+    Returns:
+        int: Connections actually opened
+    """
+    connections = config.DB_POOL_WARM_CONNECTIONS if connections is None else connections
+    engine = get_engine()
+    
+    # Hold them all at once so the pool has to open distinct connections
+    opened = []
+    start = time.perf_counter()
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.warning(f"Connection pool warm-up stopped after {len(opened)} connection(s): {e}")
+    finally:
+        for conn in opened:
+            conn.close()
+    
+    logger.info(f"Warmed up {len(opened)} database connection(s) in {time.perf_counter() - start:.2f}s")
+    return len(opened)
+
+# Create engine with connection pooling
 engine = None
 
 def get_engine():
@@ -34,40 +308,168 @@ def get_engine():
     if engine is None:
         try:
             logger.info("Creating database engine...")
-            engine = create_engine(
-                DATABASE_URL,
-                pool_pre_ping=True,  # Enable connection health checks
-                pool_recycle=300,    # Recycle connections every 5 minutes
-                echo=False,          # Set to True for SQL query logging
-            )
+            engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+            if engine.dialect.name == "sqlite":
+                _configure_sqlite(engine)
+            _instrument_engine(engine)
+            HEALTH.attach(engine)
             logger.info("Database engine created successfully")
         except Exception as e:
             logger.error(f"Error creating database engine: {e}")
             raise
     return engine
 
+class Replica:
+    """A read replica engine and its last measured replication lag"""
+    
+    def __init__(self, name, url):
+        self.name = name
+        self.engine = create_engine(url, **_engine_options(url))
+        _instrument_engine(self.engine, primary=False)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.lag = None  # None until measured, or while the replica is unreachable
+        DB_REPLICA_LAG.labels(replica=name).set_function(lambda: self.lag if self.lag is not None else -1)
+    
+    def usable(self):
+        return self.lag is not None and self.lag <= config.DB_REPLICA_MAX_LAG
+    
+    def measure_lag(self):
+        """Measure how far behind the primary this replica is, in seconds"""
+        try:
+            with self.engine.connect() as conn:
+                # An idle primary makes the last replayed transaction look old,
+                # so a replica that has replayed everything it received counts as current
+                self.lag = float(conn.execute(text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                )).scalar())
+        except Exception as e:
+            if self.lag is not None:
+                logger.warning(f"Read replica {self.name} is unavailable: {e}")
+            self.lag = None
+
+replicas = None
+_replica_cycle = None
+_replicas_lock = threading.Lock()
+
+def _lag_monitor_loop():
+    """Keep every replica's lag measurement fresh"""
+    while True:
+        for replica in replicas:
+            replica.measure_lag()
+        time.sleep(config.DB_REPLICA_LAG_CHECK_INTERVAL)
+
+def get_replicas():
+    """Get the read replicas, creating their engines and lag monitor on first use"""
+    global replicas, _replica_cycle
+    with _replicas_lock:
+        if replicas is None:
+            replicas = [Replica(f"replica{i}", url) for i, url in enumerate(DATABASE_REPLICA_URLS)]
+            _replica_cycle = itertools.cycle(replicas) if replicas else None
+            if replicas:
+                # Replicas stay unused until their first lag measurement comes in
+                thread = threading.Thread(target=_lag_monitor_loop, name="db-replica-lag", daemon=True)
+                thread.start()
+                logger.info(f"Routing read-only sessions to {len(replicas)} read replica(s)")
+    return replicas
+
+def _choose_replica():
+    """Pick the next replica that is reachable and caught up, or None"""
+    with _replicas_lock:
+        for _ in range(len(replicas)):
+            replica = next(_replica_cycle)
+            if replica.usable():
+                return replica
+    return None
+
 # Create session factory
 SessionFactory = None
 
+def _session_scope():
+    """Scope sessions to the current asyncio task, or to the thread outside of one"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return task if task is not None else threading.get_ident()
+
 def get_session_factory():
     """Get the session factory, creating it if necessary"""
     global SessionFactory
     if SessionFactory is None:
         engine = get_engine()
-        SessionFactory = scoped_session(sessionmaker(bind=engine))
+        # Commands interleave on one thread, so a thread-scoped session would be
+        # shared between concurrent commands; give each task its own instead
+        SessionFactory = scoped_session(sessionmaker(bind=engine), scopefunc=_session_scope)
     return SessionFactory
 
+def _open_replica_session():
+    """
+    Open a session on a usable replica, checking a connection out up front.
+    
+    Returns:
+        Session: The replica session, or None to use the primary instead
+    """
+    replica = _choose_replica()
+    while replica is not None:
+        session = replica.session_factory()
+        try:
+            session.connection()
+            return session
+        except OperationalError as e:
+            session.close()
+            logger.warning(f"Read replica {replica.name} failed, trying another: {e}")
+            replica.lag = None
+            replica = _choose_replica()
+    return None
+
 @contextmanager
-def get_session():
-    """Context manager for database sessions"""
+def get_session(readonly=False):
+    """
+    Context manager for database sessions.
+    
+    Raises DatabaseUnavailable without touching the pool while the database
+    circuit breaker is open.
+    
+    Args:
+        readonly (bool): Route the session to a read replica that is within
+            DB_REPLICA_MAX_LAG of the primary, falling back to the primary when
+            none is. Only use it for reads that can tolerate slightly stale data.
+    """
+    if readonly and get_replicas():
+        session = _open_replica_session()
+        if session is not None:
+            DB_READONLY_SESSIONS.labels(target="replica").inc()
+            try:
+                yield session
+            finally:
+                # Nothing to commit on a replica
+                session.rollback()
+                session.close()
+            return
+        DB_READONLY_SESSIONS.labels(target="primary").inc()
+    
+    HEALTH.allow()
+    
     session_factory = get_session_factory()
     session = session_factory()
     try:
+        # Check the connection out up front so pool waits are measured on their own
+        checkout_start = time.perf_counter()
+        session.connection()
+        checkout_time = time.perf_counter() - checkout_start
+        DB_POOL_CHECKOUT_SECONDS.observe(checkout_time)
+        HEALTH.record(latency=checkout_time)
+        
         yield session
         session.commit()
     except Exception as e:
+        if isinstance(e, PoolTimeoutError):
+            HEALTH.record(failed=True)
         session.rollback()
         logger.error(f"Session error: {e}")
         raise
     finally:
         session.close()
+        # Drop the registry entry so finished tasks don't keep their sessions alive
+        session_factory.remove()
@@ -0,0 +1,305 @@
+"""
+Compact binary encoding of game results.
+
+GameSession rows used to store game results as JSON text, which for bigslots
+means fifteen multi-byte emoji plus repeated win line symbols and descriptions
+on every spin. Results are now packed into a few bytes: symbols as indices,
+win types as small enum codes and numbers with struct.
+
+Every blob starts with a format version and a game code. The symbol tables,
+win types and paylines below are part of the format: they are frozen per
+version, so changing a game means adding a new version here rather than
+editing the tables in place. Results the encoder doesn't understand are
+stored as JSON text instead, and decode_game_result() reads both.
+"""
+import json
+import struct
+
+FORMAT_VERSION = 1
+
+# Game codes (version 1)
+GAME_CODES = {
+    "coinflip": 1,
+    "dice": 2,
+    "slots": 3,
+    "roulette": 4,
+    "slots_extended": 5,
+}
+GAMES_BY_CODE = {code: game for game, code in GAME_CODES.items()}
+
+# Lookup tables (version 1)
+COIN_SIDES = ("heads", "tails")
+SLOT_SYMBOLS = ("🍒", "🍋", "🍊", "🍇", "🍉", "💎", "7️⃣")
+SLOT_WIN_TYPES = ("NO MATCH", "TWO+ CHERRIES", "THREE OF A KIND", "DIAMOND LINE", "JACKPOT")
+ROULETTE_BET_TYPES = ("red", "black", "even", "odd", "high", "low")
+ROULETTE_COLORS = ("green", "red", "black")
+ROULETTE_PARITIES = ("zero", "odd", "even")
+ROULETTE_RANGES = ("zero", "low", "high")
+EXT_SYMBOLS = ("🍒", "🍋", "🍊", "🍇", "🍉", "💎", "7️⃣", "🎰", "💰", "🃏", "🌟")
+EXT_WILD = "🃏"
+EXT_ROWS = 3
+EXT_REELS = 5
+EXT_PAYLINES = (
+    ((0, 0), (0, 1), (0, 2), (0, 3), (0, 4)),
+    ((1, 0), (1, 1), (1, 2), (1, 3), (1, 4)),
+    ((2, 0), (2, 1), (2, 2), (2, 3), (2, 4)),
+    ((0, 0), (1, 1), (2, 2), (1, 3), (0, 4)),
+    ((2, 0), (1, 1), (0, 2), (1, 3), (2, 4)),
+    ((0, 0), (0, 1), (1, 2), (2, 3), (2, 4)),
+    ((2, 0), (2, 1), (1, 2), (0, 3), (0, 4)),
+)
+# Payline win descriptions, without the wild suffix
+EXT_LINE_KINDS = (
+    "Three of a kind! 🎉",
+    "BONUS WIN! 🎉🎉",
+    "BIG WIN! 🎉🎉🎉",
+    "JACKPOT! 🎊🎊",
+    "MEGA JACKPOT! 🎊🎊🎊",
+)
+
+_HEADER = struct.Struct("<BB")
+_SLOTS = struct.Struct("<HB")  # 3 x 3-bit symbols, win type | win << 7
+_ROULETTE = struct.Struct("<BBB")  # number, bet type | win << 7, color | parity << 2 | range << 4
+_EXT_SUMMARY = struct.Struct("<BBBfB")  # flags, scatter count, free spins, multiplier, win line count
+_EXT_LINE = struct.Struct("<BBd")  # line number, kind, payout
+
+class UnsupportedResult(ValueError):
+    """Raised when a game result can't be represented in the binary format"""
+
+def _index(table, value):
+    try:
+        return table.index(value)
+    except ValueError:
+        raise UnsupportedResult(f"{value!r} is not in the version {FORMAT_VERSION} tables")
+
+def _encode_coinflip(result):
+    return bytes([
+        _index(COIN_SIDES, result["choice"])
+        | _index(COIN_SIDES, result["result"]) << 1
+        | bool(result["win"]) << 2
+    ])
+
+def _decode_coinflip(data):
+    flags = data[0]
+    return {"choice": COIN_SIDES[flags & 1], "result": COIN_SIDES[flags >> 1 & 1], "win": bool(flags & 4)}
+
+def _encode_dice(result):
+    choice = result["choice"] or 0
+    if not 0 <= choice <= 6 or not 1 <= result["result"] <= 6:
+        raise UnsupportedResult("Dice values out of range")
+    return bytes([choice | result["result"] << 3 | bool(result["win"]) << 6])
+
+def _decode_dice(data):
+    packed = data[0]
+    return {"choice": (packed & 7) or None, "result": packed >> 3 & 7, "win": bool(packed & 64)}
+
+def _encode_slots(result):
+    symbols = 0
+    for i, symbol in enumerate(result["slots"]):
+        symbols |= _index(SLOT_SYMBOLS, symbol) << (3 * i)
+    return _SLOTS.pack(symbols, _index(SLOT_WIN_TYPES, result["win_type"]) | bool(result["win"]) << 7)
+
+def _decode_slots(data):
+    symbols, packed = _SLOTS.unpack(data)
+    return {
+        "slots": [SLOT_SYMBOLS[symbols >> (3 * i) & 7] for i in range(3)],
+        "win_type": SLOT_WIN_TYPES[packed & 127],
+        "win": bool(packed & 128),
+    }
+
+def _encode_roulette(result):
+    properties = (
+        _index(ROULETTE_COLORS, result["color"])
+        | _index(ROULETTE_PARITIES, result["parity"]) << 2
+        | _index(ROULETTE_RANGES, result["range"]) << 4
+    )
+    return _ROULETTE.pack(result["number"], _index(ROULETTE_BET_TYPES, result["bet_type"]) | bool(result["win"]) << 7, properties)
+
+def _decode_roulette(data):
+    number, packed, properties = _ROULETTE.unpack(data)
+    return {
+        "bet_type": ROULETTE_BET_TYPES[packed & 127],
+        "number": number,
+        "color": ROULETTE_COLORS[properties & 3],
+        "parity": ROULETTE_PARITIES[properties >> 2 & 3],
+        "range": ROULETTE_RANGES[properties >> 4 & 3],
+        "win": bool(packed & 128),
+    }
+
+def _line_symbols(grid, line):
+    if not 1 <= line <= len(EXT_PAYLINES):
+        raise UnsupportedResult(f"Unknown payline {line}")
+    return [grid[row][col] for row, col in EXT_PAYLINES[line - 1]]
+
+def _line_description(kind, symbols):
+    """Rebuild a win line description, including the wild multiplier suffix"""
+    description = EXT_LINE_KINDS[kind]
+    wild_count = symbols.count(EXT_WILD)
+    if wild_count > 0:
+        description += f" (Wild ×{1.0 + wild_count * 0.5})"
+    return description
+
+def _encode_slots_extended(result):
+    grid = result["grid"]
+    if len(grid) != EXT_ROWS or any(len(row) != EXT_REELS for row in grid):
+        raise UnsupportedResult("Unexpected grid size")
+
+    # Two 4-bit symbols per byte, row by row
+    cells = [_index(EXT_SYMBOLS, symbol) for row in grid for symbol in row]
+    cells.append(0)
+    packed_grid = bytes(cells[i] | cells[i + 1] << 4 for i in range(0, len(cells) - 1, 2))
+
+    lines = b""
+    for win_line in result["win_lines"]:
+        # The symbols and the description follow from the grid and the kind of win
+        symbols = _line_symbols(grid, win_line["line"])
+        kind = next(
+            (i for i in range(len(EXT_LINE_KINDS)) if _line_description(i, symbols) == win_line["description"]), None
+        )
+        if win_line["symbols"] != symbols or kind is None:
+            raise UnsupportedResult(f"Win line {win_line['line']} can't be rebuilt from the grid")
+        lines += _EXT_LINE.pack(win_line["line"], kind, win_line["payout"])
+
+    summary = _EXT_SUMMARY.pack(
+        bool(result["win"]), result["scatter_count"], result["free_spins"], result["multiplier"], len(result["win_lines"])
+    )
+    return packed_grid + summary + lines
+
+def _decode_slots_extended(data):
+    grid_size = (EXT_ROWS * EXT_REELS + 1) // 2
+    cells = []
+    for byte in data[:grid_size]:
+        cells += [byte & 15, byte >> 4]
+    grid = [[EXT_SYMBOLS[cells[row * EXT_REELS + col]] for col in range(EXT_REELS)] for row in range(EXT_ROWS)]
+
+    win, scatter_count, free_spins, multiplier, line_count = _EXT_SUMMARY.unpack_from(data, grid_size)
+    win_lines = []
+    offset = grid_size + _EXT_SUMMARY.size
+    for _ in range(line_count):
+        line, kind, payout = _EXT_LINE.unpack_from(data, offset)
+        offset += _EXT_LINE.size
+
+        symbols = _line_symbols(grid, line)
+        win_lines.append({"line": line, "symbols": symbols, "payout": payout, "description": _line_description(kind, symbols)})
+
+    return {
+        "grid": grid,
+        "win_lines": win_lines,
+        "scatter_count": scatter_count,
+        "free_spins": free_spins,
+        "multiplier": multiplier,
+        "win": bool(win),
+    }
+
+_CODECS = {
+    "coinflip": (_encode_coinflip, _decode_coinflip),
+    "dice": (_encode_dice, _decode_dice),
+    "slots": (_encode_slots, _decode_slots),
+    "roulette": (_encode_roulette, _decode_roulette),
+    "slots_extended": (_encode_slots_extended, _decode_slots_extended),
+}
+
+def encode_game_result(game_type, result):
+    """
+    Pack a game result into the current binary format.
+
+    Args:
+        game_type (str): GameType value
+        result (dict): The game result as built by the cog
+
+    Returns:
+        bytes: The packed result
+
+    Raises:
+        UnsupportedResult: If the game or any value isn't covered by the format
+    """
+    if game_type not in GAME_CODES:
+        raise UnsupportedResult(f"No binary format for {game_type}")
+    try:
+        body = _CODECS[game_type][0](result)
+    except (KeyError, TypeError, struct.error) as e:
+        raise UnsupportedResult(f"Malformed {game_type} result: {e}")
+    return _HEADER.pack(FORMAT_VERSION, GAME_CODES[game_type]) + body
+
+def decode_game_result(packed=None, text=None):
+    """
+    Decode a stored game result, packed or legacy JSON.
+
+    Args:
+        packed (bytes): GameSession.game_result_packed
+        text (str): GameSession.game_result, used when nothing was packed
+
+    Returns:
+        dict: The game result, or None if neither column is set
+    """
+    if packed is not None:
+        version, game_code = _HEADER.unpack_from(packed)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unknown game result format version {version}")
+        return _CODECS[GAMES_BY_CODE[game_code]][1](bytes(packed[_HEADER.size:]))
+    if text is not None:
+        return json.loads(text)
+    return None
+
+def storage_columns(game_type, result):
+    """
+    Get the GameSession column values for storing a game result.
+
+    Returns:
+        dict: game_result_packed when the result can be packed, otherwise game_result as JSON
+    """
+    try:
+        return {"game_result_packed": encode_game_result(game_type, result)}
+    except UnsupportedResult:
+        return {"game_result": json.dumps(result)}
+
+def repack_legacy_results(batch_size=1000):
+    """
+    Re-encode game sessions that still hold JSON text, in id order and small batches.
+
+    Rows whose results can't be packed keep their JSON. Safe to interrupt and
+    re-run. Run VACUUM (or let autovacuum) reclaim the space afterwards.
+
+    Args:
+        batch_size (int): Rows converted per transaction
+
+    Returns:
+        int: Number of rows repacked
+    """
+    from sqlalchemy import select, update
+    from database.database import get_session
+    from database.models import GameSession
+
+    repacked = 0
+    last_id = 0
+    while True:
+        with get_session() as session:
+            rows = session.execute(
+                select(GameSession.id, GameSession.game_type, GameSession.game_result)
+                .where(GameSession.id > last_id)
+                .where(GameSession.game_result_packed.is_(None))
+                .where(GameSession.game_result.is_not(None))
+                .order_by(GameSession.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return repacked
+
+            for row_id, game_type, text in rows:
+                try:
+                    packed = encode_game_result(game_type, json.loads(text))
+                except (UnsupportedResult, ValueError):
+                    continue
+                session.execute(
+                    update(GameSession)
+                    .where(GameSession.id == row_id)
+                    .values(game_result_packed=packed, game_result=None)
+                )
+                repacked += 1
+            last_id = rows[-1][0]
+
+if __name__ == "__main__":
+    # python -m database.game_codec: repack legacy JSON game results
+    import logging
+    logging.basicConfig(level=logging.INFO)
+    print(f"Repacked {repack_legacy_results()} game results")
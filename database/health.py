@@ -0,0 +1,154 @@
+"""
+Database health tracking and circuit breaker.
+
+Query latencies and connection-level errors are fed in from the engine
+events. When too many recent queries fail or run slowly the circuit opens:
+get_session() then fails fast with DatabaseUnavailable instead of piling more
+work onto a struggling database, and a background probe checks for recovery
+with a single cheap query at a time.
+"""
+import collections
+import threading
+import time
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+
+import config
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+
+CIRCUIT_OPEN = metrics.gauge("db_circuit_open", "1 while the database circuit breaker is open")
+CIRCUIT_OPENED = metrics.counter("db_circuit_opened_total", "Times the database circuit breaker opened")
+FAST_FAILURES = metrics.counter("db_fast_failures_total", "Sessions refused because the circuit was open")
+
+class DatabaseUnavailable(Exception):
+    """Raised instead of opening a session while the database circuit is open"""
+
+# Errors that mean the database itself is unhealthy, as opposed to a bad query
+DATABASE_ERRORS = (DatabaseUnavailable, OperationalError, PoolTimeoutError)
+
+class DatabaseHealth:
+    """Sliding window of query outcomes driving a circuit breaker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._window = collections.deque()  # (timestamp, failed, slow)
+        self._failures = 0
+        self._slow = 0
+        self.state = CLOSED
+        self.opened_at = None
+        self.engine = None
+        self._recovery_callbacks = []
+        CIRCUIT_OPEN.set_function(lambda: 1 if self.state == OPEN else 0)
+
+    def attach(self, engine):
+        """Set the engine used by the recovery probe"""
+        self.engine = engine
+
+    def on_recovery(self, callback):
+        """Register a function to call (from the probe thread) when the circuit closes"""
+        self._recovery_callbacks.append(callback)
+
+    def _prune(self, now):
+        """Drop outcomes that have fallen out of the window"""
+        cutoff = now - config.DB_CIRCUIT_WINDOW
+        while self._window and self._window[0][0] < cutoff:
+            _, failed, slow = self._window.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def record(self, latency=None, failed=False):
+        """
+        Record the outcome of a query or connection attempt.
+
+        Args:
+            latency (float): How long it took, in seconds
+            failed (bool): Whether it failed with a database-level error
+        """
+        now = time.monotonic()
+        slow = latency is not None and latency >= config.DB_CIRCUIT_SLOW_QUERY
+
+        with self._lock:
+            if self.state == OPEN:
+                # Only the probe decides when to close again
+                return
+
+            self._window.append((now, int(failed), int(slow)))
+            self._failures += failed
+            self._slow += slow
+            self._prune(now)
+
+            samples = len(self._window)
+            if samples < config.DB_CIRCUIT_MIN_SAMPLES:
+                return
+
+            error_rate = self._failures / samples
+            slow_rate = self._slow / samples
+            if error_rate >= config.DB_CIRCUIT_ERROR_RATE or slow_rate >= config.DB_CIRCUIT_SLOW_RATE:
+                self._open(f"error rate {error_rate:.0%}, slow rate {slow_rate:.0%} over {samples} queries")
+
+    def _open(self, reason):
+        """Open the circuit and start probing for recovery. Called with the lock held."""
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._window.clear()
+        self._failures = self._slow = 0
+        CIRCUIT_OPENED.inc()
+        logger.error(f"Database circuit opened: {reason}")
+
+        thread = threading.Thread(target=self._probe, name="db-health-probe", daemon=True)
+        thread.start()
+
+    def _close(self):
+        with self._lock:
+            self.state = CLOSED
+            self.opened_at = None
+        logger.info("Database circuit closed, database has recovered")
+
+        for callback in self._recovery_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in database recovery callback: {e}")
+
+    def _probe(self):
+        """Run one health check query at a time until the database looks healthy again"""
+        successes = 0
+        while successes < config.DB_PROBE_SUCCESSES:
+            time.sleep(config.DB_PROBE_INTERVAL)
+            start = time.perf_counter()
+            try:
+                with self.engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                latency = time.perf_counter() - start
+            except Exception as e:
+                logger.warning(f"Database health probe failed: {e}")
+                successes = 0
+                continue
+
+            if latency < config.DB_CIRCUIT_SLOW_QUERY:
+                successes += 1
+            else:
+                successes = 0
+
+        self._close()
+
+    def allow(self):
+        """
+        Check if a new session may be opened.
+
+        Raises:
+            DatabaseUnavailable: If the circuit is open
+        """
+        if self.state == OPEN:
+            FAST_FAILURES.inc()
+            raise DatabaseUnavailable("The database is currently unavailable")
+
+# Process-wide health tracker
+HEALTH = DatabaseHealth()
@@ -0,0 +1,215 @@
+"""
+Progressive jackpot pools.
+
+Every slots and bigslots bet adds JACKPOT_CONTRIBUTION_PPM of its stake to the
+pool. Contributions are appended to a per-process deque, which needs no lock
+on the bet's path, and a background thread drains it and adds the sum to the
+pool row with one relative UPDATE every JACKPOT_FLUSH_INTERVAL. Bets never
+touch the pool row themselves, so it doesn't become a hot spot.
+
+A jackpot is claimed inside the winner's settlement transaction with a
+compare-and-swap on the pool's generation. The claim pays the amount it read
+plus this process's unflushed contributions, subtracts what it paid, reseeds
+the pool and moves the generation on. A concurrent claim from any process
+then fails its swap and retries against the reseeded pool, so a pool is never
+paid twice. Contributions flushed in between are kept, since the claim never
+overwrites the amount. Each claim is recorded in jackpot_claims, unique per
+pool generation.
+
+Only bets of at least JACKPOT_MIN_BET can win the pool (see qualifies()):
+the pool never drops below the house-funded seed, so without a floor the
+cheapest spins would return more than they cost.
+
+jackpot_value() serves the pool from a short-lived cache plus this
+process's unflushed contributions.
+"""
+import atexit
+import collections
+import logging
+import threading
+import time
+
+from sqlalchemy import select, update, event
+from sqlalchemy.exc import IntegrityError
+
+import config
+from database.database import get_session
+from database.health import DATABASE_ERRORS
+from database.models import JackpotPool, JackpotClaim
+from utils import metrics
+from utils.cache import TTLCache
+from utils.formatters import to_cents
+
+logger = logging.getLogger(__name__)
+
+JACKPOT_CONTRIBUTIONS = metrics.counter("jackpot_contributions_cents_total", "Cents added to jackpot pools", ("pool",))
+JACKPOT_CLAIMS = metrics.counter("jackpot_claims_total", "Jackpots paid out", ("pool",))
+JACKPOT_CLAIM_CONFLICTS = metrics.counter(
+    "jackpot_claim_conflicts_total", "Claims that lost the swap to a concurrent claim and retried", ("pool",)
+)
+
+PPM = 1000000
+
+# Unflushed contributions in cents per pool, appended by bets and drained by the flusher
+_pending = collections.defaultdict(collections.deque)
+
+# Last pool values read from the database, in cents
+_values = TTLCache(max_entries=16, ttl=config.JACKPOT_CACHE_SECONDS)
+
+def _drain(pool):
+    """Take every unflushed contribution to a pool"""
+    pending = _pending[pool]
+    total = 0
+    while True:
+        try:
+            total += pending.popleft()
+        except IndexError:
+            return total
+
+def ensure_pool(pool):
+    """Create a pool at its seed value if it doesn't exist yet"""
+    with get_session() as session:
+        if session.get(JackpotPool, pool) is not None:
+            return
+        session.add(JackpotPool(name=pool, amount_cents=to_cents(config.JACKPOT_SEED), generation=0))
+        try:
+            session.flush()
+        except IntegrityError:
+            # Another process created it first
+            session.rollback()
+
+def qualifies(bet):
+    """Check if a bet is large enough to win the progressive pool"""
+    return config.JACKPOT_ENABLED and bet >= config.JACKPOT_MIN_BET
+
+def contribute(pool, bet):
+    """Add a bet's contribution to a pool, to be written by the next flush"""
+    cents = to_cents(bet) * config.JACKPOT_CONTRIBUTION_PPM // PPM
+    if cents > 0:
+        _pending[pool].append(cents)
+
+def flush(pool):
+    """
+    Add this process's unflushed contributions to a pool.
+
+    Returns:
+        int: Cents written
+    """
+    cents = _drain(pool)
+    if not cents:
+        return 0
+    try:
+        with get_session() as session:
+            session.execute(
+                update(JackpotPool).where(JackpotPool.name == pool).values(amount_cents=JackpotPool.amount_cents + cents)
+            )
+    except BaseException:
+        # Keep them for the next flush
+        _pending[pool].append(cents)
+        raise
+    JACKPOT_CONTRIBUTIONS.labels(pool=pool).inc(cents)
+    return cents
+
+def claim(session, pool, user_id):
+    """
+    Pay out a pool inside the winner's settlement transaction.
+
+    Args:
+        session: SQLAlchemy session of the settlement, committed by the caller
+        pool (str): Pool name
+        user_id (int): Winner's user id
+
+    Returns:
+        int: Cents won, 0 if every attempt lost to a concurrent claim
+    """
+    local = _drain(pool)
+    seed = to_cents(config.JACKPOT_SEED)
+    unclaimed = [local]
+
+    def restore(session, *args):
+        # The settlement rolled back, so the contributions it swept into the claim are still owed
+        if unclaimed[0]:
+            _pending[pool].append(unclaimed[0])
+    event.listen(session, "after_rollback", restore, once=True)
+
+    for _ in range(config.JACKPOT_CLAIM_ATTEMPTS):
+        row = session.execute(
+            select(JackpotPool.amount_cents, JackpotPool.generation).where(JackpotPool.name == pool)
+        ).one_or_none()
+        if row is None:
+            # Created lazily here if the flusher hasn't created it yet
+            session.add(JackpotPool(name=pool, amount_cents=seed, generation=0))
+            session.flush()
+            row = (seed, 0)
+        amount, generation = row
+        won = amount + local
+
+        # Only succeeds if nobody claimed since the read, and keeps deltas flushed since
+        swapped = session.execute(
+            update(JackpotPool)
+            .where(JackpotPool.name == pool, JackpotPool.generation == generation)
+            .values(amount_cents=JackpotPool.amount_cents + local - won + seed, generation=generation + 1)
+        ).rowcount
+        if swapped:
+            session.add(JackpotClaim(pool=pool, generation=generation, user_id=user_id, amount_cents=won))
+            _values.delete(pool)
+            JACKPOT_CLAIMS.labels(pool=pool).inc()
+            logger.info(f"Jackpot {pool} generation {generation} claimed by user {user_id}: {won} cents")
+            return won
+        JACKPOT_CLAIM_CONFLICTS.labels(pool=pool).inc()
+
+    # Still unflushed, so they go into the next pool
+    _pending[pool].append(local)
+    unclaimed[0] = 0
+    logger.warning(f"Jackpot {pool} claim by user {user_id} lost {config.JACKPOT_CLAIM_ATTEMPTS} swaps, nothing paid")
+    return 0
+
+def jackpot_value(pool):
+    """
+    Get a pool's current value for display.
+
+    Returns:
+        float: The pool value, read from the database at most every JACKPOT_CACHE_SECONDS
+    """
+    cents, _ = _values.get(pool)
+    if cents is None:
+        with get_session(readonly=True) as session:
+            cents = session.scalar(select(JackpotPool.amount_cents).where(JackpotPool.name == pool))
+        cents = to_cents(config.JACKPOT_SEED) if cents is None else cents
+        _values.set(pool, cents)
+    return (cents + sum(_pending[pool])) / 100
+
+def _flush_all():
+    for pool in list(_pending):
+        flush(pool)
+
+def _flush_loop():
+    while True:
+        time.sleep(config.JACKPOT_FLUSH_INTERVAL)
+        try:
+            _flush_all()
+        except DATABASE_ERRORS as e:
+            logger.warning(f"Jackpot contributions not written, retrying: {e}")
+        except Exception as e:
+            logger.error(f"Error writing jackpot contributions: {e}")
+
+def _flush_at_exit():
+    try:
+        _flush_all()
+    except Exception as e:
+        logger.warning(f"Jackpot contributions lost at shutdown: {e}")
+
+def start_jackpot_flusher():
+    """Create the pool and start the thread that writes this process's contributions"""
+    if not config.JACKPOT_ENABLED:
+        return None
+    try:
+        ensure_pool(config.JACKPOT_POOL)
+    except DATABASE_ERRORS as e:
+        # The first claim creates it instead
+        logger.warning(f"Jackpot pool not created at startup: {e}")
+    thread = threading.Thread(target=_flush_loop, name="jackpot-flusher", daemon=True)
+    thread.start()
+    atexit.register(_flush_at_exit)
+    logger.info("Jackpot flusher started")
+    return thread
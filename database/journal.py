@@ -0,0 +1,204 @@
+"""
+Local append-only journal of bet settlements made while the database is down.
+
+Each settlement is written as one JSON line and flushed to the OS straight
+away; a background thread fsyncs the file in batches every
+JOURNAL_FSYNC_INTERVAL, so a machine crash can lose at most that much. Every
+process writes its own file and only claims its own, or those of processes
+on this host that have exited, since a live process may still be appending
+to its file. Files are claimed by renaming before they are replayed, so two
+processes never replay the same file, and each record carries a unique id
+so replays are idempotent.
+"""
+import glob
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+def _pid_alive(pid):
+    """Check if a process with the given id is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _file_owner(path):
+    """
+    Get the host and process id a journal file was written by.
+
+    Returns:
+        tuple: (hostname, pid), or None if the name isn't a journal file's
+    """
+    name = os.path.basename(path).split(".jsonl", 1)[0]
+    if not name.startswith("settlements-"):
+        return None
+    host, _, pid = name[len("settlements-"):].rpartition("-")
+    if not host or not pid.isdigit():
+        return None
+    return host, int(pid)
+
+class SettlementJournal:
+    """Append-only settlement log plus the offline exposure it represents"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, f"settlements-{socket.gethostname()}-{os.getpid()}.jsonl")
+        self._lock = threading.Lock()
+        self._file = None
+        self._dirty = False
+        self._flusher = None
+
+        # Exposure taken on while offline, reset once the journal is replayed
+        self.entries = 0
+        self.outstanding_payout = 0.0
+
+    def _open(self):
+        """Open the journal file for appending. Called with the lock held."""
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._fsync_loop, name="journal-fsync", daemon=True)
+            self._flusher.start()
+
+    def _fsync_loop(self):
+        """Batch fsyncs so appends never wait on the disk"""
+        while True:
+            time.sleep(config.JOURNAL_FSYNC_INTERVAL)
+            with self._lock:
+                if self._file is not None and self._dirty:
+                    os.fsync(self._file.fileno())
+                    self._dirty = False
+
+    def append(self, record):
+        """
+        Append a settlement record.
+
+        Args:
+            record (dict): The settlement, without an id
+
+        Returns:
+            str: The id assigned to the record
+        """
+        record = dict(record, id=uuid.uuid4().hex, ts=time.time())
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+
+        with self._lock:
+            self._open()
+            self._file.write(line)
+            self._file.flush()
+            self._dirty = True
+            self.entries += 1
+            self.outstanding_payout += record.get("payout", 0) if record.get("win") else 0
+
+        return record["id"]
+
+    def can_accept(self, bet):
+        """Check if another offline bet fits within the journal's exposure limits"""
+        return (
+            bet <= config.JOURNAL_MAX_OFFLINE_BET
+            and self.entries < config.JOURNAL_MAX_ENTRIES
+            and self.outstanding_payout < config.JOURNAL_MAX_OUTSTANDING_PAYOUT
+        )
+
+    def _claimable(self, path):
+        """Check if a journal file is ours, or was left behind by a process on this host that has exited"""
+        if path == self.path:
+            return True
+        owner = _file_owner(path)
+        if owner is None or owner[0] != socket.gethostname():
+            # Other hosts replay their own files
+            return False
+        return owner[1] != os.getpid() and not _pid_alive(owner[1])
+
+    @staticmethod
+    def _resumable(path):
+        """Check if a claimed file was left unfinished by us, or by a process on this host that has exited"""
+        owner = _file_owner(path)
+        if owner is None or owner[0] != socket.gethostname():
+            return False
+        claimer = int(path.rsplit("-", 1)[1])
+        return claimer == os.getpid() or not _pid_alive(claimer)
+
+    def claim(self):
+        """
+        Claim this process's journal file for replay, along with files left
+        behind by processes on this host that have exited. Files of live
+        processes are left alone, they may still be appending to them.
+
+        The current file is closed first, so new appends start a fresh file,
+        and the offline exposure limits start again from zero.
+
+        Returns:
+            list: Paths of the claimed files, oldest first
+        """
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+                self._dirty = False
+            # The claimed records are about to reach the database
+            self.entries = 0
+            self.outstanding_payout = 0.0
+
+        claimed = []
+        suffix = f".replaying-{os.getpid()}"
+        for path in sorted(glob.glob(os.path.join(self.directory, "settlements-*.jsonl")), key=os.path.getmtime):
+            if not self._claimable(path):
+                continue
+            try:
+                os.rename(path, path + suffix)
+            except OSError:
+                # Another process claimed it first
+                continue
+            claimed.append(path + suffix)
+
+        # Files claimed earlier, by us or by a process on this host that died, but never finished
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.replaying-*"))):
+            if not self._resumable(path):
+                continue
+            unclaimed = path.rsplit(".replaying-", 1)[0]
+            try:
+                os.rename(path, unclaimed + suffix)
+            except OSError:
+                continue
+            claimed.append(unclaimed + suffix)
+
+        return list(dict.fromkeys(claimed))
+
+    @staticmethod
+    def read(path):
+        """Read the records in a claimed file, skipping a torn final line"""
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping torn journal record in {path}")
+        return records
+
+    def finish(self, path):
+        """Mark a claimed file as fully replayed"""
+        os.replace(path, path.rsplit(".replaying-", 1)[0] + f".applied-{int(time.time())}")
+
+    def has_pending(self):
+        """Check if any journal file this process would claim is waiting to be replayed"""
+        if any(self._claimable(path) for path in glob.glob(os.path.join(self.directory, "settlements-*.jsonl"))):
+            return True
+        return any(self._resumable(path) for path in glob.glob(os.path.join(self.directory, "*.replaying-*")))
+
+# Process-wide journal, or None when journaling is disabled
+JOURNAL = SettlementJournal(config.JOURNAL_DIR) if config.JOURNAL_ENABLED else None
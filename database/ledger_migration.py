@@ -0,0 +1,180 @@
+"""
+Online migration to the compact ledger format.
+
+Balances and transaction amounts move from floats to integer cents, and
+transaction types and descriptions from free text to small-int codes (the
+description templates live in utils/formatters.py). The migration runs in
+three steps, all safe while the bot is serving commands:
+
+1. ensure_schema() adds the new nullable columns. The models write both the
+   new and the legacy columns and read the new ones when they are set.
+2. prepare() relaxes NOT NULL on the legacy transaction columns (PostgreSQL),
+   after which new transactions no longer write them.
+3. backfill() fills the new columns of existing rows in small id-ordered
+   batches, clearing the legacy transaction columns where allowed.
+
+The legacy columns stay mapped and can be dropped by hand once the backfill
+has finished. Every bot process must run this version before step 2, since
+older code writes only the legacy balance.
+"""
+import logging
+import threading
+import time
+
+from sqlalchemy import inspect, select, text, update
+
+import config
+from database.database import get_engine, get_session
+from database.health import DATABASE_ERRORS
+from database.models import User, Transaction, TRANSACTION_TYPE_CODES
+from utils import metrics
+from utils.formatters import to_cents, parse_description
+
+logger = logging.getLogger(__name__)
+
+LEDGER_ROWS_BACKFILLED = metrics.counter(
+    "ledger_rows_backfilled_total", "Rows converted to the compact ledger format", ("table",)
+)
+
+LEGACY_TRANSACTION_COLUMNS = ("amount", "transaction_type")
+
+def legacy_columns_nullable(engine):
+    """Whether the database accepts transactions without the legacy columns"""
+    columns = {column["name"]: column for column in inspect(engine).get_columns(Transaction.__tablename__)}
+    return all(columns[name]["nullable"] for name in LEGACY_TRANSACTION_COLUMNS if name in columns)
+
+def prepare(engine=None):
+    """
+    Stop writing the legacy transaction columns where the database allows it.
+
+    On PostgreSQL DROP NOT NULL is a metadata-only change. SQLite can't alter
+    a column in place, so databases created before the migration keep
+    writing both formats.
+
+    Returns:
+        bool: Whether the legacy columns are no longer written
+    """
+    engine = engine or get_engine()
+    if not legacy_columns_nullable(engine) and engine.dialect.name == "postgresql":
+        quote = engine.dialect.identifier_preparer.quote
+        with engine.begin() as conn:
+            for name in LEGACY_TRANSACTION_COLUMNS:
+                conn.execute(text(
+                    f"ALTER TABLE {quote(Transaction.__tablename__)} ALTER COLUMN {quote(name)} DROP NOT NULL"
+                ))
+        logger.info("Legacy transaction columns are now nullable")
+
+    Transaction.write_legacy_columns = not legacy_columns_nullable(engine)
+    return not Transaction.write_legacy_columns
+
+def _backfill_users(batch_size):
+    """Fill balance_cents for one batch of users"""
+    with get_session() as session:
+        ids = session.scalars(
+            select(User.id).where(User.balance_cents.is_(None)).order_by(User.id).limit(batch_size)
+        ).all()
+        if ids:
+            # Converted in SQL and re-checked, so a balance updated meanwhile is never overwritten
+            session.execute(
+                update(User)
+                .where(User.id.in_(ids), User.balance_cents.is_(None))
+                .values(balance_cents=User.balance_in_cents)
+                .execution_options(synchronize_session=False)
+            )
+    return len(ids)
+
+def _backfill_transactions(batch_size, clear_legacy):
+    """Fill the coded columns for one batch of transactions"""
+    with get_session() as session:
+        rows = session.execute(
+            select(
+                Transaction.id,
+                Transaction.amount_float,
+                Transaction.transaction_type_text,
+                Transaction.description_text
+            )
+            .where(Transaction.amount_cents.is_(None))
+            .order_by(Transaction.id)
+            .limit(batch_size)
+        ).all()
+
+        values = []
+        for transaction_id, amount, transaction_type, description in rows:
+            description_code, description_params = parse_description(description)
+            type_code = TRANSACTION_TYPE_CODES.get(transaction_type)
+            row = {
+                "id": transaction_id,
+                "amount_cents": to_cents(amount),
+                "type_code": type_code,
+                "description_code": description_code,
+                "description_params": description_params,
+            }
+            # Keep the legacy text of types that have no code, it's the only copy
+            if clear_legacy and type_code is not None:
+                row.update(amount_float=None, transaction_type_text=None, description_text=None)
+            values.append(row)
+
+        if values:
+            session.execute(update(Transaction), values)
+    return len(rows)
+
+def backfill(batch_size=None, pause=None):
+    """
+    Convert every remaining row to the compact format.
+
+    Each batch is its own short transaction, so the job can be interrupted
+    and re-run at any point.
+
+    Args:
+        batch_size (int): Rows per batch
+        pause (float): Seconds to sleep between batches, to leave room for live traffic
+
+    Returns:
+        dict: Rows converted per table
+    """
+    batch_size = batch_size or config.LEDGER_BACKFILL_BATCH_SIZE
+    pause = config.LEDGER_BACKFILL_PAUSE if pause is None else pause
+    clear_legacy = prepare()
+
+    converted = {"users": 0, "transactions": 0}
+    for table, run_batch in (
+        ("users", lambda: _backfill_users(batch_size)),
+        ("transactions", lambda: _backfill_transactions(batch_size, clear_legacy)),
+    ):
+        while True:
+            count = run_batch()
+            if not count:
+                break
+            converted[table] += count
+            LEDGER_ROWS_BACKFILLED.labels(table=table).inc(count)
+            time.sleep(pause)
+
+    return converted
+
+def _backfill_worker():
+    """Run the backfill, retrying while the database is unavailable"""
+    while True:
+        try:
+            converted = backfill()
+        except DATABASE_ERRORS as e:
+            logger.warning(f"Ledger backfill interrupted, retrying: {e}")
+            time.sleep(config.LEDGER_BACKFILL_RETRY_INTERVAL)
+            continue
+        except Exception as e:
+            logger.error(f"Ledger backfill failed: {e}")
+            return
+        if any(converted.values()):
+            logger.info(f"Ledger backfill finished: {converted}")
+        return
+
+def start_ledger_backfill():
+    """Start the background thread that migrates existing rows to the compact ledger format"""
+    prepare()
+    thread = threading.Thread(target=_backfill_worker, name="ledger-backfill", daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
+    # python -m database.ledger_migration: run the backfill in the foreground
+    logging.basicConfig(level=logging.INFO)
+    print(f"Converted {backfill()} rows")
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean, Text
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Float, DateTime, ForeignKey, Enum, Boolean, Text, LargeBinary, UniqueConstraint, case, cast
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
 import datetime
 
+from utils.formatters import to_cents, parse_description, format_description
+
 # Base class for all models
 Base = declarative_base()
 
@@ -17,6 +20,26 @@ class TransactionType(enum.Enum):
     MINING = "mining"
     DAILY = "daily"
     ADMIN = "admin"
+    INTEREST = "interest"
+    TAX = "tax"
+    DECAY = "decay"
+    ESCROW = "escrow"
+
+# Small-int codes stored in transactions.type_code. Persisted: never renumber.
+TRANSACTION_TYPE_CODES = {
+    TransactionType.DEPOSIT.value: 1,
+    TransactionType.WITHDRAWAL.value: 2,
+    TransactionType.BET.value: 3,
+    TransactionType.WIN.value: 4,
+    TransactionType.MINING.value: 5,
+    TransactionType.DAILY.value: 6,
+    TransactionType.ADMIN.value: 7,
+    TransactionType.INTEREST.value: 8,
+    TransactionType.TAX.value: 9,
+    TransactionType.DECAY.value: 10,
+    TransactionType.ESCROW.value: 11,
+}
+TRANSACTION_TYPES_BY_CODE = {code: value for value, code in TRANSACTION_TYPE_CODES.items()}
 
 # Enum for game types
 class GameType(enum.Enum):
@@ -33,7 +56,8 @@ class User(Base):
     id = Column(Integer, primary_key=True)
     discord_id = Column(String(20), unique=True, nullable=False)
     username = Column(String(100), nullable=False)
-    balance = Column(Float, default=0.0, nullable=False)
+    balance_cents = Column(BigInteger, default=0, nullable=True)  # Authoritative balance, NULL until backfilled
+    balance_float = Column("balance", Float, default=0.0, nullable=False)  # Legacy balance, kept in step for older readers
     last_daily = Column(DateTime, nullable=True)
     mining_level = Column(Integer, default=1, nullable=False)
     mining_power = Column(Float, default=1.0, nullable=False)
@@ -45,6 +69,32 @@ class User(Base):
     transactions = relationship("Transaction", back_populates="user")
     game_sessions = relationship("GameSession", back_populates="user")
     
+    @hybrid_property
+    def balance(self):
+        if self.balance_cents is not None:
+            return self.balance_cents / 100
+        return self.balance_float
+    
+    @balance.setter
+    def balance(self, value):
+        self.balance_cents = to_cents(value)
+        self.balance_float = self.balance_cents / 100
+    
+    @balance.expression
+    def balance(cls):
+        return func.coalesce(cast(cls.balance_cents, Float) / 100, cls.balance_float)
+    
+    @hybrid_property
+    def balance_in_cents(self):
+        if self.balance_cents is not None:
+            return self.balance_cents
+        return to_cents(self.balance_float)
+    
+    @balance_in_cents.expression
+    def balance_in_cents(cls):
+        # Exact for aggregates, including rows the backfill hasn't reached yet
+        return func.coalesce(cls.balance_cents, cast(func.round(cls.balance_float * 100), BigInteger))
+    
     def __repr__(self):
         return f"<User discord_id={self.discord_id} username='{self.username}' balance={self.balance}>"
 
@@ -53,14 +103,81 @@ class Transaction(Base):
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    amount = Column(Float, nullable=False)
-    transaction_type = Column(String(20), nullable=False)
-    description = Column(String(200), nullable=True)
+    amount_cents = Column(BigInteger, nullable=True)  # NULL until backfilled
+    type_code = Column(SmallInteger, nullable=True)  # TRANSACTION_TYPE_CODES
+    description_code = Column(SmallInteger, nullable=True)  # utils.formatters.DESCRIPTION_TEMPLATES, 0 for free text
+    description_params = Column(String(200), nullable=True)  # Template values, or the free text
     timestamp = Column(DateTime, default=func.now(), nullable=False)
     
+    # Legacy columns. Written only while they are still NOT NULL in the database,
+    # see database/ledger_migration.py
+    amount_float = Column("amount", Float, nullable=True)
+    transaction_type_text = Column("transaction_type", String(20), nullable=True)
+    description_text = Column("description", String(200), nullable=True)
+    write_legacy_columns = True
+    
     # Relationships
     user = relationship("User", back_populates="transactions")
     
+    @hybrid_property
+    def amount(self):
+        if self.amount_cents is not None:
+            return self.amount_cents / 100
+        return self.amount_float
+    
+    @amount.setter
+    def amount(self, value):
+        self.amount_cents = to_cents(value)
+        if self.write_legacy_columns:
+            self.amount_float = self.amount_cents / 100
+    
+    @amount.expression
+    def amount(cls):
+        return func.coalesce(cast(cls.amount_cents, Float) / 100, cls.amount_float)
+    
+    @hybrid_property
+    def amount_in_cents(self):
+        if self.amount_cents is not None:
+            return self.amount_cents
+        return to_cents(self.amount_float)
+    
+    @amount_in_cents.expression
+    def amount_in_cents(cls):
+        return func.coalesce(cls.amount_cents, cast(func.round(cls.amount_float * 100), BigInteger))
+    
+    @hybrid_property
+    def transaction_type(self):
+        if self.type_code is not None:
+            return TRANSACTION_TYPES_BY_CODE[self.type_code]
+        return self.transaction_type_text
+    
+    @transaction_type.setter
+    def transaction_type(self, value):
+        self.type_code = TRANSACTION_TYPE_CODES[value]
+        if self.write_legacy_columns:
+            self.transaction_type_text = value
+    
+    @transaction_type.expression
+    def transaction_type(cls):
+        return case(TRANSACTION_TYPES_BY_CODE, value=cls.type_code, else_=cls.transaction_type_text)
+    
+    @hybrid_property
+    def description(self):
+        if self.description_code is not None:
+            return format_description(self.description_code, self.description_params)
+        return self.description_text
+    
+    @description.setter
+    def description(self, value):
+        self.description_code, self.description_params = parse_description(value)
+        if self.write_legacy_columns:
+            self.description_text = value
+    
+    @description.expression
+    def description(cls):
+        # Templates can only be filled in Python, so SQL sees the legacy text
+        return cls.description_text
+    
     def __repr__(self):
         return f"<Transaction id={self.id} user_id={self.user_id} amount={self.amount} type='{self.transaction_type}'>"
 
@@ -72,7 +189,8 @@ class GameSession(Base):
     game_type = Column(String(20), nullable=False)
     bet_amount = Column(Float, nullable=False)
     payout = Column(Float, nullable=False)
-    game_result = Column(Text, nullable=True)  # JSON string of game result details
+    game_result = Column(Text, nullable=True)  # JSON string of game result details (legacy, or results the codec can't pack)
+    game_result_packed = Column(LargeBinary, nullable=True)  # Compact encoding from database/game_codec.py
     timestamp = Column(DateTime, default=func.now(), nullable=False)
     
     # Relationships
@@ -109,3 +227,146 @@ class BotStatistics(Base):
     
     def __repr__(self):
         return f"<BotStatistics commands={self.commands_used} bets={self.total_bets}>"
+
+class GameRollup(Base):
+    __tablename__ = 'game_rollups'
+    
+    bucket = Column(DateTime, primary_key=True)  # Start of the hourly bucket
+    game_type = Column(String(20), primary_key=True)
+    bets = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    bet_amount = Column(Float, default=0.0, nullable=False)
+    payout_amount = Column(Float, default=0.0, nullable=False)
+    
+    def __repr__(self):
+        return f"<GameRollup bucket={self.bucket} game_type='{self.game_type}' bets={self.bets}>"
+
+class TransactionRollup(Base):
+    __tablename__ = 'transaction_rollups'
+    
+    bucket = Column(DateTime, primary_key=True)  # Start of the hourly bucket
+    transaction_type = Column(String(20), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    amount = Column(Float, default=0.0, nullable=False)
+    
+    def __repr__(self):
+        return f"<TransactionRollup bucket={self.bucket} type='{self.transaction_type}' count={self.count}>"
+
+class MiningRollup(Base):
+    __tablename__ = 'mining_rollups'
+    
+    bucket = Column(DateTime, primary_key=True)  # Start of the hourly bucket
+    sessions = Column(Integer, default=0, nullable=False)
+    duration = Column(Integer, default=0, nullable=False)  # Total seconds mined
+    amount_earned = Column(Float, default=0.0, nullable=False)
+    
+    def __repr__(self):
+        return f"<MiningRollup bucket={self.bucket} sessions={self.sessions} earned={self.amount_earned}>"
+
+class RollupWatermark(Base):
+    __tablename__ = 'rollup_watermarks'
+    
+    source = Column(String(30), primary_key=True)  # Source table name
+    last_id = Column(Integer, default=0, nullable=False)  # Highest row id folded into the rollups
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<RollupWatermark source='{self.source}' last_id={self.last_id}>"
+
+class RollupGap(Base):
+    __tablename__ = 'rollup_gaps'
+    
+    source = Column(String(30), primary_key=True)  # Source table name
+    row_id = Column(Integer, primary_key=True)  # Id below the watermark that wasn't there when it moved past
+    noticed_at = Column(DateTime, default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<RollupGap source='{self.source}' row_id={self.row_id}>"
+
+class AppliedSettlement(Base):
+    __tablename__ = 'applied_settlements'
+    
+    id = Column(String(32), primary_key=True)  # Settlement id from the local journal
+    applied_at = Column(DateTime, default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<AppliedSettlement id='{self.id}'>"
+
+class LedgerCheckpoint(Base):
+    __tablename__ = 'ledger_checkpoints'
+    
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    ledger_cents = Column(BigInteger, default=0, nullable=False)  # Net balance change of the reconciled rows
+    last_transaction_id = Column(Integer, default=0, nullable=False)  # Highest transaction id reconciled
+    last_game_session_id = Column(Integer, default=0, nullable=False)  # Highest winning game session id reconciled
+    
+    def __repr__(self):
+        return f"<LedgerCheckpoint user_id={self.user_id} ledger_cents={self.ledger_cents}>"
+
+class ReconciliationRun(Base):
+    __tablename__ = 'reconciliation_runs'
+    
+    id = Column(Integer, primary_key=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)  # NULL while running, or if the run died
+    users_checked = Column(Integer, default=0, nullable=False)
+    mismatched_users = Column(Integer, default=0, nullable=False)
+    net_drift_cents = Column(BigInteger, default=0, nullable=False)  # Sum of balance minus ledger
+    absolute_drift_cents = Column(BigInteger, default=0, nullable=False)  # Sum of |balance minus ledger|
+    transactions_watermark = Column(Integer, default=0, nullable=False)  # Every user is reconciled up to these ids
+    game_sessions_watermark = Column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<ReconciliationRun id={self.id} mismatched={self.mismatched_users} drift={self.net_drift_cents}>"
+
+class LedgerGap(Base):
+    __tablename__ = 'ledger_gaps'
+    
+    source = Column(String(30), primary_key=True)  # Source table name
+    row_id = Column(Integer, primary_key=True)  # Id below the reconciliation watermark that wasn't there when it moved past
+    noticed_at = Column(DateTime, default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<LedgerGap source='{self.source}' row_id={self.row_id}>"
+
+class BatchJobRun(Base):
+    __tablename__ = 'batch_job_runs'
+    __table_args__ = (UniqueConstraint('job', 'period'),)
+    
+    id = Column(Integer, primary_key=True)
+    job = Column(String(30), nullable=False)
+    period = Column(String(20), nullable=False)  # Start of the scheduling period the run belongs to
+    last_user_id = Column(Integer, default=0, nullable=False)  # Checkpoint: users up to this id are done
+    end_user_id = Column(Integer, nullable=False)  # Highest user id when the run started
+    users_updated = Column(Integer, default=0, nullable=False)
+    ledger_rows = Column(Integer, default=0, nullable=False)
+    net_cents = Column(BigInteger, default=0, nullable=False)
+    started_at = Column(DateTime, default=func.now(), nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<BatchJobRun job='{self.job}' period='{self.period}' last_user_id={self.last_user_id}>"
+
+class JackpotPool(Base):
+    __tablename__ = 'jackpot_pools'
+    
+    name = Column(String(30), primary_key=True)
+    amount_cents = Column(BigInteger, default=0, nullable=False)  # Flushed contributions plus the seed
+    generation = Column(Integer, default=0, nullable=False)  # Incremented by every claim
+    
+    def __repr__(self):
+        return f"<JackpotPool name='{self.name}' amount_cents={self.amount_cents} generation={self.generation}>"
+
+class JackpotClaim(Base):
+    __tablename__ = 'jackpot_claims'
+    __table_args__ = (UniqueConstraint('pool', 'generation'),)
+    
+    id = Column(Integer, primary_key=True)
+    pool = Column(String(30), nullable=False)
+    generation = Column(Integer, nullable=False)  # Generation of the pool that was paid out
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    claimed_at = Column(DateTime, default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<JackpotClaim pool='{self.pool}' generation={self.generation} amount_cents={self.amount_cents}>"
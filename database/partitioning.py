@@ -0,0 +1,257 @@
+"""
+Monthly range partitioning of the append-only history tables.
+
+On PostgreSQL `transactions`, `game_sessions` and `mining_stats` are turned
+into tables partitioned by month on their timestamp, so queries on recent
+rows only touch recent partitions and old months can be archived by dropping
+a partition instead of deleting rows (see database/archive.py).
+
+Existing tables are only converted when asked to, with
+`python -m database.partitioning convert`, never by the bot or dashboard
+processes. The conversion happens in place: the table is renamed, a
+partitioned table with the same columns takes its name and the old table is
+attached as the partition holding everything before the next month. The
+indexes the attach needs are built concurrently, and the CHECK constraint
+that lets the attach skip scanning the old rows is added and validated in
+their own transactions beforehand, so the only blocking steps are the
+metadata changes. Other databases, and PostgreSQL tables that haven't been
+converted, keep plain tables with a timestamp index, and the archive job
+falls back to deleting rows.
+"""
+import datetime
+import logging
+import re
+
+from sqlalchemy import inspect, text
+
+import config
+from database.models import Transaction, GameSession, MiningStats
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = tuple(model.__tablename__ for model in (Transaction, GameSession, MiningStats))
+LEGACY_SUFFIX = "_p_legacy"
+DEFAULT_SUFFIX = "_p_default"
+
+def month_start(timestamp):
+    """Truncate a timestamp to the first instant of its month"""
+    return datetime.datetime(timestamp.year, timestamp.month, 1)
+
+def next_month(timestamp):
+    """Get the first instant of the month after the given month start"""
+    return datetime.datetime(timestamp.year + timestamp.month // 12, timestamp.month % 12 + 1, 1)
+
+def _literal(timestamp):
+    """Render a timestamp for DDL, which doesn't accept bound parameters"""
+    return f"'{timestamp:%Y-%m-%d %H:%M:%S}'"
+
+def partition_name(table, month):
+    """Get the name of a table's partition for a month"""
+    return f"{table}_p{month:%Y%m}"
+
+def is_partitioned(engine, table):
+    """Whether a table is a PostgreSQL partitioned table"""
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        return conn.scalar(
+            text("SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(:table)"),
+            {"table": table}
+        ) or False
+
+def list_partitions(engine, table):
+    """
+    List a partitioned table's partitions with their bounds.
+
+    Returns:
+        list: (name, bound expression) tuples
+    """
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+        ), {"table": table}).all()
+
+def _legacy_end(partitions, table):
+    """Get the upper bound of a table's legacy partition, or None if it has none"""
+    for name, bound in partitions:
+        if name == table + LEGACY_SUFFIX:
+            match = re.search(r"TO \('([^']+)'\)", bound or "")
+            if match:
+                return datetime.datetime.fromisoformat(match.group(1))
+    return None
+
+def _convert_table(engine, table):
+    """Turn a plain table into a monthly partitioned one, keeping its rows in a legacy partition"""
+    quote = engine.dialect.identifier_preparer.quote
+    legacy = table + LEGACY_SUFFIX
+    bound = legacy + "_bound"
+    now = datetime.datetime.utcnow()
+    # The CHECK applies to new rows as soon as it is added, so it has to hold
+    # for the rows written while the conversion runs
+    boundary = next_month(month_start(now))
+    if boundary - now < datetime.timedelta(days=1):
+        boundary = next_month(boundary)
+
+    # Build the indexes the partitioned table needs without blocking writes
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    with autocommit.connect() as conn:
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {quote(table + '_id_ts')} "
+            f"ON {quote(table)} (id, \"timestamp\")"
+        ))
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(table + '_ts')} ON {quote(table)} (\"timestamp\")"
+        ))
+
+    # A validated CHECK lets the attach skip scanning the legacy rows. Adding it
+    # NOT VALID only changes metadata; validating scans the table but doesn't
+    # block reads or writes, so each runs in its own short transaction.
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{config.PARTITION_LOCK_TIMEOUT_MS}ms'"))
+        conn.execute(text(
+            f"ALTER TABLE {quote(table)} DROP CONSTRAINT IF EXISTS {quote(bound)}"
+        ))
+        conn.execute(text(
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(bound)} "
+            f"CHECK (\"timestamp\" < {_literal(boundary)}) NOT VALID"
+        ))
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{config.PARTITION_LOCK_TIMEOUT_MS}ms'"))
+        conn.execute(text(f"ALTER TABLE {quote(table)} VALIDATE CONSTRAINT {quote(bound)}"))
+
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{config.PARTITION_LOCK_TIMEOUT_MS}ms'"))
+        sequence = conn.scalar(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table})
+
+        conn.execute(text(f"ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}"))
+        conn.execute(text(
+            f"CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+            f"CONSTRAINT {quote(table + '_part_pkey')} PRIMARY KEY (id, \"timestamp\")) "
+            f"PARTITION BY RANGE (\"timestamp\")"
+        ))
+        # The bound only belongs on the legacy partition
+        conn.execute(text(f"ALTER TABLE {quote(table)} DROP CONSTRAINT {quote(bound)}"))
+        conn.execute(text(f"CREATE INDEX {quote(table + '_ts_all')} ON {quote(table)} (\"timestamp\")"))
+        conn.execute(text(
+            f"ALTER TABLE {quote(table)} ADD FOREIGN KEY (user_id) REFERENCES users (id)"
+        ))
+        if sequence:
+            # Keep the id sequence alive if the legacy partition is ever dropped
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.id"))
+
+        conn.execute(text(
+            f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(legacy)} "
+            f"FOR VALUES FROM (MINVALUE) TO ({_literal(boundary)})"
+        ))
+        conn.execute(text(
+            f"CREATE TABLE {quote(table + DEFAULT_SUFFIX)} PARTITION OF {quote(table)} DEFAULT"
+        ))
+
+    logger.info(f"Converted {table} to a partitioned table, existing rows are in {legacy}")
+
+def ensure_partitions(engine, table, months_ahead=None):
+    """
+    Create the monthly partitions for the current month and the next few.
+
+    Months still covered by the legacy partition are skipped. Rows outside
+    every monthly partition land in the default partition, so a missed run
+    never fails inserts.
+
+    Returns:
+        list: Names of the partitions created
+    """
+    months_ahead = config.PARTITION_PREMAKE_MONTHS if months_ahead is None else months_ahead
+    quote = engine.dialect.identifier_preparer.quote
+    partitions = list_partitions(engine, table)
+    existing = {name for name, _ in partitions}
+
+    created = []
+    month = month_start(datetime.datetime.utcnow())
+    last = month
+    for _ in range(months_ahead):
+        last = next_month(last)
+    month = max(month, _legacy_end(partitions, table) or month)
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{config.PARTITION_LOCK_TIMEOUT_MS}ms'"))
+        while month <= last:
+            name = partition_name(table, month)
+            if name not in existing:
+                # Rows already in the default partition would have to move first
+                misplaced = conn.scalar(text(
+                    f"SELECT EXISTS (SELECT 1 FROM {quote(table + DEFAULT_SUFFIX)} "
+                    f"WHERE \"timestamp\" >= :start AND \"timestamp\" < :end)"
+                ), {"start": month, "end": next_month(month)})
+                if misplaced:
+                    logger.warning(f"Not creating {name}: the default partition holds rows for that month")
+                else:
+                    # Another process may be running the same maintenance
+                    conn.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {quote(name)} PARTITION OF {quote(table)} "
+                        f"FOR VALUES FROM ({_literal(month)}) TO ({_literal(next_month(month))})"
+                    ))
+                    created.append(name)
+            month = next_month(month)
+
+    for name in created:
+        logger.info(f"Created partition {name}")
+    return created
+
+def ensure_partitioning(engine):
+    """
+    Create upcoming partitions of the history tables that are partitioned.
+
+    Tables that haven't been converted (see convert_history_tables()), and
+    every table on other databases, only get the timestamp index the archive
+    job relies on. This never converts a table itself, so it is safe to run
+    from every process.
+
+    Args:
+        engine: SQLAlchemy engine
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    tables = set(inspect(engine).get_table_names())
+    for table in PARTITIONED_TABLES:
+        if table not in tables:
+            continue
+        if is_partitioned(engine, table):
+            ensure_partitions(engine, table)
+        else:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {quote(table + '_ts')} ON {quote(table)} (\"timestamp\")"
+                ))
+
+def convert_history_tables(engine):
+    """
+    Convert the plain history tables to monthly partitioned ones (PostgreSQL only).
+
+    Run it once, from a single process, with `python -m database.partitioning convert`.
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Returns:
+        list: Names of the tables converted
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("History tables can only be partitioned on PostgreSQL")
+
+    converted = []
+    tables = set(inspect(engine).get_table_names())
+    for table in PARTITIONED_TABLES:
+        if table in tables and not is_partitioned(engine, table):
+            _convert_table(engine, table)
+            ensure_partitions(engine, table)
+            converted.append(table)
+    return converted
+
+if __name__ == "__main__":
+    # python -m database.partitioning [convert]: create upcoming partitions, or convert the tables first
+    import sys
+    from database.database import get_engine
+    logging.basicConfig(level=logging.INFO)
+    if "convert" in sys.argv[1:]:
+        for table in convert_history_tables(get_engine()):
+            print(f"{table}: converted")
+    ensure_partitioning(get_engine())
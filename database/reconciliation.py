@@ -0,0 +1,328 @@
+"""
+Ledger reconciliation.
+
+Checks that every user's balance matches their ledger: the starting balance
+plus the sum of their transactions, minus the stakes of winning games (a win
+is recorded as the gross payout, with the stake debited alongside it).
+
+Users, checkpoints, transactions and winning game sessions are streamed in
+user id order through server-side cursors and merged in a single pass, so
+memory use doesn't grow with the size of the tables. On PostgreSQL all four
+are read from one REPEATABLE READ snapshot, so balances and ledger rows agree
+even while the bot keeps playing.
+
+Each user's checkpoint holds the net effect of the rows reconciled so far
+and the highest ids it covers, so later runs only read newer rows. Rows
+younger than RECONCILE_SETTLE_SECONDS are checked but left out of the
+checkpoint. A transaction that commits a lower id after the watermark moved
+past it would still be skipped, so the ids the watermark skips are kept in
+ledger_gaps and looked up again by every run for RECONCILE_GAP_WINDOW; rows
+that have appeared by then are added to their user's checkpoint. A run
+records at most RECONCILE_GAP_LIMIT of them, a longer run of missing ids is
+an id jump rather than late commits.
+The archiver (database/archive.py) holds back months the last finished
+run hasn't covered, since archived rows are no longer read.
+
+    python -m database.reconciliation
+"""
+import datetime
+import heapq
+import logging
+
+from sqlalchemy import select, delete, func, and_, cast, BigInteger
+
+import config
+from database.database import get_engine, get_session
+from database.models import User, Transaction, GameSession, LedgerCheckpoint, LedgerGap, ReconciliationRun
+from database.upsert import upsert_replace
+from database.rollups import skipped_ids
+from utils import metrics
+from utils.formatters import to_cents
+
+logger = logging.getLogger(__name__)
+
+LEDGER_MISMATCHED_USERS = metrics.gauge("ledger_mismatched_users", "Users whose balance differs from their ledger")
+LEDGER_DRIFT_CENTS = metrics.gauge("ledger_drift_cents", "Sum of balance minus ledger over all users, in cents")
+
+class Mismatch:
+    """A user whose balance differs from their ledger"""
+
+    def __init__(self, user_id, discord_id, username, balance_cents, ledger_cents):
+        self.user_id = user_id
+        self.discord_id = discord_id
+        self.username = username
+        self.balance_cents = balance_cents
+        self.ledger_cents = ledger_cents
+        self.drift_cents = balance_cents - ledger_cents
+
+    def __lt__(self, other):
+        return abs(self.drift_cents) < abs(other.drift_cents)
+
+class ReconciliationReport:
+    """Outcome of a reconciliation run, with the rate of drift since the previous run"""
+
+    def __init__(self, run, largest, previous=None):
+        self.run = run
+        self.largest = sorted(largest, reverse=True)  # Largest mismatches first
+        self.mismatch_rate = run.mismatched_users / run.users_checked if run.users_checked else 0.0
+        self.drift_cents_per_day = None
+        self.new_mismatches_per_day = None
+        if previous is not None:
+            days = (run.started_at - previous.started_at).total_seconds() / 86400
+            if days > 0:
+                self.drift_cents_per_day = (run.net_drift_cents - previous.net_drift_cents) / days
+                self.new_mismatches_per_day = (run.mismatched_users - previous.mismatched_users) / days
+
+class _UserStream:
+    """A user id ordered result that hands out the rows of one user at a time"""
+
+    def __init__(self, result):
+        self.rows = iter(result)
+        self.current = next(self.rows, None)
+        self.orphans = 0  # Rows whose user no longer exists
+
+    def take(self, user_id):
+        """Consume and return the rows for a user"""
+        while self.current is not None and self.current[0] < user_id:
+            self.orphans += 1
+            self.current = next(self.rows, None)
+        rows = []
+        while self.current is not None and self.current[0] == user_id:
+            rows.append(self.current)
+            self.current = next(self.rows, None)
+        return rows
+
+def _fold(rows, settled_below):
+    """Sum (user_id, id, cents) rows, split into settled and recent, and find the last settled id"""
+    settled = recent = last_id = 0
+    for _, row_id, cents in rows:
+        if row_id <= settled_below:
+            settled += cents
+            last_id = row_id
+        else:
+            recent += cents
+    return settled, recent, last_id
+
+def _settled_watermark(conn, model, cutoff, floor):
+    """Highest id of a table whose rows are old enough to checkpoint"""
+    return conn.scalar(
+        select(func.max(model.id)).where(model.id > floor, model.timestamp <= cutoff)
+    ) or floor
+
+def _find_gaps(conn, model, floor, watermark):
+    """Ids between the previous and the new watermark that no visible row has"""
+    if not floor:
+        # A first run starts behind ids that were archived long ago, not late commits
+        return []
+    ids = conn.execution_options(stream_results=True, yield_per=config.RECONCILE_BATCH_SIZE).scalars(
+        select(model.id).where(model.id > floor, model.id <= watermark).order_by(model.id)
+    )
+    try:
+        return skipped_ids(model.__tablename__, floor, ids, config.RECONCILE_GAP_LIMIT)
+    finally:
+        # Stops early once the limit is reached
+        ids.close()
+
+def _late_rows(conn):
+    """
+    Find rows that committed behind the watermark since their ids were recorded as gaps.
+
+    Returns:
+        dict: user_id -> [transaction cents, winning stake cents, filled gaps as (source, id)]
+    """
+    late = {}
+    gaps = {Transaction.__tablename__: [], GameSession.__tablename__: []}
+    for source, row_id in conn.execute(select(LedgerGap.source, LedgerGap.row_id)):
+        gaps.setdefault(source, []).append(row_id)
+
+    if gaps[Transaction.__tablename__]:
+        for user_id, row_id, cents in conn.execute(
+            select(Transaction.user_id, Transaction.id, Transaction.amount_in_cents)
+            .where(Transaction.id.in_(gaps[Transaction.__tablename__]))
+        ):
+            entry = late.setdefault(user_id, [0, 0, []])
+            entry[0] += cents
+            entry[2].append((Transaction.__tablename__, row_id))
+    if gaps[GameSession.__tablename__]:
+        for user_id, row_id, payout, cents in conn.execute(
+            select(GameSession.user_id, GameSession.id, GameSession.payout, cast(func.round(GameSession.bet_amount * 100), BigInteger))
+            .where(GameSession.id.in_(gaps[GameSession.__tablename__]))
+        ):
+            entry = late.setdefault(user_id, [0, 0, []])
+            # Losing games fill their gap without changing the ledger
+            entry[1] += cents if payout > 0 else 0
+            entry[2].append((GameSession.__tablename__, row_id))
+    return late
+
+def _flush_checkpoints(rows, filled_gaps=()):
+    """Write checkpoints, forgetting the gaps whose late rows they now include in the same transaction"""
+    with get_session() as session:
+        upsert_replace(session, LedgerCheckpoint, ("user_id",), rows)
+        for source, row_id in filled_gaps:
+            session.execute(delete(LedgerGap).where(LedgerGap.source == source, LedgerGap.row_id == row_id))
+
+def reconcile(on_mismatch=None):
+    """
+    Compare every user's balance with their ledger and advance the checkpoints.
+
+    Args:
+        on_mismatch (callable): Called with each Mismatch as it is found
+
+    Returns:
+        ReconciliationReport: Counts, drift and the largest mismatches
+    """
+    starting_cents = to_cents(config.STARTING_BALANCE)
+    batch = config.RECONCILE_BATCH_SIZE
+
+    with get_session() as session:
+        previous = session.scalar(
+            select(ReconciliationRun)
+            .where(ReconciliationRun.finished_at.is_not(None))
+            .order_by(ReconciliationRun.id.desc())
+            .limit(1)
+        )
+        floor_t = previous.transactions_watermark if previous else 0
+        floor_g = previous.game_sessions_watermark if previous else 0
+        previous_stats = previous and ReconciliationRun(
+            started_at=previous.started_at,
+            net_drift_cents=previous.net_drift_cents,
+            mismatched_users=previous.mismatched_users
+        )
+        run = ReconciliationRun(started_at=datetime.datetime.utcnow())
+        session.add(run)
+        session.flush()
+        run_id = run.id
+
+    engine = get_engine()
+    if engine.dialect.name == "postgresql":
+        engine = engine.execution_options(isolation_level="REPEATABLE READ")
+
+    users_checked = mismatched = net_drift = absolute_drift = 0
+    largest = []
+    pending = []
+    filled_gaps = []
+
+    with engine.connect() as conn, conn.begin():
+        # Database time, so the cutoff matches the func.now() row defaults
+        cutoff = conn.scalar(select(func.now())) - datetime.timedelta(seconds=config.RECONCILE_SETTLE_SECONDS)
+        watermark_t = _settled_watermark(conn, Transaction, cutoff, floor_t)
+        watermark_g = _settled_watermark(conn, GameSession, cutoff, floor_g)
+        new_gaps_t = _find_gaps(conn, Transaction, floor_t, watermark_t)
+        new_gaps_g = _find_gaps(conn, GameSession, floor_g, watermark_g)
+        late = _late_rows(conn)
+
+        streaming = conn.execution_options(stream_results=True, yield_per=batch)
+        users = streaming.execute(
+            select(User.id, User.discord_id, User.username, User.balance_in_cents).order_by(User.id)
+        )
+        checkpoints = _UserStream(streaming.execute(
+            select(
+                LedgerCheckpoint.user_id,
+                LedgerCheckpoint.ledger_cents,
+                LedgerCheckpoint.last_transaction_id,
+                LedgerCheckpoint.last_game_session_id
+            ).order_by(LedgerCheckpoint.user_id)
+        ))
+        transactions = _UserStream(streaming.execute(
+            select(Transaction.user_id, Transaction.id, Transaction.amount_in_cents)
+            .outerjoin(LedgerCheckpoint, LedgerCheckpoint.user_id == Transaction.user_id)
+            .where(Transaction.id > floor_t)
+            .where(Transaction.id > func.coalesce(LedgerCheckpoint.last_transaction_id, 0))
+            .order_by(Transaction.user_id, Transaction.id)
+        ))
+        stakes = _UserStream(streaming.execute(
+            select(GameSession.user_id, GameSession.id, cast(func.round(GameSession.bet_amount * 100), BigInteger))
+            .outerjoin(LedgerCheckpoint, LedgerCheckpoint.user_id == GameSession.user_id)
+            .where(and_(GameSession.payout > 0, GameSession.id > floor_g))
+            .where(GameSession.id > func.coalesce(LedgerCheckpoint.last_game_session_id, 0))
+            .order_by(GameSession.user_id, GameSession.id)
+        ))
+
+        for user_id, discord_id, username, balance_cents in users:
+            checkpoint = checkpoints.take(user_id)
+            ledger_cents, last_t, last_g = checkpoint[0][1:] if checkpoint else (0, 0, 0)
+
+            settled_t, recent_t, new_last_t = _fold(transactions.take(user_id), watermark_t)
+            settled_g, recent_g, new_last_g = _fold(stakes.take(user_id), watermark_g)
+            late_t, late_g, late_gaps = late.pop(user_id, (0, 0, ()))
+            settled_t += late_t
+            settled_g += late_g
+
+            expected = starting_cents + ledger_cents + settled_t + recent_t - settled_g - recent_g
+            users_checked += 1
+            if balance_cents != expected:
+                mismatch = Mismatch(user_id, discord_id, username, balance_cents, expected)
+                mismatched += 1
+                net_drift += mismatch.drift_cents
+                absolute_drift += abs(mismatch.drift_cents)
+                if len(largest) < config.RECONCILE_REPORT_LIMIT:
+                    heapq.heappush(largest, mismatch)
+                else:
+                    heapq.heappushpop(largest, mismatch)
+                if on_mismatch is not None:
+                    on_mismatch(mismatch)
+
+            if new_last_t or new_last_g or late_gaps:
+                pending.append({
+                    "user_id": user_id,
+                    "ledger_cents": ledger_cents + settled_t - settled_g,
+                    "last_transaction_id": new_last_t or last_t,
+                    "last_game_session_id": new_last_g or last_g,
+                })
+                filled_gaps.extend(late_gaps)
+                if len(pending) >= batch:
+                    _flush_checkpoints(pending, filled_gaps)
+                    pending = []
+                    filled_gaps = []
+
+        _flush_checkpoints(pending, filled_gaps)
+        orphans = transactions.orphans + stakes.orphans
+
+    if orphans:
+        logger.warning(f"{orphans} ledger rows belong to users that no longer exist")
+
+    with get_session() as session:
+        run = session.get(ReconciliationRun, run_id)
+        run.finished_at = datetime.datetime.utcnow()
+        run.users_checked = users_checked
+        run.mismatched_users = mismatched
+        run.net_drift_cents = net_drift
+        run.absolute_drift_cents = absolute_drift
+        # Every checkpoint now covers the settled rows, so the next run can start here
+        run.transactions_watermark = watermark_t
+        run.game_sessions_watermark = watermark_g
+        # Ids the watermarks skipped are looked up again by the next runs
+        session.add_all(LedgerGap(source=Transaction.__tablename__, row_id=row_id) for row_id in new_gaps_t)
+        session.add_all(LedgerGap(source=GameSession.__tablename__, row_id=row_id) for row_id in new_gaps_g)
+        # Gaps that never filled were inserts that rolled back
+        session.execute(delete(LedgerGap).where(
+            LedgerGap.noticed_at < cutoff - datetime.timedelta(seconds=config.RECONCILE_GAP_WINDOW)
+        ))
+        session.flush()
+        session.expunge(run)
+
+    LEDGER_MISMATCHED_USERS.set(mismatched)
+    LEDGER_DRIFT_CENTS.set(net_drift)
+    logger.info(f"Reconciled {users_checked} users: {mismatched} mismatched, net drift {net_drift} cents")
+
+    return ReconciliationReport(run, largest, previous_stats)
+
+if __name__ == "__main__":
+    # python -m database.reconciliation: print mismatches as they are found, then a summary
+    from utils.formatters import format_cents
+
+    logging.basicConfig(level=logging.INFO)
+
+    def print_mismatch(mismatch):
+        print(
+            f"user {mismatch.user_id} ({mismatch.username}): balance {format_cents(mismatch.balance_cents)}, "
+            f"ledger {format_cents(mismatch.ledger_cents)}, drift {format_cents(mismatch.drift_cents)}"
+        )
+
+    report = reconcile(print_mismatch)
+    print(
+        f"{report.run.users_checked} users checked, {report.run.mismatched_users} mismatched "
+        f"({report.mismatch_rate:.2%}), net drift {format_cents(report.run.net_drift_cents)}"
+    )
+    if report.drift_cents_per_day is not None:
+        print(f"Drift since the previous run: {format_cents(round(report.drift_cents_per_day))} per day")
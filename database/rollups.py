@@ -0,0 +1,359 @@
+"""
+Incrementally maintained time-series rollups.
+
+A background compactor folds new `game_sessions`, `transactions` and
+`mining_stats` rows into hourly rollup tables, so trend queries for the
+dashboard never have to scan the raw tables.
+
+Each table has an id watermark. Ids are handed out when a row is inserted
+but become visible when its transaction commits, so a slow transaction can
+commit a lower id after the watermark moved past it. The ids the watermark
+skips are kept in rollup_gaps and re-checked on every pass for
+ROLLUP_GAP_WINDOW, then forgotten (most are inserts that rolled back).
+A pass records at most ROLLUP_GAP_LIMIT of them, since a long run of missing
+ids is an id jump (a sequence setval or an import) rather than late commits.
+"""
+from sqlalchemy import select, delete, func
+import datetime
+import threading
+import time
+import logging
+
+import config
+from database.database import get_session
+from database.upsert import upsert_increment
+from database.models import (
+    GameSession, Transaction, MiningStats,
+    GameRollup, TransactionRollup, MiningRollup, RollupWatermark, RollupGap
+)
+
+logger = logging.getLogger(__name__)
+
+# Supported output intervals for timeseries queries
+INTERVALS = ("hour", "day")
+
+def bucket_start(timestamp, interval="hour"):
+    """
+    Truncate a timestamp to the start of its bucket.
+
+    Args:
+        timestamp (datetime): The timestamp to truncate
+        interval (str): Either "hour" or "day"
+
+    Returns:
+        datetime: The start of the bucket containing the timestamp
+    """
+    if interval == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def _lock_watermark(session, source):
+    """Get the watermark row for a source table, locking it against other compactors"""
+    watermark = session.scalar(
+        select(RollupWatermark)
+        .where(RollupWatermark.source == source)
+        .with_for_update()
+    )
+
+    if not watermark:
+        watermark = RollupWatermark(source=source, last_id=0)
+        session.add(watermark)
+        session.flush()
+
+    return watermark
+
+def skipped_ids(source, last_id, ids, limit):
+    """
+    Ids after last_id that are missing from ids, at most limit of them.
+
+    A run of missing ids longer than limit is an id jump rather than late
+    commits, so only the ids at either end of it are kept.
+
+    Args:
+        source (str): Table the ids belong to, for the log
+        last_id (int): Watermark the ids continue from
+        ids (iterable): Ids seen past the watermark, ascending
+        limit (int): Most ids to return
+
+    Returns:
+        list: The skipped ids, ascending
+    """
+    skipped = []
+    total = 0
+    for row_id in ids:
+        missing = range(last_id + 1, row_id)
+        total += len(missing)
+        if len(missing) > limit:
+            missing = list(missing[:limit // 2]) + list(missing[-(limit // 2):])
+        skipped.extend(missing[:limit - len(skipped)])
+        last_id = row_id
+        if len(skipped) >= limit:
+            break
+    if total > len(skipped):
+        logger.warning(f"{source} watermark skipped at least {total} ids, only {len(skipped)} of them are re-checked for late commits")
+    return skipped
+
+def _pending_rows(session, columns, model, watermark, cutoff, batch_size):
+    """
+    Fetch the rows that have not been folded into the rollups yet and move the watermark past them.
+
+    Late commits behind the watermark come first, then the next batch past it.
+    Ids the new batch skips are recorded as gaps for later passes.
+    """
+    source = model.__tablename__
+    gaps = session.scalars(
+        select(RollupGap.row_id).where(RollupGap.source == source).order_by(RollupGap.row_id).limit(batch_size)
+    ).all()
+    late = []
+    if gaps:
+        late = session.execute(
+            select(*columns).where(model.id.in_(gaps)).where(model.timestamp <= cutoff)
+        ).all()
+        if late:
+            session.execute(delete(RollupGap).where(
+                RollupGap.source == source, RollupGap.row_id.in_([row[0] for row in late])
+            ))
+
+    rows = session.execute(
+        select(*columns)
+        .where(model.id > watermark.last_id)
+        .where(model.timestamp <= cutoff)
+        .order_by(model.id)
+        .limit(batch_size)
+    ).all()
+    if rows:
+        # A new watermark starts behind ids that were archived long ago, not late commits
+        if watermark.last_id:
+            session.add_all(
+                RollupGap(source=source, row_id=row_id)
+                for row_id in skipped_ids(source, watermark.last_id, (row[0] for row in rows), config.ROLLUP_GAP_LIMIT)
+            )
+        watermark.last_id = rows[-1][0]
+
+    # Gaps that never filled were inserts that rolled back
+    session.execute(delete(RollupGap).where(
+        RollupGap.source == source,
+        RollupGap.noticed_at < cutoff - datetime.timedelta(seconds=config.ROLLUP_GAP_WINDOW)
+    ))
+
+    return late + rows
+
+def _compact_game_sessions(session, cutoff, batch_size):
+    """Fold new game sessions into the game rollups"""
+    watermark = _lock_watermark(session, GameSession.__tablename__)
+    rows = _pending_rows(
+        session,
+        (GameSession.id, GameSession.timestamp, GameSession.game_type, GameSession.bet_amount, GameSession.payout),
+        GameSession, watermark, cutoff, batch_size
+    )
+
+    # Aggregate the batch in memory, then upsert each rollup row once
+    deltas = {}
+    for row_id, timestamp, game_type, bet_amount, payout in rows:
+        delta = deltas.setdefault((bucket_start(timestamp), game_type), [0, 0, 0.0, 0.0])
+        delta[0] += 1
+        delta[1] += 1 if payout > 0 else 0
+        delta[2] += bet_amount
+        delta[3] += payout
+
+    upsert_increment(session, GameRollup, ("bucket", "game_type"), [
+        {"bucket": bucket, "game_type": game_type, "bets": bets, "wins": wins, "bet_amount": bet_amount, "payout_amount": payout}
+        for (bucket, game_type), (bets, wins, bet_amount, payout) in deltas.items()
+    ])
+
+    return len(rows)
+
+def _compact_transactions(session, cutoff, batch_size):
+    """Fold new transactions into the transaction rollups"""
+    watermark = _lock_watermark(session, Transaction.__tablename__)
+    rows = _pending_rows(
+        session,
+        (Transaction.id, Transaction.timestamp, Transaction.transaction_type, Transaction.amount),
+        Transaction, watermark, cutoff, batch_size
+    )
+
+    deltas = {}
+    for row_id, timestamp, transaction_type, amount in rows:
+        delta = deltas.setdefault((bucket_start(timestamp), transaction_type), [0, 0.0])
+        delta[0] += 1
+        delta[1] += amount
+
+    upsert_increment(session, TransactionRollup, ("bucket", "transaction_type"), [
+        {"bucket": bucket, "transaction_type": transaction_type, "count": count, "amount": amount}
+        for (bucket, transaction_type), (count, amount) in deltas.items()
+    ])
+
+    return len(rows)
+
+def _compact_mining_stats(session, cutoff, batch_size):
+    """Fold new mining sessions into the mining rollups"""
+    watermark = _lock_watermark(session, MiningStats.__tablename__)
+    rows = _pending_rows(
+        session,
+        (MiningStats.id, MiningStats.timestamp, MiningStats.mining_duration, MiningStats.amount_earned),
+        MiningStats, watermark, cutoff, batch_size
+    )
+
+    deltas = {}
+    for row_id, timestamp, duration, amount_earned in rows:
+        delta = deltas.setdefault(bucket_start(timestamp), [0, 0, 0.0])
+        delta[0] += 1
+        delta[1] += duration
+        delta[2] += amount_earned
+
+    upsert_increment(session, MiningRollup, ("bucket",), [
+        {"bucket": bucket, "sessions": sessions, "duration": duration, "amount_earned": amount_earned}
+        for bucket, (sessions, duration, amount_earned) in deltas.items()
+    ])
+
+    return len(rows)
+
+def compact_rollups(batch_size=None):
+    """
+    Run one compaction pass over every source table.
+
+    Each table is folded in its own transaction so the rollup update and the
+    watermark move together. Rows newer than ROLLUP_SETTLE_SECONDS are left for
+    the next pass, and rows that commit behind the watermark are picked up
+    from the recorded gaps.
+
+    Args:
+        batch_size (int): Maximum rows to fold per table (defaults to config)
+
+    Returns:
+        dict: Number of rows folded per source table
+    """
+    batch_size = batch_size or config.ROLLUP_BATCH_SIZE
+    folded = {}
+
+    for source, compact in (
+        (GameSession.__tablename__, _compact_game_sessions),
+        (Transaction.__tablename__, _compact_transactions),
+        (MiningStats.__tablename__, _compact_mining_stats),
+    ):
+        with get_session() as session:
+            # Use database time so the cutoff matches the func.now() row defaults
+            now = session.scalar(select(func.now()))
+            cutoff = now - datetime.timedelta(seconds=config.ROLLUP_SETTLE_SECONDS)
+            folded[source] = compact(session, cutoff, batch_size)
+
+    return folded
+
+def _compactor_loop():
+    """Compact rollups forever, draining backlogs before sleeping"""
+    while True:
+        try:
+            folded = compact_rollups()
+            if any(count >= config.ROLLUP_BATCH_SIZE for count in folded.values()):
+                # Still catching up, go again straight away
+                continue
+        except Exception as e:
+            logger.error(f"Error compacting rollups: {e}")
+
+        time.sleep(config.ROLLUP_COMPACT_INTERVAL)
+
+def start_rollup_compactor():
+    """Start the rollup compactor in a background daemon thread"""
+    thread = threading.Thread(target=_compactor_loop, name="rollup-compactor", daemon=True)
+    thread.start()
+    logger.info("Rollup compactor started")
+    return thread
+
+def _fold(rows, interval, key_fields, sum_fields):
+    """Re-bucket hourly rollup rows into the requested interval"""
+    points = {}
+
+    for row in rows:
+        bucket = bucket_start(row["bucket"], interval)
+        key = (bucket,) + tuple(row[field] for field in key_fields)
+        point = points.get(key)
+
+        if point is None:
+            point = {"bucket": bucket}
+            point.update({field: row[field] for field in key_fields})
+            point.update({field: 0 for field in sum_fields})
+            points[key] = point
+
+        for field in sum_fields:
+            point[field] += row[field]
+
+    return [points[key] for key in sorted(points)]
+
+def game_series(session, start, end, interval="hour", game_type=None):
+    """
+    Get bets, wins, wagered amount, payouts and house profit per game over a range.
+
+    Args:
+        session: SQLAlchemy session
+        start (datetime): Start of the range (inclusive)
+        end (datetime): End of the range (exclusive)
+        interval (str): Either "hour" or "day"
+        game_type (str): Optional game type filter
+
+    Returns:
+        list: One dict per (bucket, game_type)
+    """
+    query = (
+        select(GameRollup.bucket, GameRollup.game_type, GameRollup.bets, GameRollup.wins,
+               GameRollup.bet_amount, GameRollup.payout_amount)
+        .where(GameRollup.bucket >= bucket_start(start), GameRollup.bucket < end)
+        .order_by(GameRollup.bucket)
+    )
+    if game_type:
+        query = query.where(GameRollup.game_type == game_type)
+
+    rows = [row._asdict() for row in session.execute(query).all()]
+    points = _fold(rows, interval, ("game_type",), ("bets", "wins", "bet_amount", "payout_amount"))
+
+    for point in points:
+        point["house_profit"] = point["bet_amount"] - point["payout_amount"]
+
+    return points
+
+def transaction_series(session, start, end, interval="hour", transaction_type=None):
+    """
+    Get transaction counts and totals per transaction type over a range.
+
+    Args:
+        session: SQLAlchemy session
+        start (datetime): Start of the range (inclusive)
+        end (datetime): End of the range (exclusive)
+        interval (str): Either "hour" or "day"
+        transaction_type (str): Optional transaction type filter
+
+    Returns:
+        list: One dict per (bucket, transaction_type)
+    """
+    query = (
+        select(TransactionRollup.bucket, TransactionRollup.transaction_type,
+               TransactionRollup.count, TransactionRollup.amount)
+        .where(TransactionRollup.bucket >= bucket_start(start), TransactionRollup.bucket < end)
+        .order_by(TransactionRollup.bucket)
+    )
+    if transaction_type:
+        query = query.where(TransactionRollup.transaction_type == transaction_type)
+
+    rows = [row._asdict() for row in session.execute(query).all()]
+    return _fold(rows, interval, ("transaction_type",), ("count", "amount"))
+
+def mining_series(session, start, end, interval="hour"):
+    """
+    Get mining sessions, time mined and output over a range.
+
+    Args:
+        session: SQLAlchemy session
+        start (datetime): Start of the range (inclusive)
+        end (datetime): End of the range (exclusive)
+        interval (str): Either "hour" or "day"
+
+    Returns:
+        list: One dict per bucket
+    """
+    query = (
+        select(MiningRollup.bucket, MiningRollup.sessions, MiningRollup.duration, MiningRollup.amount_earned)
+        .where(MiningRollup.bucket >= bucket_start(start), MiningRollup.bucket < end)
+        .order_by(MiningRollup.bucket)
+    )
+
+    rows = [row._asdict() for row in session.execute(query).all()]
+    return _fold(rows, interval, (), ("sessions", "duration", "amount_earned"))
@@ -0,0 +1,47 @@
+"""
+Schema creation and additive upgrades.
+
+create_all() only creates missing tables, so columns added to existing models
+would never reach an existing database. ensure_schema() also adds any missing
+nullable column with ALTER TABLE ... ADD COLUMN, which is a metadata-only
+change on both PostgreSQL and SQLite and safe to run on every startup.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+from database.models import Base
+
+logger = logging.getLogger(__name__)
+
+def ensure_schema(engine):
+    """
+    Create missing tables and add missing nullable columns.
+
+    Args:
+        engine: SQLAlchemy engine to upgrade
+
+    Returns:
+        list: "table.column" names of the columns that were added
+    """
+    Base.metadata.create_all(engine)
+
+    added = []
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    logger.error(f"Can't add NOT NULL column {table.name}.{column.name} automatically")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+                added.append(f"{table.name}.{column.name}")
+
+    for name in added:
+        logger.info(f"Added column {name}")
+    return added
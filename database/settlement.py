@@ -0,0 +1,570 @@
+"""
+Bet settlement shared by the game cogs.
+
+open_bet() checks that a player can cover a bet before the game is played and
+settle_bet() applies the outcome in a single transaction. When the database is
+unavailable and the settlement journal is enabled, both fall back to the
+player's cached balance under conservative limits and the settlement is written
+to the local journal, to be replayed once the database has recovered.
+
+Games played over several commands use escrow_bet() instead of open_bet(),
+which moves the bet out of the balance when the game starts so it can't be
+spent in the meantime. Escrow rows are ordinary ledger rows that net to zero
+once settle_bet() releases them, and refund_stale_escrows() returns any that
+a crashed process never settled.
+
+settle_round() settles every bet of a shared round (see utils/rounds.py) in
+one transaction, with multi-row inserts for the ledger and game history and
+a single UPDATE of the players' balances.
+"""
+import datetime
+import os
+import threading
+import time
+import logging
+
+from sqlalchemy import select, insert, update, func, case, cast, Float
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+import config
+from database import game_codec, jackpot
+from database.database import get_session
+from database.health import HEALTH, CLOSED, DATABASE_ERRORS, DatabaseUnavailable
+from database.journal import JOURNAL
+from database.models import User, Transaction, GameSession, TransactionType, AppliedSettlement, TRANSACTION_TYPE_CODES
+from utils import metrics
+from utils.cache import balance_cache
+from utils.events import BUS, BetSettled, BalanceChanged
+from utils.formatters import parse_description, format_description, to_cents
+from utils.helpers import create_user_if_not_exists
+
+logger = logging.getLogger(__name__)
+
+SETTLEMENTS_JOURNALED = metrics.counter("settlements_journaled_total", "Settlements written to the local journal")
+SETTLEMENTS_REPLAYED = metrics.counter("settlements_replayed_total", "Journaled settlements replayed", ("outcome",))
+ROUND_SETTLEMENT_SECONDS = metrics.histogram(
+    "round_settlement_duration_seconds", "Time to settle every bet of a shared round in one transaction", ("game",)
+)
+ESCROWS_REFUNDED = metrics.counter("escrows_refunded_total", "Escrowed bets refunded because their game was never settled")
+
+ESCROW_TYPE_CODE = TRANSACTION_TYPE_CODES[TransactionType.ESCROW.value]
+
+# Errors raised before anything reached the database, so a settlement that
+# failed with one of them is known not to have been applied
+NOT_APPLIED_ERRORS = (DatabaseUnavailable, PoolTimeoutError)
+
+class InsufficientFunds(Exception):
+    """Raised when a player can't cover a bet"""
+
+    def __init__(self, bet, balance):
+        super().__init__(f"Balance {balance} can't cover a bet of {bet}")
+        self.bet = bet
+        self.balance = balance
+
+class Stake:
+    """A bet that has been checked against the player's balance and awaits settlement"""
+
+    def __init__(self, discord_id, balance, user_id=None, offline=False):
+        self.discord_id = discord_id
+        self.balance = balance
+        self.user_id = user_id
+        self.offline = offline  # Checked against the cached balance only
+        self.jackpot = 0  # Progressive jackpot paid on settlement
+        self.escrowed = 0  # Taken out of the balance by escrow_bet(), released on settlement
+        self.escrow_game = None
+        self.escrow_reference = None
+        self.escrowed_at = None
+
+def open_bet(discord_user, bet):
+    """
+    Check that a player can cover a bet.
+
+    Args:
+        discord_user: Discord user placing the bet
+        bet (float): Bet amount
+
+    Returns:
+        Stake: The stake to pass to settle_bet()
+
+    Raises:
+        InsufficientFunds: If the player's balance is too low
+        DatabaseUnavailable: If the database is down and the bet can't be taken offline
+    """
+    try:
+        with get_session() as session:
+            user = create_user_if_not_exists(session, discord_user)
+            stake = Stake(user.discord_id, user.balance, user_id=user.id)
+    except NOT_APPLIED_ERRORS as e:
+        if JOURNAL is None:
+            raise
+        stake = _open_offline_bet(str(discord_user.id), bet, e)
+
+    if stake.balance < bet:
+        raise InsufficientFunds(bet, stake.balance)
+    return stake
+
+def _open_offline_bet(discord_id, bet, error):
+    """Take a bet against the cached balance while the database is unavailable"""
+    balance, _ = balance_cache.get(discord_id)
+    if balance is None:
+        raise DatabaseUnavailable("No cached balance to bet against") from error
+    if not JOURNAL.can_accept(bet):
+        raise DatabaseUnavailable("Offline betting limits reached") from error
+    return Stake(discord_id, balance, offline=True)
+
+def _escrow_description(game_type, reference):
+    return f"Escrow for {game_type} hand {reference}"
+
+def _open_escrow(session, user_id, description, since):
+    """Amount still held in escrow under a description, in cents"""
+    code, params = parse_description(description)
+    held = session.scalar(
+        select(func.sum(Transaction.amount_in_cents)).where(
+            Transaction.user_id == user_id,
+            Transaction.type_code == ESCROW_TYPE_CODE,
+            Transaction.description_code == code,
+            Transaction.description_params == params,
+            Transaction.timestamp >= since
+        )
+    ) or 0
+    return max(-held, 0)
+
+def escrow_bet(discord_user, game_type, reference, bet, stake=None):
+    """
+    Take a bet out of the player's balance until the game is settled.
+
+    Args:
+        discord_user: Discord user placing the bet
+        game_type (GameType): The game being played
+        reference (str): Identifies the game in the escrow ledger rows
+        bet (float): Amount to escrow
+        stake (Stake): A stake from an earlier call, to escrow more on the same game
+
+    Returns:
+        Stake: The stake to pass to settle_bet(), with stake.balance after the escrow
+
+    Raises:
+        InsufficientFunds: If the player's balance is too low
+    """
+    with get_session() as session:
+        user = create_user_if_not_exists(session, discord_user)
+        session.refresh(user, with_for_update=True)
+        if user.balance < bet:
+            raise InsufficientFunds(bet, user.balance)
+
+        user.balance -= bet
+        session.add(Transaction(
+            user_id=user.id,
+            amount=-bet,
+            transaction_type=TransactionType.ESCROW.value,
+            description=_escrow_description(game_type.value, reference)
+        ))
+        change = BalanceChanged(user.discord_id, user.username, -bet, user.balance, TransactionType.ESCROW.value)
+        user_id = user.id
+
+    if stake is None:
+        stake = Stake(change.discord_id, change.new_balance, user_id=user_id)
+        stake.escrow_game = game_type.value
+        stake.escrow_reference = reference
+        stake.escrowed_at = datetime.datetime.utcnow()
+    stake.balance = change.new_balance
+    stake.escrowed += bet
+
+    balance_cache.set(change.discord_id, change.new_balance)
+    BUS.publish(change)
+    return stake
+
+def release_escrow(session, user, amount, description):
+    """Return an escrowed amount to a locked user row"""
+    user.balance += amount
+    session.add(Transaction(
+        user_id=user.id,
+        amount=amount,
+        transaction_type=TransactionType.ESCROW.value,
+        description=description
+    ))
+
+def refund_stale_escrows():
+    """
+    Refund escrowed bets whose game was never settled, such as hands lost with a crashed process.
+
+    An escrow counts as stale once BLACKJACK_HAND_TTL plus BLACKJACK_ESCROW_GRACE
+    have passed since its last ledger row. Each refund re-reads the escrow
+    under the user's lock, so a concurrent settlement or refund from another
+    process is never paid twice.
+
+    Returns:
+        int: Number of escrows refunded
+    """
+    now = datetime.datetime.utcnow()
+    since = now - datetime.timedelta(seconds=config.BLACKJACK_ESCROW_LOOKBACK)
+    cutoff = now - datetime.timedelta(seconds=config.BLACKJACK_HAND_TTL + config.BLACKJACK_ESCROW_GRACE)
+
+    with get_session() as session:
+        stale = session.execute(
+            select(Transaction.user_id, Transaction.description_code, Transaction.description_params)
+            .where(Transaction.type_code == ESCROW_TYPE_CODE, Transaction.timestamp >= since)
+            .group_by(Transaction.user_id, Transaction.description_code, Transaction.description_params)
+            .having(func.sum(Transaction.amount_in_cents) < 0, func.max(Transaction.timestamp) < cutoff)
+        ).all()
+
+    refunded = 0
+    for user_id, code, params in stale:
+        description = format_description(code, params)
+        with get_session() as session:
+            user = session.scalar(select(User).where(User.id == user_id).with_for_update())
+            cents = _open_escrow(session, user_id, description, since)
+            if not cents:
+                continue
+            release_escrow(session, user, cents / 100, description)
+            change = BalanceChanged(user.discord_id, user.username, cents / 100, user.balance, TransactionType.ESCROW.value)
+
+        logger.warning(f"Refunded {cents} cents of unsettled escrow to user {user_id}: {description}")
+        balance_cache.set(change.discord_id, change.new_balance)
+        BUS.publish(change)
+        ESCROWS_REFUNDED.inc()
+        refunded += 1
+    return refunded
+
+def apply_settlement(session, user, game_type, bet, win, payout, game_result, played_at=None):
+    """
+    Apply a game outcome to a locked user row, recording the transaction and game session.
+
+    Args:
+        session: SQLAlchemy session
+        user (User): The player, selected FOR UPDATE
+        game_type (str): GameType value
+        bet (float): Bet amount
+        win (bool): Whether the player won
+        payout (float): Amount paid out on a win
+        game_result (dict): Game details to record
+        played_at (datetime): When the game was played, for journaled settlements
+
+    Returns:
+        float: The player's new balance
+    """
+    # The balance and the ledger both move by whole cents, rounded once here
+    bet_cents = to_cents(bet)
+    payout_cents = to_cents(payout) if win else 0
+    user.balance = (user.balance_in_cents - bet_cents + payout_cents) / 100
+    if win:
+        transaction_type = TransactionType.WIN.value
+        transaction_desc = f"Won {game_type} game"
+    else:
+        transaction_type = TransactionType.BET.value
+        transaction_desc = f"Lost {game_type} game"
+
+    extra = {"timestamp": played_at} if played_at is not None else {}
+
+    session.add(Transaction(
+        user_id=user.id,
+        amount=(payout_cents if win else -bet_cents) / 100,
+        transaction_type=transaction_type,
+        description=transaction_desc,
+        **extra
+    ))
+    session.add(GameSession(
+        user_id=user.id,
+        game_type=game_type,
+        bet_amount=bet_cents / 100,
+        payout=payout_cents / 100,
+        **game_codec.storage_columns(game_type, game_result),
+        **extra
+    ))
+
+    return user.balance
+
+def publish_settlement(discord_id, username, game_type, bet, win, payout, new_balance, escrowed=0):
+    """Announce a committed settlement on the event bus"""
+    BUS.publish(BetSettled(discord_id, username, game_type, bet, win, payout, new_balance))
+    BUS.publish(BalanceChanged(
+        discord_id, username, escrowed + (payout if win else 0) - bet, new_balance,
+        TransactionType.WIN.value if win else TransactionType.BET.value
+    ))
+
+def settle_bet(stake, game_type, bet, win, payout, game_result, jackpot_pool=None):
+    """
+    Settle a bet, debiting the stake and crediting any winnings in one transaction.
+
+    Args:
+        stake (Stake): The stake returned by open_bet()
+        game_type (GameType): The game played
+        bet (float): Bet amount
+        win (bool): Whether the player won
+        payout (float): Amount paid out on a win
+        game_result (dict): Game details to record
+        jackpot_pool (str): Pool whose jackpot this bet hit, claimed in the same transaction
+            and added to the payout (the amount is left in stake.jackpot)
+
+    Returns:
+        float: The player's new balance (an estimate if the settlement was journaled)
+
+    Raises:
+        InsufficientFunds: If a concurrent command spent the balance since open_bet()
+    """
+    released = 0
+    if not stake.offline:
+        try:
+            with get_session() as session:
+                user = session.scalar(select(User).where(User.id == stake.user_id).with_for_update())
+                if stake.escrowed:
+                    # The bet was held when the game started, the settlement below debits it again.
+                    # Released unless refund_stale_escrows() got there first, which the row lock orders us against
+                    description = _escrow_description(stake.escrow_game, stake.escrow_reference)
+                    held = _open_escrow(session, user.id, description, stake.escrowed_at - datetime.timedelta(minutes=1)) / 100
+                    released = min(held, stake.escrowed)
+                    if released:
+                        release_escrow(session, user, released, description)
+                if user.balance < bet:
+                    raise InsufficientFunds(bet, user.balance)
+                if jackpot_pool is not None:
+                    # Paid atomically with the win, so a rolled back settlement never empties the pool
+                    stake.jackpot = jackpot.claim(session, jackpot_pool, user.id) / 100
+                    win, payout = True, payout + stake.jackpot
+                new_balance = apply_settlement(session, user, game_type.value, bet, win, payout, game_result)
+                username = user.username
+        except NOT_APPLIED_ERRORS:
+            if JOURNAL is None:
+                raise
+            logger.warning(f"Database unavailable while settling a {game_type.value} bet, journaling it")
+            if stake.jackpot:
+                # The claim rolled back with the settlement, a journaled spin only pays its line win
+                payout -= stake.jackpot
+                stake.jackpot = 0
+        else:
+            # Remember the balance for when the database is unavailable
+            balance_cache.set(stake.discord_id, new_balance)
+            # Side effects run in the subscribers, after the commit and off the bet's path
+            publish_settlement(stake.discord_id, username, game_type.value, bet, win, payout, new_balance, released)
+            return new_balance
+
+    JOURNAL.append({
+        "discord_id": stake.discord_id,
+        "game_type": game_type.value,
+        "bet": bet,
+        "win": win,
+        "payout": payout,
+        "game_result": game_result,
+        **({
+            "escrow": _escrow_description(stake.escrow_game, stake.escrow_reference),
+            "escrowed_at": stake.escrowed_at.timestamp(),
+        } if stake.escrowed else {})
+    })
+    SETTLEMENTS_JOURNALED.inc()
+
+    new_balance = stake.balance + stake.escrowed - bet + (payout if win else 0)
+    balance_cache.set(stake.discord_id, new_balance)
+    return new_balance
+
+def _settle_batch(game_type, bets):
+    """Settle bets from online stakes in one transaction, cancelling those of players who can no longer cover them"""
+    user_ids = sorted({bet.stake.user_id for bet in bets})
+    ledger, history, balances, settled = [], [], {}, []
+
+    with get_session() as session:
+        # Locked in id order, so concurrent rounds sharing players can't deadlock
+        players = {
+            row.id: row for row in session.execute(
+                select(User.id, User.username, User.balance_in_cents.label("balance"))
+                .where(User.id.in_(user_ids))
+                .order_by(User.id)
+                .with_for_update()
+            )
+        }
+        staked = {}
+        for bet in bets:
+            staked[bet.stake.user_id] = staked.get(bet.stake.user_id, 0) + to_cents(bet.amount)
+
+        for bet in bets:
+            user_id = bet.stake.user_id
+            player = players.get(user_id)
+            if player is None or player.balance < staked[user_id]:
+                # Spent elsewhere since the bet was placed, none of the player's bets stand
+                bet.cancelled = True
+                continue
+
+            balance = balances.get(user_id, player.balance)
+            if bet.win:
+                amount_cents = to_cents(bet.payout)
+                balance += amount_cents - to_cents(bet.amount)
+                transaction_type = TransactionType.WIN.value
+                description = f"Won {game_type.value} game"
+            else:
+                amount_cents = -to_cents(bet.amount)
+                balance += amount_cents
+                transaction_type = TransactionType.BET.value
+                description = f"Lost {game_type.value} game"
+            balances[user_id] = balance
+            bet.new_balance = balance / 100
+
+            description_code, description_params = parse_description(description)
+            row = {
+                "user_id": user_id,
+                "amount_cents": amount_cents,
+                "type_code": TRANSACTION_TYPE_CODES[transaction_type],
+                "description_code": description_code,
+                "description_params": description_params,
+            }
+            if Transaction.write_legacy_columns:
+                row.update({"amount": amount_cents / 100, "transaction_type": transaction_type, "description": description})
+            ledger.append(row)
+
+            history.append({
+                "user_id": user_id,
+                "game_type": game_type.value,
+                "bet_amount": to_cents(bet.amount) / 100,
+                "payout": to_cents(bet.payout) / 100 if bet.win else 0,
+                "game_result": None,
+                "game_result_packed": None,
+                **game_codec.storage_columns(game_type.value, bet.game_result)
+            })
+            settled.append((bet, player.username))
+
+        if settled:
+            session.execute(insert(Transaction.__table__).values(ledger))
+            session.execute(insert(GameSession.__table__).values(history))
+            new_balance = case(balances, value=User.id)
+            session.execute(
+                update(User.__table__)
+                .where(User.id.in_(list(balances)))
+                .values(balance_cents=new_balance, balance=cast(new_balance, Float) / 100)
+            )
+
+    for bet, username in settled:
+        publish_settlement(bet.stake.discord_id, username, game_type.value, bet.amount, bet.win, bet.payout, bet.new_balance)
+    for bet, _ in settled:
+        balance_cache.set(bet.stake.discord_id, bet.new_balance)
+
+def settle_round(game_type, bets):
+    """
+    Settle every bet of a shared round.
+
+    Bets from online stakes are settled together in one transaction. Bets
+    taken offline, or all of them if the database fails before the batch is
+    applied, are settled one by one with settle_bet(), which journals them.
+
+    Args:
+        game_type (GameType): The game played
+        bets (list): RoundBet objects with stake, amount, win, payout and game_result set.
+            Each gets new_balance, or cancelled when its player can no longer cover it
+
+    Returns:
+        int: Number of bets settled
+    """
+    online = [bet for bet in bets if not bet.stake.offline]
+    single = [bet for bet in bets if bet.stake.offline]
+
+    if online:
+        started = time.perf_counter()
+        try:
+            _settle_batch(game_type, online)
+        except NOT_APPLIED_ERRORS:
+            if JOURNAL is None:
+                raise
+            logger.warning(f"Database unavailable while settling a {game_type.value} round, journaling its bets")
+            for bet in online:
+                bet.cancelled = False
+            single = bets
+        ROUND_SETTLEMENT_SECONDS.labels(game=game_type.value).observe(time.perf_counter() - started)
+
+    for bet in single:
+        try:
+            bet.new_balance = settle_bet(bet.stake, game_type, bet.amount, bet.win, bet.payout, bet.game_result)
+        except InsufficientFunds:
+            bet.cancelled = True
+
+    return sum(1 for bet in bets if not bet.cancelled)
+
+_replay_lock = threading.Lock()
+_replay_wakeup = threading.Event()
+
+def replay_journal():
+    """
+    Apply every journaled settlement to the database.
+
+    Each record is applied in its own transaction together with its id in
+    applied_settlements, so replaying a file again (after a crash part way
+    through) skips the records that already made it in.
+
+    Returns:
+        int: Number of settlements applied
+    """
+    if JOURNAL is None:
+        return 0
+
+    applied = 0
+    with _replay_lock:
+        for path in JOURNAL.claim():
+            for record in JOURNAL.read(path):
+                with get_session() as session:
+                    if session.get(AppliedSettlement, record["id"]) is not None:
+                        SETTLEMENTS_REPLAYED.labels(outcome="duplicate").inc()
+                        continue
+
+                    user = session.scalar(
+                        select(User).where(User.discord_id == record["discord_id"]).with_for_update()
+                    )
+                    if user is None:
+                        logger.error(f"Journaled settlement {record['id']} is for unknown user {record['discord_id']}")
+                        SETTLEMENTS_REPLAYED.labels(outcome="unknown_user").inc()
+                        continue
+
+                    played_at = datetime.datetime.fromtimestamp(record["ts"], datetime.timezone.utc).replace(tzinfo=None)
+                    escrowed = 0
+                    if "escrow" in record:
+                        # Released unless refund_stale_escrows() got there first
+                        escrowed_at = datetime.datetime.fromtimestamp(record["escrowed_at"], datetime.timezone.utc).replace(tzinfo=None)
+                        escrowed = _open_escrow(session, user.id, record["escrow"], escrowed_at - datetime.timedelta(minutes=1)) / 100
+                        if escrowed:
+                            release_escrow(session, user, escrowed, record["escrow"])
+                    new_balance = apply_settlement(
+                        session, user, record["game_type"], record["bet"], record["win"],
+                        record["payout"], record["game_result"], played_at=played_at
+                    )
+                    session.add(AppliedSettlement(id=record["id"]))
+                    username = user.username
+
+                if new_balance < 0:
+                    logger.warning(f"User {record['discord_id']} is overdrawn after replaying settlement {record['id']}")
+                balance_cache.set(record["discord_id"], new_balance)
+                publish_settlement(
+                    record["discord_id"], username, record["game_type"], record["bet"],
+                    record["win"], record["payout"], new_balance, escrowed
+                )
+                SETTLEMENTS_REPLAYED.labels(outcome="applied").inc()
+                applied += 1
+
+            JOURNAL.finish(path)
+            logger.info(f"Replayed settlement journal {os.path.basename(path)}")
+
+    return applied
+
+def _replayer_loop():
+    """Replay the journal whenever the database recovers, and retry periodically"""
+    while True:
+        _replay_wakeup.wait(config.JOURNAL_REPLAY_INTERVAL)
+        _replay_wakeup.clear()
+        if HEALTH.state != CLOSED or not JOURNAL.has_pending():
+            continue
+        try:
+            applied = replay_journal()
+            if applied:
+                logger.info(f"Applied {applied} journaled settlements")
+        except DATABASE_ERRORS as e:
+            logger.warning(f"Settlement journal replay interrupted: {e}")
+        except Exception as e:
+            logger.error(f"Error replaying settlement journal: {e}")
+
+def start_journal_replayer():
+    """Start the background thread that replays the settlement journal"""
+    if JOURNAL is None:
+        return None
+
+    HEALTH.on_recovery(_replay_wakeup.set)
+    # Pick up anything left behind by a previous run straight away
+    _replay_wakeup.set()
+
+    thread = threading.Thread(target=_replayer_loop, name="journal-replayer", daemon=True)
+    thread.start()
+    logger.info("Settlement journal replayer started")
+    return thread
@@ -0,0 +1,101 @@
+"""
+Bot-wide statistics maintained from the event bus.
+
+Every bet and mining session used to update the single bot_statistics row
+inside its own transaction, which serialized all settlements on that row.
+The recorder instead sums BetSettled and MiningCompleted events in memory
+and adds the totals to the row with one UPDATE every STATS_FLUSH_INTERVAL,
+so the counters trail the ledger by a few seconds and only ever cost the
+bets a queue append.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from sqlalchemy import select, update
+
+import config
+from database.database import get_session
+from database.health import DATABASE_ERRORS
+from database.models import BotStatistics
+from utils.events import BUS, BetSettled, MiningCompleted
+
+logger = logging.getLogger(__name__)
+
+# Counters summed between flushes
+COUNTERS = ("total_bets", "total_bet_amount", "total_payout_amount", "total_mined")
+
+class StatisticsRecorder:
+    """Sums statistics from events and adds them to bot_statistics in one statement"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pending = dict.fromkeys(COUNTERS, 0)
+
+    def handle(self, event):
+        with self._lock:
+            if isinstance(event, BetSettled):
+                self.pending["total_bets"] += 1
+                self.pending["total_bet_amount"] += event.bet
+                self.pending["total_payout_amount"] += event.payout if event.win else 0
+            else:
+                self.pending["total_mined"] += event.earned
+
+    def flush(self):
+        """
+        Add the accumulated counters to the statistics row.
+
+        Returns:
+            bool: Whether anything was written
+        """
+        with self._lock:
+            increments, self.pending = self.pending, dict.fromkeys(COUNTERS, 0)
+        if not any(increments.values()):
+            return False
+
+        try:
+            with get_session() as session:
+                stats_id = session.scalar(select(BotStatistics.id).limit(1))
+                if stats_id is None:
+                    # Column defaults only apply on insert, so start the counters explicitly
+                    session.add(BotStatistics(commands_used=0, **increments))
+                else:
+                    session.execute(update(BotStatistics).where(BotStatistics.id == stats_id).values({
+                        name: getattr(BotStatistics, name) + value for name, value in increments.items()
+                    }))
+        except BaseException:
+            # Keep the counts for the next flush
+            with self._lock:
+                for name, value in increments.items():
+                    self.pending[name] += value
+            raise
+        return True
+
+RECORDER = StatisticsRecorder()
+
+def _flush_loop():
+    while True:
+        time.sleep(config.STATS_FLUSH_INTERVAL)
+        try:
+            RECORDER.flush()
+        except DATABASE_ERRORS as e:
+            logger.warning(f"Bot statistics not written, retrying: {e}")
+        except Exception as e:
+            logger.error(f"Error writing bot statistics: {e}")
+
+def _flush_at_exit():
+    try:
+        RECORDER.flush()
+    except Exception as e:
+        logger.warning(f"Bot statistics lost at shutdown: {e}")
+
+def start_statistics_recorder():
+    """Subscribe the recorder to the bus and start the thread that writes its totals"""
+    BUS.subscribe((BetSettled, MiningCompleted), RECORDER.handle, name="bot_statistics")
+    thread = threading.Thread(target=_flush_loop, name="statistics-recorder", daemon=True)
+    thread.start()
+    # Write what the last interval accumulated when the process exits normally
+    atexit.register(_flush_at_exit)
+    logger.info("Bot statistics recorder started")
+    return thread
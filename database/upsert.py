@@ -0,0 +1,77 @@
+"""
+Dialect-aware upserts.
+
+PostgreSQL and SQLite both support INSERT ... ON CONFLICT DO UPDATE, which
+adds to (or overwrites) existing rows in a single statement. Other databases fall
+back to reading each row and updating it through the ORM.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+
+_INSERT_BY_DIALECT = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def upsert_increment(session, model, key_columns, rows):
+    """
+    Insert rows, or add their values to the existing rows with the same key.
+
+    Args:
+        session: SQLAlchemy session
+        model: Mapped class whose primary key is key_columns
+        key_columns (tuple): Names of the primary key columns
+        rows (list): Dicts holding every key column and the amounts to add
+    """
+    if not rows:
+        return
+
+    insert = _INSERT_BY_DIALECT.get(session.get_bind().dialect.name)
+    if insert is None:
+        _upsert_increment_orm(session, model, key_columns, rows)
+        return
+
+    increment_columns = [column for column in rows[0] if column not in key_columns]
+    statement = insert(model).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={column: getattr(model, column) + statement.excluded[column] for column in increment_columns},
+    )
+    session.execute(statement)
+
+def upsert_replace(session, model, key_columns, rows):
+    """
+    Insert rows, or overwrite the existing rows with the same key.
+
+    Args:
+        session: SQLAlchemy session
+        model: Mapped class whose primary key is key_columns
+        key_columns (tuple): Names of the primary key columns
+        rows (list): Dicts holding every key column and the values to store
+    """
+    if not rows:
+        return
+
+    insert = _INSERT_BY_DIALECT.get(session.get_bind().dialect.name)
+    if insert is None:
+        for row in rows:
+            session.merge(model(**row))
+        return
+
+    statement = insert(model).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={column: statement.excluded[column] for column in rows[0] if column not in key_columns},
+    )
+    session.execute(statement)
+
+def _upsert_increment_orm(session, model, key_columns, rows):
+    """Portable read-modify-write fallback for upsert_increment()"""
+    for row in rows:
+        key = tuple(row[column] for column in key_columns)
+        existing = session.get(model, key if len(key) > 1 else key[0])
+        if existing is None:
+            session.add(model(**row))
+            continue
+        for column, value in row.items():
+            if column not in key_columns:
+                setattr(existing, column, getattr(existing, column) + value)
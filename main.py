@@ -1,11 +1,17 @@
 import os
 import logging
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
 from dotenv import load_dotenv
 import threading
 import asyncio
 from sqlalchemy import select, func
 import json
+import datetime
+import hmac
+import itertools
+import collections
+from functools import wraps
+import config
 
 # Load environment variables
 load_dotenv()
@@ -21,13 +27,118 @@ app = Flask(__name__)
 app.secret_key = os.getenv("SESSION_SECRET")
 
 # Import database models after initializing app
-from database.database import get_engine, get_session
-from database.models import User, Transaction, GameSession
+from database.database import get_engine, get_session, pool_stats, warm_pool
+from database.models import User, Transaction, GameSession, MiningStats
+from database import rollups
+from database.health import DatabaseUnavailable
+from database.schema import ensure_schema
+from database.game_codec import decode_game_result
+from database.ledger_migration import start_ledger_backfill
+from database import export
+from utils.metrics import render_metrics
+from utils.events import BUS, BetSettled, MiningCompleted
+from utils import sampling_profiler
 
 # Create tables if they don't exist
 engine = get_engine()
-from database.models import Base
-Base.metadata.create_all(engine)
+ensure_schema(engine)
+
+# Move existing balances and transactions to the compact ledger format
+start_ledger_backfill()
+
+# Open pooled connections before the dashboard and bot start taking requests
+warm_pool()
+
+def require_admin_token(view):
+    """Only allow requests carrying the ADMIN_API_TOKEN as a bearer token"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = os.getenv("ADMIN_API_TOKEN")
+        if not token:
+            return jsonify({"error": "Admin API is disabled. Set ADMIN_API_TOKEN to enable it."}), 403
+        
+        provided = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(provided, token):
+            return jsonify({"error": "Unauthorized"}), 401
+        
+        return view(*args, **kwargs)
+    return wrapper
+
+# Under gunicorn the bot runs in its own process, so nothing publishes to this process's bus
+BOT_IN_PROCESS = os.environ.get('RUNNING_IN_GUNICORN') != 'true'
+
+# Recent bets and mining payouts for the dashboard, fed from the event bus
+activity_feed = collections.deque(maxlen=config.DASHBOARD_FEED_SIZE)
+
+def record_activity(event):
+    if isinstance(event, BetSettled):
+        activity_feed.appendleft({
+            "type": "bet",
+            "username": event.username,
+            "game_type": event.game_type,
+            "bet": event.bet,
+            "win": event.win,
+            "payout": event.payout,
+            "timestamp": event.timestamp,
+        })
+    else:
+        activity_feed.appendleft({
+            "type": "mining",
+            "username": event.username,
+            "earned": event.earned,
+            "bonus": event.bonus,
+            "timestamp": event.timestamp,
+        })
+
+if BOT_IN_PROCESS:
+    BUS.subscribe((BetSettled, MiningCompleted), record_activity, name="dashboard_feed")
+
+def _epoch(timestamp):
+    """Seconds since the epoch of a naive UTC timestamp, like the events carry"""
+    return timestamp.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+def recent_activity():
+    """Build the feed from the newest game_sessions and mining_stats rows, for processes without the bot"""
+    limit = config.DASHBOARD_FEED_SIZE
+    with get_session(readonly=True) as session:
+        games = session.execute(
+            select(User.username, GameSession.game_type, GameSession.bet_amount, GameSession.payout, GameSession.timestamp)
+            .join(User)
+            .order_by(GameSession.id.desc())
+            .limit(limit)
+        ).all()
+        mining = session.execute(
+            select(User.username, MiningStats.amount_earned, MiningStats.timestamp)
+            .join(User)
+            .order_by(MiningStats.id.desc())
+            .limit(limit)
+        ).all()
+
+    items = [
+        {
+            "type": "bet",
+            "username": username,
+            "game_type": game_type,
+            "bet": bet,
+            "win": payout > 0,
+            "payout": payout,
+            "timestamp": _epoch(timestamp),
+        } for username, game_type, bet, payout, timestamp in games
+    ] + [
+        {
+            "type": "mining",
+            "username": username,
+            "earned": earned,
+            "bonus": None,  # Not stored
+            "timestamp": _epoch(timestamp),
+        } for username, earned, timestamp in mining
+    ]
+    items.sort(key=lambda item: item["timestamp"], reverse=True)
+    return items[:limit]
+
+@app.errorhandler(DatabaseUnavailable)
+def database_unavailable(error):
+    return jsonify({"error": str(error)}), 503
 
 @app.route('/')
 def index():
@@ -42,12 +153,24 @@ def status():
             "Economy System", 
             "Gambling Games", 
             "Mining System"
-        ]
+        ],
+        "database_pool": pool_stats()
     })
 
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/feed')
+def feed():
+    # Served from memory, newest first, when the bot publishes to this process
+    if BOT_IN_PROCESS:
+        return jsonify(list(activity_feed))
+    return jsonify(recent_activity())
+
 @app.route('/api/stats')
 def stats():
-    with get_session() as session:
+    with get_session(readonly=True) as session:
         # Count total users
         user_count = session.scalar(select(func.count()).select_from(User))
         
@@ -73,8 +196,8 @@ def stats():
             .limit(10)
         ).all()
         
-        # Get total currency in circulation
-        total_currency = session.scalar(select(func.sum(User.balance)).select_from(User)) or 0
+        # Get total currency in circulation, summed exactly in cents
+        total_cents = session.scalar(select(func.sum(User.balance_in_cents)).select_from(User)) or 0
         
         # Get recent game sessions
         recent_games = session.execute(
@@ -85,7 +208,9 @@ def stats():
                 GameSession.game_type,
                 GameSession.bet_amount,
                 GameSession.payout,
-                GameSession.timestamp
+                GameSession.timestamp,
+                GameSession.game_result_packed,
+                GameSession.game_result
             )
             .join(User)
             .order_by(GameSession.timestamp.desc())
@@ -94,7 +219,7 @@ def stats():
         
         return jsonify({
             "user_count": user_count,
-            "total_currency": total_currency,
+            "total_currency": total_cents / 100,
             "top_users": [{"username": username, "balance": balance} for username, balance in rich_users],
             "recent_transactions": [
                 {
@@ -114,11 +239,132 @@ def stats():
                     "game_type": game_type,
                     "bet_amount": bet_amount,
                     "payout": payout,
-                    "timestamp": timestamp.isoformat()
-                } for id, user_id, username, game_type, bet_amount, payout, timestamp in recent_games
+                    "timestamp": timestamp.isoformat(),
+                    "result": decode_game_result(packed, text)
+                } for id, user_id, username, game_type, bet_amount, payout, timestamp, packed, text in recent_games
             ]
         })
 
+@app.route('/admin/games/<int:game_id>')
+@require_admin_token
+def admin_game(game_id):
+    """Audit a single game session with its decoded result"""
+    with get_session(readonly=True) as session:
+        game = session.get(GameSession, game_id)
+        if game is None:
+            return jsonify({"error": "Game session not found"}), 404
+        
+        return jsonify({
+            "id": game.id,
+            "user_id": game.user_id,
+            "game_type": game.game_type,
+            "bet_amount": game.bet_amount,
+            "payout": game.payout,
+            "timestamp": game.timestamp.isoformat(),
+            "encoding": "packed" if game.game_result_packed is not None else "json",
+            "stored_bytes": len(game.game_result_packed) if game.game_result_packed is not None else len((game.game_result or "").encode()),
+            "result": decode_game_result(game.game_result_packed, game.game_result)
+        })
+
+def _parse_timestamp(value):
+    """Parse an ISO timestamp as naive UTC, the way timestamps are stored"""
+    timestamp = datetime.datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def _parse_range_args():
+    """Parse the start/end/interval query arguments shared by the timeseries endpoints"""
+    end = request.args.get('end')
+    start = request.args.get('start')
+    interval = request.args.get('interval', 'hour')
+
+    end = _parse_timestamp(end) if end else datetime.datetime.utcnow()
+    start = _parse_timestamp(start) if start else end - datetime.timedelta(days=1)
+
+    if interval not in rollups.INTERVALS:
+        raise ValueError(f"interval must be one of: {', '.join(rollups.INTERVALS)}")
+    if start >= end:
+        raise ValueError("start must be before end")
+    if end - start > datetime.timedelta(days=config.ROLLUP_MAX_RANGE_DAYS):
+        raise ValueError(f"range cannot exceed {config.ROLLUP_MAX_RANGE_DAYS} days")
+
+    return start, end, interval
+
+@app.route('/api/metrics/timeseries/<series>')
+def timeseries(series):
+    try:
+        start, end, interval = _parse_range_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with get_session() as session:
+        if series == 'games':
+            points = rollups.game_series(session, start, end, interval, request.args.get('game_type'))
+        elif series == 'transactions':
+            points = rollups.transaction_series(session, start, end, interval, request.args.get('transaction_type'))
+        elif series == 'mining':
+            points = rollups.mining_series(session, start, end, interval)
+        else:
+            return jsonify({"error": f"Unknown series: {series}"}), 404
+
+        for point in points:
+            point["bucket"] = point["bucket"].isoformat()
+
+        return jsonify({
+            "series": series,
+            "interval": interval,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "points": points
+        })
+
+@app.route('/admin/export/<table>')
+@require_admin_token
+def admin_export(table):
+    """Stream a time range of transactions, game_sessions or mining_stats as NDJSON or CSV"""
+    fmt = request.args.get('format', 'ndjson')
+    try:
+        end = request.args.get('end')
+        end = _parse_timestamp(end) if end else datetime.datetime.utcnow()
+        start = _parse_timestamp(request.args['start'])
+        chunks = export.export_rows(table, start, end, fmt, request.args.get('include_archive') == 'true')
+        # Validates the arguments before the response starts
+        first = next(chunks, "")
+    except KeyError:
+        return jsonify({"error": "start is required"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filename = f"{table}-{start:%Y%m%d}-{end:%Y%m%d}.{fmt}"
+    return Response(
+        stream_with_context(itertools.chain([first], chunks)),
+        mimetype=export.MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@app.route('/admin/profile')
+@require_admin_token
+def admin_profile():
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        result = sampling_profiler.profile(seconds)
+    except ValueError:
+        return jsonify({"error": "seconds must be a number"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+
+    if request.args.get('format') == 'collapsed':
+        return Response(
+            result.collapsed(),
+            mimetype='text/plain',
+            headers={"Content-Disposition": "attachment; filename=profile.collapsed"}
+        )
+
+    summary = result.summary()
+    summary["collapsed"] = result.collapsed()
+    return jsonify(summary)
+
 # Set up a function to start the Discord bot in a separate thread
 def start_bot():
     from bot import setup_bot
@@ -143,7 +389,7 @@ def start_bot():
     asyncio.run(run_bot())
 
 # Start the bot in a separate thread when this file is imported by gunicorn
-if os.environ.get('RUNNING_IN_GUNICORN') != 'true':
+if BOT_IN_PROCESS:
     bot_thread = threading.Thread(target=start_bot, daemon=True)
     bot_thread.start()
     logging.info("Bot starting in separate thread")
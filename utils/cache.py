@@ -0,0 +1,136 @@
+"""
+Small in-memory caches of recently read values.
+
+Read-only commands fall back to these when the database is unavailable, so
+users still see a (possibly slightly stale) balance or leaderboard.
+
+The live leaderboard is kept current from balance change events between
+database reads (see utils/events.py).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+class TTLCache:
+    """A bounded least-recently-used cache whose entries expire after a time to live"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if the cache is full"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """
+        Get a cached value.
+
+        Returns:
+            tuple: (value, age in seconds), or (None, None) if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age > self.ttl:
+                del self._entries[key]
+                return None, None
+
+            self._entries.move_to_end(key)
+            return value, age
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class LiveLeaderboard:
+    """
+    The top balances as last read from the database, updated in place from balance changes.
+
+    Every user off the board is known to hold at most `cutoff`, so a change
+    can be applied directly unless a board member falls below it. Someone off
+    the board might then belong on it, so the board has to be read again.
+    """
+
+    def __init__(self, size, max_age):
+        self.size = size
+        self.max_age = max_age  # Changes that publish no event are picked up by reloading
+        self._lock = threading.Lock()
+        self._entries = None  # discord_id -> (username, balance)
+        self._cutoff = None
+        self._loaded_at = None
+
+    def load(self, rows):
+        """Replace the board with (discord_id, username, balance) rows read from the database"""
+        with self._lock:
+            self._entries = {discord_id: (username, balance) for discord_id, username, balance in rows}
+            # A board that isn't full holds every user
+            self._cutoff = min(balance for _, _, balance in rows) if len(rows) >= self.size else float("-inf")
+            self._loaded_at = time.monotonic()
+
+    def get(self):
+        """
+        Get the board.
+
+        Returns:
+            list: (discord_id, username, balance) rows, richest first, or None if it must be read again
+        """
+        with self._lock:
+            if self._entries is None or time.monotonic() - self._loaded_at > self.max_age:
+                return None
+            rows = [(discord_id, username, balance) for discord_id, (username, balance) in self._entries.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def update(self, discord_id, username, balance):
+        """Apply a user's new balance"""
+        with self._lock:
+            if self._entries is None:
+                return
+            if discord_id in self._entries:
+                if balance < self._cutoff:
+                    self._entries = None
+                else:
+                    self._entries[discord_id] = (username, balance)
+                return
+
+            if len(self._entries) < self.size:
+                self._entries[discord_id] = (username, balance)
+                return
+            poorest = min(self._entries, key=lambda key: self._entries[key][1])
+            if balance > self._entries[poorest][1]:
+                self._cutoff = max(self._cutoff, self._entries.pop(poorest)[1])
+                self._entries[discord_id] = (username, balance)
+            else:
+                self._cutoff = max(self._cutoff, balance)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+
+# Last known balance per Discord id
+balance_cache = TTLCache(max_entries=100000, ttl=3600)
+
+# Last leaderboard read, under a single key
+leaderboard_cache = TTLCache(max_entries=1, ttl=3600)
+
+# Top balances served by the leaderboard command
+live_leaderboard = LiveLeaderboard(size=10, max_age=config.LEADERBOARD_MAX_AGE)
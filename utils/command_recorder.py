@@ -0,0 +1,112 @@
+"""
+Opt-in recorder of command invocations for performance replay.
+
+Each invocation is written as one compact JSON line holding the command, its
+converted arguments, a timestamp and salted hashes in place of Discord ids,
+so real traffic can be replayed by benchmarks/replay.py without storing
+anything that identifies a user. Files rotate by size.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from logging.handlers import RotatingFileHandler
+
+import discord
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Dedicated logger for the records themselves, kept out of the normal logs
+_record_logger = logging.getLogger("command_recorder.records")
+_record_logger.propagate = False
+
+_enabled = False
+_salt = None
+
+def _hash_id(discord_id):
+    """Replace a Discord id with a salted hash that is stable for the recording"""
+    return hmac.new(_salt, str(discord_id).encode(), hashlib.sha256).hexdigest()[:16]
+
+def _scrub(value):
+    """Make a converted command argument safe and JSON serializable"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, discord.abc.User):
+        return {"member": _hash_id(value.id)}
+    # Anything else could carry identifying data, only keep its type
+    return {"type": type(value).__name__}
+
+def is_enabled():
+    """Check whether commands are being recorded"""
+    return _enabled
+
+def enable(directory=None):
+    """
+    Start recording commands to rotating files.
+
+    Args:
+        directory (str): Where to write recordings (defaults to config)
+    """
+    global _enabled, _salt
+    if _enabled:
+        return
+
+    directory = directory or config.COMMAND_RECORDING_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    # Without a configured salt hashes are only stable for this process
+    salt = os.getenv("COMMAND_RECORDING_SALT")
+    _salt = salt.encode() if salt else secrets.token_bytes(16)
+
+    handler = RotatingFileHandler(
+        os.path.join(directory, "commands.jsonl"),
+        maxBytes=config.COMMAND_RECORDING_MAX_BYTES,
+        backupCount=config.COMMAND_RECORDING_BACKUP_COUNT,
+        encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _record_logger.addHandler(handler)
+    _record_logger.setLevel(logging.INFO)
+
+    _enabled = True
+    logger.info(f"Recording commands to {directory}")
+
+def disable():
+    """Stop recording commands and close the recording files"""
+    global _enabled
+    _enabled = False
+    for handler in list(_record_logger.handlers):
+        _record_logger.removeHandler(handler)
+        handler.close()
+
+def record(ctx):
+    """
+    Record a command invocation. Called from the before_invoke hook.
+
+    Args:
+        ctx: The command context, with arguments already converted
+    """
+    if not _enabled:
+        return
+
+    try:
+        # ctx.args starts with the cog and the context itself
+        args = ctx.args[2:] if ctx.command.cog is not None else ctx.args[1:]
+        entry = {
+            "ts": round(time.time(), 3),
+            "cmd": ctx.command.qualified_name,
+            "user": _hash_id(ctx.author.id),
+            "guild": _hash_id(ctx.guild.id) if ctx.guild else None,
+            "args": [_scrub(arg) for arg in args],
+        }
+        if ctx.kwargs:
+            entry["kwargs"] = {name: _scrub(value) for name, value in ctx.kwargs.items()}
+
+        _record_logger.info(json.dumps(entry, separators=(",", ":"), ensure_ascii=False))
+    except Exception as e:
+        logger.error(f"Failed to record command {ctx.command}: {e}")
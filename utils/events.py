@@ -0,0 +1,233 @@
+"""
+In-process event bus for the side effects of settled game state.
+
+Settlement code publishes typed events such as BetSettled once its
+transaction has committed, and every subscriber consumes them from its own
+bounded queue on the bot's event loop. A slow subscriber only ever delays
+itself: when its queue is full, new events for it are dropped and counted
+instead of holding up the command that published them. Subscribers treat
+events as notifications, the ledger stays the record of what happened.
+
+publish() can be called from any thread, events published off the loop are
+handed over with call_soon_threadsafe.
+"""
+import asyncio
+import inspect
+import logging
+import threading
+import time
+
+import config
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PUBLISHED = metrics.counter("events_published_total", "Events published on the bus", ("event",))
+EVENTS_DROPPED = metrics.counter(
+    "events_dropped_total", "Events a subscriber missed because its queue was full or the bus wasn't running", ("subscriber",)
+)
+EVENT_HANDLER_ERRORS = metrics.counter("event_handler_errors_total", "Event handlers that raised", ("subscriber",))
+EVENT_HANDLER_SECONDS = metrics.histogram(
+    "event_handler_duration_seconds", "Time a subscriber spent handling an event", ("subscriber",)
+)
+EVENT_QUEUE_DEPTH = metrics.gauge("event_queue_depth", "Events waiting in a subscriber's queue", ("subscriber",))
+
+class Event:
+    """Base class of bus events, stamped with the time they were published"""
+
+    def __init__(self):
+        self.timestamp = time.time()
+
+class BetSettled(Event):
+    """A game bet was settled and committed"""
+
+    def __init__(self, discord_id, username, game_type, bet, win, payout, new_balance):
+        super().__init__()
+        self.discord_id = discord_id
+        self.username = username
+        self.game_type = game_type  # GameType value
+        self.bet = bet
+        self.win = win
+        self.payout = payout
+        self.new_balance = new_balance
+
+class MiningCompleted(Event):
+    """A mining session was paid out and committed"""
+
+    def __init__(self, discord_id, username, duration, earned, bonus, mining_power, mining_multiplier, new_balance):
+        super().__init__()
+        self.discord_id = discord_id
+        self.username = username
+        self.duration = duration  # Seconds
+        self.earned = earned
+        self.bonus = bonus
+        self.mining_power = mining_power
+        self.mining_multiplier = mining_multiplier
+        self.new_balance = new_balance
+
+class BalanceChanged(Event):
+    """A user's balance changed and the change was committed"""
+
+    def __init__(self, discord_id, username, amount, new_balance, transaction_type):
+        super().__init__()
+        self.discord_id = discord_id
+        self.username = username
+        self.amount = amount  # Signed change
+        self.new_balance = new_balance
+        self.transaction_type = transaction_type  # TransactionType value
+
+class Subscriber:
+    """A handler consuming events from its own bounded queue"""
+
+    def __init__(self, name, event_types, handler, maxsize):
+        self.name = name
+        self.event_types = tuple(event_types)
+        self.handler = handler  # Called with each event, may be a coroutine function
+        self.maxsize = maxsize
+        self.queue = None
+        self.task = None
+        self.dropped = EVENTS_DROPPED.labels(subscriber=name)
+        self.seconds = EVENT_HANDLER_SECONDS.labels(subscriber=name)
+
+    def _start(self):
+        self.queue = asyncio.Queue(self.maxsize)
+        EVENT_QUEUE_DEPTH.labels(subscriber=self.name).set_function(self.queue.qsize)
+        self.task = asyncio.get_running_loop().create_task(self._run(), name=f"events-{self.name}")
+
+    def offer(self, event):
+        """Queue an event without waiting, dropping it if the queue is full"""
+        if self.queue is None:
+            self.dropped.inc()
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped.inc()
+
+    async def _run(self):
+        while True:
+            event = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                result = self.handler(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                EVENT_HANDLER_ERRORS.labels(subscriber=self.name).inc()
+                logger.error(f"Event subscriber {self.name} failed on {type(event).__name__}: {e}")
+            finally:
+                self.seconds.observe(time.perf_counter() - started)
+                self.queue.task_done()
+
+class EventBus:
+    """Routes published events to the subscribers of their type"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._routes = {}  # Event class -> tuple of subscribers, rebuilt on (un)subscribe
+        self._loop = None
+        self._thread_id = None
+
+    def subscribe(self, event_types, handler, name=None, maxsize=None):
+        """
+        Register a handler for one or more event classes.
+
+        Args:
+            event_types (tuple): Event classes to receive
+            handler (callable): Called with each event on the bot's loop, may be a coroutine function
+            name (str): Subscriber name for metrics and logs, defaults to the handler's name
+            maxsize (int): Queue size, defaults to EVENT_QUEUE_SIZE
+
+        Returns:
+            Subscriber: Pass to unsubscribe() to remove it
+        """
+        if isinstance(event_types, type):
+            event_types = (event_types,)
+        subscriber = Subscriber(
+            name or getattr(handler, "__qualname__", repr(handler)), event_types, handler,
+            config.EVENT_QUEUE_SIZE if maxsize is None else maxsize
+        )
+        with self._lock:
+            self._subscribers.append(subscriber)
+            self._rebuild_routes()
+            loop = self._loop
+        if loop is not None:
+            self._call_on_loop(loop, subscriber._start)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Stop delivering events to a subscriber, discarding what it hasn't handled yet"""
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.remove(subscriber)
+            self._rebuild_routes()
+        if subscriber.task is not None:
+            self._call_on_loop(subscriber.task.get_loop(), subscriber.task.cancel)
+
+    def _rebuild_routes(self):
+        routes = {}
+        for subscriber in self._subscribers:
+            for event_type in subscriber.event_types:
+                routes.setdefault(event_type, []).append(subscriber)
+        self._routes = {event_type: tuple(subscribers) for event_type, subscribers in routes.items()}
+
+    def _call_on_loop(self, loop, callback):
+        if threading.get_ident() == self._thread_id:
+            callback()
+        else:
+            loop.call_soon_threadsafe(callback)
+
+    def start(self):
+        """Start delivering events on the running loop, must be called from it"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._loop is loop:
+                return
+            self._loop = loop
+            self._thread_id = threading.get_ident()
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber._start()
+        logger.info(f"Event bus started with {len(subscribers)} subscribers")
+
+    def stop(self):
+        """Stop delivering events and cancel the subscribers' tasks, must be called from the loop"""
+        with self._lock:
+            self._loop = None
+            self._thread_id = None
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.task is not None:
+                subscriber.task.cancel()
+            subscriber.queue = subscriber.task = None
+
+    def publish(self, event):
+        """Hand an event to its subscribers without waiting for them"""
+        EVENTS_PUBLISHED.labels(event=type(event).__name__).inc()
+        subscribers = self._routes.get(type(event))
+        if not subscribers:
+            return
+        if threading.get_ident() == self._thread_id:
+            self._deliver(subscribers, event)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, subscribers, event)
+        except (AttributeError, RuntimeError):
+            # Not started yet, or the loop has been closed
+            for subscriber in subscribers:
+                subscriber.dropped.inc()
+
+    def _deliver(self, subscribers, event):
+        for subscriber in subscribers:
+            subscriber.offer(event)
+
+    async def join(self):
+        """Wait until every subscriber has handled the events queued so far"""
+        for subscriber in list(self._subscribers):
+            if subscriber.queue is not None:
+                await subscriber.queue.join()
+
+# The bus shared by the bot, the cogs and the dashboard
+BUS = EventBus()
@@ -1,6 +1,10 @@
 """
 Utility functions for formatting various data types.
 """
+import math
+import re
+import string
+from decimal import Decimal, ROUND_HALF_UP
 
 def format_currency(amount):
     """
@@ -40,3 +44,120 @@ def format_time(seconds):
     parts.append(f"{seconds}s")
     
     return " ".join(parts)
+
+def to_cents(amount):
+    """
+    Convert a currency amount to whole cents, rounding halves up.
+    
+    Args:
+        amount (float): The amount in dollars
+        
+    Returns:
+        int: The amount in cents
+    """
+    if isinstance(amount, int):
+        return amount * 100
+    return int((Decimal(repr(amount)) * 100).to_integral_value(ROUND_HALF_UP))
+
+def is_whole_cents(amount):
+    """
+    Check that an amount entered by a user is at least one cent and has no fractions of a cent.
+    
+    Balances are kept in whole cents, so smaller fractions would be rounded
+    away differently on the balance and in the ledger.
+    
+    Args:
+        amount (float): The amount in dollars
+        
+    Returns:
+        bool: Whether the amount can be bet or transferred as is
+    """
+    if not math.isfinite(amount) or amount < 0.01:
+        return False
+    return Decimal(repr(amount)) * 100 == to_cents(amount)
+
+def format_cents(cents):
+    """
+    Format an amount held in cents with the $ symbol.
+    
+    Args:
+        cents (int): The amount in cents
+        
+    Returns:
+        str: The formatted amount string
+    """
+    sign = "-" if cents < 0 else ""
+    dollars, cents = divmod(abs(cents), 100)
+    return f"{sign}${dollars:,}.{cents:02d}"
+
+# Transaction description templates, stored as a code plus parameters.
+# Codes are persisted: never renumber or reword an existing template, add a new one instead.
+FREE_TEXT_DESCRIPTION = 0
+DESCRIPTION_TEMPLATES = {
+    1: "Won {game} game",
+    2: "Lost {game} game",
+    3: "Mining session ({seconds} seconds)",
+    4: "Mining equipment upgrade to level {level}",
+    5: "Daily reward",
+    6: "Transfer to {name}",
+    7: "Transfer from {name}",
+    8: "Admin balance addition by {admin}",
+    9: "Admin balance removal by {admin}",
+    10: "Admin balance reset by {admin}",
+    11: "Interest ({run})",
+    12: "Wealth tax ({run})",
+    13: "Inactivity decay ({run})",
+    14: "Escrow for {game} hand {hand}",
+}
+PARAM_SEPARATOR = "\x1f"
+
+def _template_pattern(template):
+    """Compile a description template into a regex capturing its parameters"""
+    pattern = ""
+    for literal, field, _, _ in string.Formatter().parse(template):
+        pattern += re.escape(literal)
+        if field is not None:
+            pattern += "(.+)"
+    return re.compile(pattern + r"\Z", re.DOTALL)
+
+_TEMPLATE_PATTERNS = [(code, _template_pattern(template)) for code, template in DESCRIPTION_TEMPLATES.items()]
+
+def parse_description(description):
+    """
+    Split a transaction description into a template code and parameters.
+    
+    Args:
+        description (str): The description text
+        
+    Returns:
+        tuple: (code, params) where params joins the template values with
+            PARAM_SEPARATOR, or (FREE_TEXT_DESCRIPTION, description) if no
+            template matches
+    """
+    if description is None:
+        return None, None
+    for code, pattern in _TEMPLATE_PATTERNS:
+        match = pattern.match(description)
+        if match and not any(PARAM_SEPARATOR in value for value in match.groups()):
+            return code, PARAM_SEPARATOR.join(match.groups()) or None
+    return FREE_TEXT_DESCRIPTION, description
+
+def format_description(code, params):
+    """
+    Rebuild a transaction description from its template code and parameters.
+    
+    Args:
+        code (int): Template code from parse_description()
+        params (str): Template values joined with PARAM_SEPARATOR
+        
+    Returns:
+        str: The description text
+    """
+    if code is None:
+        return None
+    if code == FREE_TEXT_DESCRIPTION:
+        return params
+    template = DESCRIPTION_TEMPLATES[code]
+    fields = [field for _, field, _, _ in string.Formatter().parse(template) if field is not None]
+    values = params.split(PARAM_SEPARATOR) if params else []
+    return template.format(**dict(zip(fields, values)))
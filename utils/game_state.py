@@ -0,0 +1,74 @@
+"""
+In-memory state of games played over several commands.
+
+A game such as a blackjack hand lives here between its commands instead of
+being written to the database after every action; only its start (the bet
+escrow) and its settlement touch the database. Every game has a fixed
+deadline from when it was added, so entries stay in deadline order and
+finding the expired ones never scans the games that are still running.
+
+The store isn't locked: it is only used from the bot's event loop, where
+each command runs uninterrupted between awaits.
+"""
+import time
+from collections import OrderedDict
+
+class GameStateStore:
+    """Open games keyed by player, each expiring a fixed time after it started"""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (deadline, state), oldest first
+
+    def add(self, key, state):
+        """
+        Store a new game.
+
+        Returns:
+            bool: False if the key already has a game or the store is full
+        """
+        if key in self._entries or len(self._entries) >= self.max_entries:
+            return False
+        self._entries[key] = (time.monotonic() + self.ttl, state)
+        return True
+
+    def get(self, key):
+        """Get a game that hasn't expired yet, or None"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def pop(self, key):
+        """Remove a game and return it, or None if there was none (expired games included)"""
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def remaining(self, key):
+        """Seconds until a game expires, or None if there is none"""
+        entry = self._entries.get(key)
+        return max(entry[0] - time.monotonic(), 0) if entry is not None else None
+
+    def expired(self):
+        """
+        Remove the games whose deadline has passed.
+
+        Returns:
+            list: (key, state) of each expired game, oldest first
+        """
+        now = time.monotonic()
+        expired = []
+        while self._entries:
+            key, (deadline, state) = next(iter(self._entries.items()))
+            if deadline > now:
+                break
+            del self._entries[key]
+            expired.append((key, state))
+        return expired
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -3,6 +3,7 @@ Utility helper functions for the gambling bot.
 """
 from database.models import User
 from sqlalchemy import select
+import config
 
 def create_user_if_not_exists(session, discord_user):
     """
@@ -15,21 +16,49 @@ def create_user_if_not_exists(session, discord_user):
     Returns:
         User: The database user object
     """
-    # Try to get the user by Discord ID
-    discord_id = str(discord_user.id)
-    
-    user = session.scalar(
-        select(User).where(User.discord_id == discord_id)
-    )
+    user = get_user(session, discord_user)
     
     if not user:
         # Create a new user if they don't exist
-        user = User(
-            discord_id=discord_id,
-            username=f"{discord_user.name}#{discord_user.discriminator}" if hasattr(discord_user, 'discriminator') and discord_user.discriminator != '0' else discord_user.name,
-            balance=100.0  # Starting balance
-        )
+        user = new_user(discord_user)
         session.add(user)
         session.flush()  # Make sure the user has an ID assigned
     
     return user
+
+def get_user(session, discord_user):
+    """
+    Get a user from the database without creating them.
+    
+    Args:
+        session: SQLAlchemy session
+        discord_user: Discord user object
+        
+    Returns:
+        User: The database user object, or None if they don't exist
+    """
+    return session.scalar(
+        select(User).where(User.discord_id == str(discord_user.id))
+    )
+
+def new_user(discord_user):
+    """
+    Build a new user with the starting balance and mining stats, without adding it to a session.
+    
+    Read-only commands use this to show a player who doesn't exist yet
+    (or hasn't reached the read replica yet) as a fresh account.
+    
+    Args:
+        discord_user: Discord user object
+        
+    Returns:
+        User: The unsaved user object
+    """
+    return User(
+        discord_id=str(discord_user.id),
+        username=f"{discord_user.name}#{discord_user.discriminator}" if hasattr(discord_user, 'discriminator') and discord_user.discriminator != '0' else discord_user.name,
+        balance=config.STARTING_BALANCE,
+        mining_level=1,
+        mining_power=1.0,
+        mining_multiplier=1.0
+    )
@@ -0,0 +1,170 @@
+"""
+Opt-in per-command SQL profiler.
+
+While profiling is enabled, every SQL statement executed by the engine is
+attributed to the command invocation that issued it through a context
+variable set around command dispatch. Per-command totals are kept in memory
+so repeated statements (N+1 patterns) and chatty commands can be spotted.
+"""
+import contextvars
+import threading
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Profile of the command invocation running in the current context
+_current_profile = contextvars.ContextVar("query_profile", default=None)
+
+_enabled = config.QUERY_PROFILING_ENABLED
+_lock = threading.Lock()
+_stats = {}
+
+class QueryProfile:
+    """SQL statements issued by a single command invocation"""
+
+    def __init__(self, name):
+        self.name = name
+        self.statements = Counter()
+        self.statement_count = 0
+        self.db_time = 0.0
+
+    def record(self, statement, elapsed):
+        self.statements[statement] += 1
+        self.statement_count += 1
+        self.db_time += elapsed
+
+    def repeated(self):
+        """Get statements executed more than the repeat threshold, most repeated first"""
+        return [
+            (statement, count) for statement, count in self.statements.most_common()
+            if count >= config.QUERY_PROFILER_REPEAT_THRESHOLD
+        ]
+
+class CommandQueryStats:
+    """Aggregated SQL statistics for every invocation of one command"""
+
+    def __init__(self, name):
+        self.name = name
+        self.invocations = 0
+        self.statement_count = 0
+        self.max_statements = 0
+        self.db_time = 0.0
+        self.repeated = Counter()  # Highest repeat count seen per statement
+
+    @property
+    def avg_statements(self):
+        return self.statement_count / self.invocations if self.invocations else 0
+
+    @property
+    def avg_db_time(self):
+        return self.db_time / self.invocations if self.invocations else 0
+
+    def add(self, profile):
+        self.invocations += 1
+        self.statement_count += profile.statement_count
+        self.max_statements = max(self.max_statements, profile.statement_count)
+        self.db_time += profile.db_time
+        for statement, count in profile.repeated():
+            self.repeated[statement] = max(self.repeated[statement], count)
+
+def is_enabled():
+    """Check whether query profiling is currently enabled"""
+    return _enabled
+
+def enable():
+    """Start attributing SQL statements to commands"""
+    global _enabled
+    _enabled = True
+    logger.info("Query profiling enabled")
+
+def disable():
+    """Stop attributing SQL statements to commands"""
+    global _enabled
+    _enabled = False
+    logger.info("Query profiling disabled")
+
+def reset():
+    """Discard all collected statistics"""
+    with _lock:
+        _stats.clear()
+
+def start(name):
+    """
+    Begin profiling a command invocation in the current context.
+
+    Args:
+        name (str): The qualified command name
+
+    Returns:
+        QueryProfile: The new profile, or None if profiling is disabled
+    """
+    if not _enabled:
+        return None
+
+    profile = QueryProfile(name)
+    _current_profile.set(profile)
+    return profile
+
+def finish(profile):
+    """
+    Stop profiling the current invocation and fold it into the command statistics.
+
+    Args:
+        profile (QueryProfile): The profile returned by start()
+    """
+    _current_profile.set(None)
+    if profile is None:
+        return
+
+    with _lock:
+        stats = _stats.get(profile.name)
+        if stats is None:
+            stats = _stats[profile.name] = CommandQueryStats(profile.name)
+        stats.add(profile)
+
+    logger.info(f"{profile.name}: {profile.statement_count} statements, {profile.db_time * 1000:.1f}ms in database")
+    for statement, count in profile.repeated():
+        logger.warning(f"{profile.name}: statement repeated {count} times: {' '.join(statement.split())[:200]}")
+
+@contextmanager
+def profiled(name):
+    """Profile the SQL issued inside a block, for work that doesn't run as a command"""
+    profile = start(name)
+    try:
+        yield profile
+    finally:
+        finish(profile)
+
+def record(statement, elapsed):
+    """
+    Attribute an executed statement to the current invocation, if any.
+
+    Called from the engine's after_cursor_execute event.
+
+    Args:
+        statement (str): The SQL statement text
+        elapsed (float): Execution time in seconds
+    """
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(statement, elapsed)
+
+def top_offenders(limit=10):
+    """
+    Get the commands issuing the most SQL per invocation.
+
+    Args:
+        limit (int): Maximum number of commands to return
+
+    Returns:
+        list: CommandQueryStats sorted by average statements, then average DB time
+    """
+    with _lock:
+        stats = list(_stats.values())
+
+    stats.sort(key=lambda s: (s.avg_statements, s.avg_db_time), reverse=True)
+    return stats[:limit]
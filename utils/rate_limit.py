@@ -0,0 +1,195 @@
+"""
+Admission control for commands.
+
+Per-user and per-guild token buckets run as a global bot check, so spam is
+rejected before any argument conversion or database work. Commands that touch
+the database additionally need a slot from a global concurrency limit with a
+bounded wait queue; when the queue is full they are turned away immediately.
+"""
+import asyncio
+import time
+import logging
+
+from discord.ext import commands
+
+import config
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = metrics.counter("bot_rate_limited_total", "Commands rejected by a rate limit", ("scope",))
+ADMISSION_REJECTED = metrics.counter("bot_admission_rejected_total", "Commands rejected because the database queue was full", ("reason",))
+ADMISSION_IN_FLIGHT = metrics.gauge("bot_admission_in_flight", "Database commands currently running")
+ADMISSION_WAITING = metrics.gauge("bot_admission_waiting", "Database commands waiting for a slot")
+ADMISSION_WAIT_SECONDS = metrics.histogram("bot_admission_wait_seconds", "Time commands waited for a database slot")
+
+class RateLimited(commands.CheckFailure):
+    """Raised when a user or guild has run out of command tokens"""
+
+    def __init__(self, scope, retry_after, notify):
+        super().__init__(f"Rate limited ({scope}), retry in {retry_after:.2f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+        self.notify = notify  # Only tell the user once per empty bucket
+
+class Overloaded(commands.CommandError):
+    """Raised when too many database commands are already running or queued"""
+
+class TokenBucket:
+    """A bucket holding up to capacity tokens, refilled at rate tokens per second"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "warned")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.warned = False
+
+    def consume(self, now):
+        """
+        Take a token if one is available.
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one will be
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.warned = False
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+    def idle_full(self, now):
+        """Check if the bucket would be full by now, so it can be forgotten"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+class RateLimiter:
+    """Token buckets keyed by id, with idle buckets swept out periodically"""
+
+    def __init__(self, scope, rate, capacity, sweep_every=1000):
+        self.scope = scope
+        self.rate = rate
+        self.capacity = capacity
+        self.sweep_every = sweep_every
+        self.buckets = {}
+        self._calls = 0
+
+    def check(self, key):
+        """
+        Take a token for key.
+
+        Raises:
+            RateLimited: If the bucket for key is empty
+        """
+        now = time.monotonic()
+
+        self._calls += 1
+        if self._calls >= self.sweep_every:
+            self._calls = 0
+            self.buckets = {k: b for k, b in self.buckets.items() if not b.idle_full(now)}
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.capacity, now)
+
+        retry_after = bucket.consume(now)
+        if retry_after:
+            RATE_LIMITED.labels(scope=self.scope).inc()
+            notify = not bucket.warned
+            bucket.warned = True
+            raise RateLimited(self.scope, retry_after, notify)
+
+class AdmissionController:
+    """Global limit on concurrently running database commands with a bounded wait queue"""
+
+    def __init__(self, max_concurrent, max_waiting, timeout):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        ADMISSION_IN_FLIGHT.set_function(lambda: self.in_flight)
+        ADMISSION_WAITING.set_function(lambda: self.waiting)
+
+    async def acquire(self):
+        """
+        Wait for a slot to run a database command.
+
+        Raises:
+            Overloaded: If the wait queue is full or the wait times out
+        """
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            ADMISSION_REJECTED.labels(reason="queue_full").inc()
+            raise Overloaded("Too many commands are waiting for the database")
+
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTED.labels(reason="timeout").inc()
+            raise Overloaded("Timed out waiting for the database")
+        finally:
+            self.waiting -= 1
+
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start)
+        self.in_flight += 1
+
+    def release(self):
+        """Give back a slot taken by acquire()"""
+        self.in_flight -= 1
+        self._semaphore.release()
+
+def install(bot):
+    """
+    Install rate limiting and database admission control on a bot.
+
+    Token buckets run as a global check_once check, so an invocation is
+    charged once; a plain check would also run for every command that !help
+    filters and drain the caller's tokens. The admission slot is taken at the
+    end of the before_invoke hook (after every check has passed, so a failed
+    check can't leak a slot) and must be released with release_admission() in
+    after_invoke. Commands that keep running after their database work, such
+    as games with an animation, release it early themselves.
+
+    Args:
+        bot: The bot to protect
+
+    Returns:
+        AdmissionController: The admission controller used by the hooks
+    """
+    user_limiter = RateLimiter("user", config.RATE_LIMIT_USER_RATE, config.RATE_LIMIT_USER_BURST)
+    guild_limiter = RateLimiter("guild", config.RATE_LIMIT_GUILD_RATE, config.RATE_LIMIT_GUILD_BURST)
+    admission = AdmissionController(
+        config.DB_MAX_CONCURRENT_COMMANDS, config.DB_MAX_QUEUED_COMMANDS, config.DB_QUEUE_TIMEOUT
+    )
+
+    @bot.check_once
+    async def rate_limit(ctx):
+        user_limiter.check(ctx.author.id)
+        if ctx.guild is not None:
+            guild_limiter.check(ctx.guild.id)
+        return True
+
+    bot.admission = admission
+    return admission
+
+async def acquire_admission(ctx):
+    """Take a database slot for a command if it needs one. Call from before_invoke."""
+    # Commands outside a cog (help) don't touch the database
+    if ctx.command.cog is None:
+        return
+    await ctx.bot.admission.acquire()
+    ctx.admitted = True
+
+def release_admission(ctx):
+    """Release the database slot taken by acquire_admission(). Call from after_invoke, or once a command's database work is done."""
+    if getattr(ctx, "admitted", False):
+        ctx.admitted = False
+        ctx.bot.admission.release()
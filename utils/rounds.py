@@ -0,0 +1,152 @@
+"""
+Round-based games shared by everyone in a channel.
+
+The first bet in a channel opens a round. Every bet placed in that channel
+during the next betting window joins it, then the round is resolved with a
+single draw (one roulette spin for the whole table), every bet is settled
+in one transaction (see settle_round() in database/settlement.py) and the
+game sends one result message for the round.
+
+A game plugs in by subclassing RoundGame. Rounds live on the bot's loop and
+aren't locked: a bet is checked and added without awaiting in between, so a
+round can't close half way through taking a bet.
+"""
+import abc
+import asyncio
+import logging
+import time
+
+from database.health import DATABASE_ERRORS
+from database.settlement import settle_round
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+ROUNDS_PLAYED = metrics.counter("rounds_played_total", "Shared rounds resolved", ("game",))
+ROUND_BETS = metrics.histogram(
+    "round_bets", "Bets per shared round", ("game",), buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+
+class RoundBet:
+    """A bet placed in a shared round"""
+    __slots__ = ("stake", "player_name", "choice", "amount", "win", "payout", "game_result", "new_balance", "cancelled")
+
+    def __init__(self, stake, player_name, choice, amount):
+        self.stake = stake  # From open_bet(), covering all of the player's bets in the round
+        self.player_name = player_name
+        self.choice = choice  # What the bet is on, interpreted by the game
+        self.amount = amount
+        self.win = False
+        self.payout = 0
+        self.game_result = None
+        self.new_balance = None
+        self.cancelled = False
+
+class Round:
+    """The bets placed in a channel during one betting window"""
+
+    def __init__(self, channel, closes_at):
+        self.channel = channel
+        self.closes_at = closes_at  # time.monotonic() deadline
+        self.bets = []
+        self.staked = {}  # Discord id -> total bet by the player in this round
+        self.outcome = None
+        self.task = None
+
+    def seconds_left(self):
+        return max(self.closes_at - time.monotonic(), 0)
+
+    def add(self, bet):
+        self.bets.append(bet)
+        self.staked[bet.stake.discord_id] = self.staked.get(bet.stake.discord_id, 0) + bet.amount
+
+class RoundGame(abc.ABC):
+    """A game played in shared rounds, subclassed by each round-based game"""
+
+    name = None
+    game_type = None  # GameType recorded for the bets
+
+    @abc.abstractmethod
+    def draw(self):
+        """Draw the round's outcome, shared by every bet"""
+
+    @abc.abstractmethod
+    def score(self, bet, outcome):
+        """
+        Score one bet against the round's outcome.
+
+        Returns:
+            tuple: (win, payout, game_result)
+        """
+
+    @abc.abstractmethod
+    async def announce(self, current):
+        """Send the result message of a settled round"""
+
+class RoundTable:
+    """The open rounds of one game, one per channel"""
+
+    def __init__(self, game, window, max_bets):
+        self.game = game
+        self.window = window  # Seconds a round takes bets
+        self.max_bets = max_bets
+        self.rounds = {}  # Channel id -> open Round
+
+    def join(self, channel):
+        """
+        Get the channel's open round, opening one if there is none.
+
+        Check a bet before joining, so a rejected bet doesn't open a round.
+
+        Returns:
+            Round: The round to add the bet to
+        """
+        current = self.rounds.get(channel.id)
+        if current is not None:
+            return current
+        current = Round(channel, time.monotonic() + self.window)
+        self.rounds[channel.id] = current
+        current.task = asyncio.get_running_loop().create_task(self._play(current), name=f"{self.game.name}-round-{channel.id}")
+        return current
+
+    async def _play(self, current):
+        await asyncio.sleep(self.window)
+        # Later bets open the next round
+        self.rounds.pop(current.channel.id, None)
+        if not current.bets:
+            return
+
+        try:
+            await self.resolve(current)
+        except DATABASE_ERRORS as e:
+            logger.warning(f"{self.game.name} round in channel {current.channel.id} not settled: {e}")
+            # Bets settled one by one before the failure stand
+            settled = sum(1 for bet in current.bets if bet.new_balance is not None)
+            if settled:
+                await current.channel.send(
+                    f"⚠️ The database became unavailable while settling this round: {settled} of "
+                    f"{len(current.bets)} bets were settled, the others were cancelled and not taken."
+                )
+            else:
+                await current.channel.send("⚠️ The database is temporarily unavailable, this round was cancelled and no bets were taken.")
+        except Exception as e:
+            logger.error(f"Error playing {self.game.name} round in channel {current.channel.id}: {e}")
+
+    async def resolve(self, current):
+        """Draw the outcome, settle every bet together and announce the result"""
+        current.outcome = self.game.draw()
+        for bet in current.bets:
+            bet.win, bet.payout, bet.game_result = self.game.score(bet, current.outcome)
+
+        settle_round(self.game.game_type, current.bets)
+        ROUNDS_PLAYED.labels(game=self.game.name).inc()
+        ROUND_BETS.labels(game=self.game.name).observe(len(current.bets))
+
+        await self.game.announce(current)
+
+    def close(self):
+        """Cancel the open rounds, whose bets haven't been settled yet and so cost nothing"""
+        for current in self.rounds.values():
+            if current.task is not None:
+                current.task.cancel()
+        self.rounds.clear()
@@ -0,0 +1,220 @@
+"""
+On-demand sampling profiler for the bot thread and its event loop.
+
+A sampler thread periodically snapshots the bot thread's stack with
+sys._current_frames() and notes which asyncio task was running, while a probe
+scheduled on the event loop measures how late its callbacks fire. Sampling
+only happens while a profile is running, so there is no cost otherwise.
+"""
+import asyncio
+import datetime
+import os
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# The thread and event loop the bot runs on, set by setup_bot
+_bot_thread_id = None
+_bot_loop = None
+
+# Only one profile may run at a time
+_profile_lock = threading.Lock()
+
+# Cache of code object -> collapsed-stack frame label
+_labels = {}
+
+def register_bot_loop(loop):
+    """
+    Record the event loop and thread the bot runs on.
+
+    Must be called from the bot thread.
+
+    Args:
+        loop: The bot's running asyncio event loop
+    """
+    global _bot_thread_id, _bot_loop
+    _bot_thread_id = threading.get_ident()
+    _bot_loop = loop
+
+def bot_loop():
+    """Get the registered bot event loop, or None if the bot hasn't started"""
+    return _bot_loop
+
+def bot_thread_id():
+    """Get the registered bot thread id, or None if the bot hasn't started"""
+    return _bot_thread_id
+
+def current_task(loop):
+    """
+    Get the task currently running on a loop, from any thread.
+
+    asyncio.current_task() only works from the loop's own thread, so this
+    peeks at asyncio's bookkeeping instead. The answer may be stale by the
+    time it is used, which is fine for sampling.
+    """
+    current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+    if current_tasks is None:
+        return None
+    return current_tasks.get(loop)
+
+def task_label(task):
+    """Get a readable name for a task: its coroutine's qualified name"""
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or task.get_name()
+
+def frame_label(code):
+    """Get the collapsed-stack label for a code object"""
+    label = _labels.get(code)
+    if label is None:
+        label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+        _labels[code] = label
+    return label
+
+def collapse_stack(frame):
+    """Collapse a frame and its callers into a root-first, semicolon separated stack"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+def _is_idle(frame):
+    """Check if the loop is waiting for I/O rather than running a callback"""
+    return frame.f_code.co_filename.endswith("selectors.py")
+
+class _LoopProbe:
+    """Callback chain on the event loop that records how late each tick fires"""
+
+    def __init__(self, loop, interval, threshold):
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self.blocks = []
+        self.running = True
+        self.expected = None
+
+    def start(self):
+        self.loop.call_soon_threadsafe(self._schedule)
+
+    def stop(self):
+        self.running = False
+
+    def _schedule(self):
+        self.expected = self.loop.time() + self.interval
+        self.loop.call_later(self.interval, self._tick)
+
+    def _tick(self):
+        lateness = self.loop.time() - self.expected
+        if lateness >= self.threshold:
+            self.blocks.append((lateness, datetime.datetime.utcnow()))
+        if self.running:
+            self._schedule()
+
+class ProfileResult:
+    """Samples collected by a profiling run"""
+
+    def __init__(self, duration, interval):
+        self.duration = duration
+        self.interval = interval
+        self.stacks = Counter()
+        self.coroutines = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.blocks = []
+
+    def collapsed(self):
+        """Get the samples in the collapsed-stack format used by flamegraph.pl and speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def slowest_coroutines(self, limit=10):
+        """Get (coroutine, samples, estimated seconds on the loop) for the busiest coroutines"""
+        return [
+            (name, count, count * self.interval)
+            for name, count in self.coroutines.most_common(limit)
+        ]
+
+    def longest_blocks(self, limit=5):
+        """Get (seconds, when) for the longest event loop blocking intervals"""
+        return sorted(self.blocks, reverse=True)[:limit]
+
+    def summary(self, limit=10):
+        """Get a JSON-serializable summary of the run"""
+        return {
+            "duration": self.duration,
+            "interval": self.interval,
+            "samples": self.samples,
+            "idle_samples": self.idle_samples,
+            "slowest_coroutines": [
+                {"coroutine": name, "samples": count, "seconds": seconds}
+                for name, count, seconds in self.slowest_coroutines(limit)
+            ],
+            "longest_blocks": [
+                {"seconds": seconds, "at": when.isoformat()}
+                for seconds, when in self.longest_blocks(limit)
+            ]
+        }
+
+def profile(seconds, interval=None):
+    """
+    Sample the bot thread and event loop for a number of seconds.
+
+    Blocks the calling thread for the whole run, so call it from a worker
+    thread (asyncio.to_thread) when on the event loop.
+
+    Args:
+        seconds (float): How long to sample for, capped at PROFILER_MAX_SECONDS
+        interval (float): Seconds between samples (defaults to config)
+
+    Returns:
+        ProfileResult: The collected samples
+
+    Raises:
+        RuntimeError: If the bot isn't running or a profile is already in progress
+    """
+    if _bot_thread_id is None or _bot_loop is None or _bot_loop.is_closed():
+        raise RuntimeError("The bot is not running")
+    if threading.get_ident() == _bot_thread_id:
+        raise RuntimeError("Cannot profile the bot thread from itself")
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+
+    try:
+        seconds = max(0.1, min(seconds, config.PROFILER_MAX_SECONDS))
+        interval = interval or config.PROFILER_SAMPLE_INTERVAL
+        result = ProfileResult(seconds, interval)
+
+        probe = _LoopProbe(_bot_loop, config.PROFILER_PROBE_INTERVAL, config.PROFILER_BLOCK_THRESHOLD)
+        probe.start()
+
+        logger.info(f"Profiling bot thread for {seconds}s")
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            frame = sys._current_frames().get(_bot_thread_id)
+            if frame is None:
+                break
+
+            result.samples += 1
+            if _is_idle(frame):
+                result.idle_samples += 1
+            else:
+                result.stacks[collapse_stack(frame)] += 1
+                task = current_task(_bot_loop)
+                if task is not None:
+                    result.coroutines[task_label(task)] += 1
+
+            # Drop our reference so the bot thread's frames can be freed
+            del frame
+            time.sleep(interval)
+
+        probe.stop()
+        result.blocks = list(probe.blocks)
+        return result
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,134 @@
+"""
+Event loop stall watchdog.
+
+A heartbeat callback on the bot's event loop records how late it fires,
+while a separate watchdog thread checks that the heartbeat keeps moving. When
+the loop stops beating for longer than the stall threshold the watchdog
+captures the bot thread's stack and the command running at the time, so
+blocking handlers can be tracked down.
+"""
+import sys
+import threading
+import time
+import traceback
+import weakref
+import logging
+
+import config
+from utils import metrics
+from utils.sampling_profiler import current_task
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG = metrics.histogram(
+    "event_loop_lag_seconds", "How late event loop heartbeats fire",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+EVENT_LOOP_STALLS = metrics.counter(
+    "event_loop_stalls_total", "Times the event loop was blocked past the stall threshold", ("command",)
+)
+EVENT_LOOP_STALL_SECONDS = metrics.histogram(
+    "event_loop_stall_seconds", "How long event loop stalls lasted", ("command",),
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+# Command running in each task, so stalls can be blamed from another thread
+_active_commands = weakref.WeakKeyDictionary()
+
+def command_started(task, name):
+    """Record that a task is running a command"""
+    if task is not None:
+        _active_commands[task] = name
+
+def command_finished(task):
+    """Record that a task has finished its command"""
+    if task is not None:
+        _active_commands.pop(task, None)
+
+def _describe_task(task):
+    """Get the command (or coroutine) a task is running"""
+    if task is None:
+        return "unknown"
+    name = _active_commands.get(task)
+    if name:
+        return name
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or task.get_name()
+
+class LoopWatchdog:
+    """Watches an event loop for stalls from a background thread"""
+
+    def __init__(self, loop, thread_id, interval=None, threshold=None):
+        self.loop = loop
+        self.thread_id = thread_id
+        self.interval = interval or config.WATCHDOG_INTERVAL
+        self.threshold = threshold or config.WATCHDOG_STALL_THRESHOLD
+        self.last_beat = time.monotonic()
+        self.expected = None
+        self.running = False
+
+    def start(self):
+        """Start the heartbeat and the watchdog thread"""
+        self.running = True
+        self.loop.call_soon_threadsafe(self._schedule_beat)
+        thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        thread.start()
+        logger.info(f"Event loop watchdog started (threshold {self.threshold}s)")
+
+    def stop(self):
+        self.running = False
+
+    def _schedule_beat(self):
+        self.expected = self.loop.time() + self.interval
+        self.loop.call_later(self.interval, self._beat)
+
+    def _beat(self):
+        EVENT_LOOP_LAG.observe(max(0, self.loop.time() - self.expected))
+        self.last_beat = time.monotonic()
+        if self.running:
+            self._schedule_beat()
+
+    def _watch(self):
+        stall = None  # (start, command) of the stall in progress
+
+        while self.running and not self.loop.is_closed():
+            time.sleep(self.interval / 2)
+            blocked = time.monotonic() - self.last_beat
+
+            if blocked >= self.threshold:
+                if stall is None:
+                    stall = (self.last_beat, self._report_stall(blocked))
+            elif stall is not None:
+                # The loop is beating again, record how long it was stuck
+                started, command = stall
+                duration = self.last_beat - started
+                EVENT_LOOP_STALL_SECONDS.labels(command=command).observe(duration)
+                logger.warning(f"Event loop recovered after {duration:.2f}s stall in {command}")
+                stall = None
+
+    def _report_stall(self, blocked):
+        """Log and count a stall, returning the command blamed for it"""
+        command = _describe_task(current_task(self.loop))
+        EVENT_LOOP_STALLS.labels(command=command).inc()
+
+        frame = sys._current_frames().get(self.thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "unavailable\n"
+        del frame
+
+        logger.warning(f"Event loop blocked for {blocked:.2f}s in {command}. Bot thread stack:\n{stack}")
+        return command
+
+def start_watchdog(loop, thread_id):
+    """
+    Start watching an event loop for stalls.
+
+    Args:
+        loop: The event loop to watch
+        thread_id (int): The id of the thread running the loop
+
+    Returns:
+        LoopWatchdog: The running watchdog
+    """
+    watchdog = LoopWatchdog(loop, thread_id)
+    watchdog.start()
+    return watchdog